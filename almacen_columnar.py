@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Almacén columnar en disco
+Guarda un DataFrame como archivos binarios de ancho fijo, uno por columna,
+con un encabezado JSON (esquema, origen de meses y diccionarios). Las
+columnas se abren con np.memmap en modo lectura: abrir no copia datos y
+varios procesos comparten las mismas páginas del cache del sistema
+"""
+
+import os
+import json
+import uuid
+import numpy as np
+import pandas as pd
+
+ARCHIVO_ENCABEZADO = 'encabezado.json'
+VERSION_FORMATO = 1
+
+# Centinela de mes nulo en las columnas de tipo 'mes'
+MES_NULO = np.iinfo(np.int32).min
+
+def guardar_columnas(directorio, df):
+    """
+    Escribe un DataFrame como columnas binarias de ancho fijo
+    
+    Codificación por tipo de columna:
+        texto (object): códigos enteros sobre un diccionario ordenado, guardado
+            como arreglo de bytes UTF-8 de ancho fijo; -1 para nulos
+        fechas de fin de mes: meses desde origen_mes en int32
+        otras fechas: int64 en nanosegundos
+        numéricas y booleanas: su dtype de numpy en little-endian
+    
+    Cada escritura usa nombres de archivo nuevos y el encabezado se reemplaza
+    al final de forma atómica: un lector que ya abrió la versión anterior
+    sigue leyéndola sin errores.
+    
+    Args:
+        directorio (str): Directorio del almacén
+        df (pd.DataFrame): Datos a guardar
+    
+    Returns:
+        dict: Encabezado escrito
+    """
+    os.makedirs(directorio, exist_ok=True)
+    generacion = uuid.uuid4().hex[:8]
+    anterior = _leer_encabezado(directorio) if os.path.exists(
+        os.path.join(directorio, ARCHIVO_ENCABEZADO)) else None
+    
+    origen_mes = _origen_mes(df)
+    columnas = []
+    for nombre in df.columns:
+        valores, columna, diccionario = _codificar_columna(df[nombre], origen_mes)
+        columna['nombre'] = nombre
+        columna['archivo'] = f'{_nombre_archivo(nombre)}.{generacion}.bin'
+        _escribir_arreglo(os.path.join(directorio, columna['archivo']), valores)
+        if diccionario is not None:
+            columna['diccionario'] = {
+                'archivo': f'{_nombre_archivo(nombre)}.{generacion}.dic',
+                'dtype': diccionario.dtype.str,
+                'valores': len(diccionario)
+            }
+            _escribir_arreglo(os.path.join(directorio, columna['diccionario']['archivo']), diccionario)
+        columnas.append(columna)
+    
+    encabezado = {
+        'version': VERSION_FORMATO,
+        'registros': len(df),
+        'origen_mes': origen_mes,
+        'columnas': columnas
+    }
+    
+    ruta = os.path.join(directorio, ARCHIVO_ENCABEZADO)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(encabezado, f, indent=2, ensure_ascii=False)
+    os.replace(ruta + '.tmp', ruta)
+    
+    # Los archivos de la versión anterior se eliminan después del reemplazo;
+    # los lectores que ya los tienen mapeados conservan el acceso
+    if anterior is not None:
+        for columna in anterior['columnas']:
+            archivos = [columna['archivo']] + (
+                [columna['diccionario']['archivo']] if 'diccionario' in columna else []
+            )
+            for archivo in archivos:
+                if os.path.exists(os.path.join(directorio, archivo)):
+                    os.remove(os.path.join(directorio, archivo))
+    
+    return encabezado
+
+def abrir_columnas(directorio):
+    """
+    Abre un almacén en modo memoria mapeada sin leer los datos
+    
+    Returns:
+        TablaColumnar: Columnas como np.memmap de solo lectura
+    """
+    return TablaColumnar(directorio, _leer_encabezado(directorio))
+
+class TablaColumnar:
+    """Vista de solo lectura de un almacén columnar abierto con np.memmap"""
+    
+    def __init__(self, directorio, encabezado):
+        if encabezado.get('version') != VERSION_FORMATO:
+            raise ValueError(f"Versión de almacén no soportada en {directorio}: {encabezado.get('version')}")
+        
+        self.directorio = directorio
+        self.registros = encabezado['registros']
+        self.origen_mes = encabezado['origen_mes']
+        self.esquema = {columna['nombre']: columna for columna in encabezado['columnas']}
+        self.columnas = {
+            nombre: _mapear(os.path.join(directorio, columna['archivo']),
+                            columna['dtype'], self.registros)
+            for nombre, columna in self.esquema.items()
+        }
+        self._diccionarios = {}
+    
+    def __len__(self):
+        return self.registros
+    
+    def diccionario(self, nombre):
+        """Valores del diccionario de una columna de texto, decodificados una sola vez"""
+        if nombre not in self._diccionarios:
+            info = self.esquema[nombre]['diccionario']
+            crudo = _mapear(os.path.join(self.directorio, info['archivo']), info['dtype'], info['valores'])
+            self._diccionarios[nombre] = np.array(
+                [valor.decode('utf-8') for valor in crudo.tolist()], dtype=object
+            )
+        return self._diccionarios[nombre]
+    
+    def meses(self, nombre):
+        """Meses de una columna 'mes' como datetime64[M]; NaT para nulos"""
+        if self.esquema[nombre]['tipo'] != 'mes':
+            raise ValueError(f"La columna '{nombre}' no es de tipo mes")
+        desplazamiento = self.columnas[nombre]
+        meses = (np.datetime64(self.origen_mes, 'M') + desplazamiento.astype('int64')).astype('datetime64[M]')
+        meses[desplazamiento == MES_NULO] = np.datetime64('NaT')
+        return meses
+    
+    def indice_meses(self, nombre):
+        """
+        Índice denso de los meses presentes en una columna 'mes' sin decodificar fechas
+        
+        Returns:
+            tuple: (posición de cada fila entre los meses presentes, meses
+                presentes como fecha de fin de mes en datetime64[ns])
+        """
+        desplazamiento = self.columnas[nombre]
+        if self.esquema[nombre]['tipo'] != 'mes' or (desplazamiento == MES_NULO).any():
+            raise ValueError(f"La columna '{nombre}' debe ser de tipo mes y sin nulos")
+        
+        conteos = np.bincount(desplazamiento)
+        presentes = np.flatnonzero(conteos)
+        posicion = np.full(len(conteos), -1, dtype='int64')
+        posicion[presentes] = np.arange(len(presentes))
+        
+        meses = np.datetime64(self.origen_mes, 'M') + presentes
+        fin_de_mes = (meses + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+        return posicion[desplazamiento], fin_de_mes.astype('datetime64[ns]')
+    
+    def valores(self, nombre):
+        """Columna decodificada con el tipo que tenía en el DataFrame original"""
+        tipo = self.esquema[nombre]['tipo']
+        datos = self.columnas[nombre]
+        
+        if tipo == 'texto':
+            # El -1 de los nulos toma el último elemento agregado: None
+            return np.append(self.diccionario(nombre), None)[datos]
+        if tipo == 'mes':
+            meses = self.meses(nombre)
+            fin_de_mes = (meses + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+            return fin_de_mes.astype('datetime64[ns]')
+        # np.asarray da una vista ndarray del mapeo, sin copiar
+        if tipo == 'fecha':
+            return np.asarray(datos).view('datetime64[ns]')
+        return np.asarray(datos)
+    
+    def to_dataframe(self, columnas=None):
+        """
+        Materializa un DataFrame con las columnas pedidas (por defecto todas)
+        
+        Las columnas numéricas y booleanas se envuelven sin copiar el mapeo.
+        """
+        columnas = list(self.esquema) if columnas is None else columnas
+        return pd.DataFrame({nombre: self.valores(nombre) for nombre in columnas}, copy=False)
+
+def _codificar_columna(serie, origen_mes):
+    """Arreglo de ancho fijo, metadatos y diccionario opcional de una columna"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        valores = serie.to_numpy().astype('datetime64[ns]')
+        validos = ~np.isnat(valores)
+        meses = valores.astype('datetime64[M]')
+        fin_de_mes = (meses + 1).astype('datetime64[ns]') - np.timedelta64(1, 'D')
+        if origen_mes is not None and np.array_equal(valores[validos], fin_de_mes[validos]):
+            desplazamiento = (meses - np.datetime64(origen_mes, 'M')).astype('int64')
+            desplazamiento[~validos] = MES_NULO
+            valores = desplazamiento.astype('<i4')
+            return valores, {'tipo': 'mes', 'dtype': valores.dtype.str}, None
+        valores = valores.view('<i8')
+        return valores, {'tipo': 'fecha', 'dtype': valores.dtype.str}, None
+    
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+        valores = serie.to_numpy()
+        valores = valores.astype(valores.dtype.newbyteorder('<'))
+        return valores, {'tipo': 'numerico', 'dtype': valores.dtype.str}, None
+    
+    codigos, categorias = pd.factorize(serie, sort=True)
+    tipo_codigo = '<i1' if len(categorias) < 2 ** 7 else '<i2' if len(categorias) < 2 ** 15 else '<i4'
+    codificadas = [str(valor).encode('utf-8') for valor in categorias]
+    ancho = max((len(valor) for valor in codificadas), default=1) or 1
+    diccionario = np.array(codificadas, dtype=f'S{ancho}')
+    return codigos.astype(tipo_codigo), {'tipo': 'texto', 'dtype': tipo_codigo}, diccionario
+
+def _origen_mes(df):
+    """Mes más antiguo entre todas las columnas de fecha, como 'YYYY-MM'"""
+    minimos = [df[col].min() for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    minimos = [valor for valor in minimos if not pd.isna(valor)]
+    return min(minimos).strftime('%Y-%m') if minimos else None
+
+def _nombre_archivo(columna):
+    """Nombre de archivo seguro para una columna"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in columna)
+
+def _escribir_arreglo(ruta, valores):
+    """Escribe un arreglo como bytes crudos a través de un temporal"""
+    with open(ruta + '.tmp', 'wb') as f:
+        np.ascontiguousarray(valores).tofile(f)
+    os.replace(ruta + '.tmp', ruta)
+
+def _mapear(ruta, dtype, registros):
+    """np.memmap de solo lectura; un arreglo vacío si no hay registros (mmap no admite tamaño 0)"""
+    if registros == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(ruta, dtype=dtype, mode='r', shape=(registros,))
+
+def _leer_encabezado(directorio):
+    with open(os.path.join(directorio, ARCHIVO_ENCABEZADO), 'r', encoding='utf-8') as f:
+        return json.load(f)
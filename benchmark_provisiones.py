@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Generador sintético de Provisiones y benchmark de PowerBIDataPreparator
+Genera libros con las hojas 'Prov' y 'cond y recu' de tamaño configurable y
+mide por separado carga, cálculo y exportación en varios tamaños. Los
+resultados se guardan en una línea base JSON para comparar ejecuciones
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import contextlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+DIRECTORIO_SINTETICOS = 'data/output/sinteticos'
+ARCHIVO_LINEA_BASE = 'data/output/benchmark_provisiones.json'
+
+# Tamaños predefinidos; 'actual' reproduce el orden de magnitud del libro real
+TAMANOS = {
+    'actual': {'alianzas': 4, 'productos': 4, 'meses': 32, 'multiplicidad': 1},
+    'pequeño': {'alianzas': 10, 'productos': 8, 'meses': 36, 'multiplicidad': 2},
+    'mediano': {'alianzas': 40, 'productos': 20, 'meses': 48, 'multiplicidad': 2},
+    'grande': {'alianzas': 100, 'productos': 40, 'meses': 60, 'multiplicidad': 3}
+}
+
+# Día 0 de los números de serie de Excel (sistema 1900), igual que en cargador_excel
+ORIGEN_SERIAL = np.datetime64('1899-12-30', 'D')
+
+def generar_provisiones(archivo, alianzas=4, productos=4, meses=32, multiplicidad=1,
+                        mes_inicial=202301, fraccion_nulos=0.3, semilla=42):
+    """
+    Genera un libro sintético con las hojas 'Prov' y 'cond y recu'
+    
+    'Prov' tiene una fila por (alianza, producto, mes) con fecha_analisis YYYYMM.
+    'cond y recu' tiene multiplicidad filas por llave (movimientos que el
+    preparador suma) con fecha_analisis como número de serie de Excel, y nulos
+    en condonaciones y recuperaciones como en el libro real.
+    
+    Args:
+        archivo (str): Ruta del libro a escribir
+        alianzas (int): Número de alianzas
+        productos (int): Número de productos por alianza
+        meses (int): Meses consecutivos desde mes_inicial
+        multiplicidad (int): Filas de 'cond y recu' por (alianza, producto, mes)
+        mes_inicial (int): Primer mes en formato YYYYMM
+        fraccion_nulos (float): Fracción de condonaciones y recuperaciones nulas
+        semilla (int): Semilla del generador; la misma semilla produce el mismo libro
+    
+    Returns:
+        dict: Registros generados por hoja
+    """
+    rng = np.random.default_rng(semilla)
+    prov = _generar_prov(rng, alianzas, productos, meses, mes_inicial)
+    cond_recu = _generar_cond_recu(rng, prov, multiplicidad, fraccion_nulos)
+    
+    os.makedirs(os.path.dirname(archivo) or '.', exist_ok=True)
+    wb = Workbook(write_only=True)
+    _escribir_hoja(wb.create_sheet('Prov'), prov)
+    _escribir_hoja(wb.create_sheet('cond y recu'), cond_recu)
+    wb.save(archivo)
+    
+    return {'Prov': len(prov), 'cond y recu': len(cond_recu)}
+
+def _generar_prov(rng, alianzas, productos, meses, mes_inicial):
+    """Saldos y provisiones como caminatas aleatorias por (alianza, producto)"""
+    nombres_alianza = [f'AL{i:03d}' for i in range(alianzas)]
+    nombres_producto = [f'PRODUCTO_{i:03d}' for i in range(productos)]
+    pares = alianzas * productos
+    
+    año, mes = divmod(mes_inicial, 100)
+    ordinal = año * 12 + mes - 1 + np.arange(meses)
+    mes_key = (ordinal // 12) * 100 + ordinal % 12 + 1
+    
+    # Saldo inicial por par y variación mensual multiplicativa
+    inicial = rng.lognormal(mean=15, sigma=1, size=(pares, 1))
+    variacion = rng.normal(1.0, 0.05, size=(pares, meses)).clip(0.5, 1.5)
+    sald_k = inicial * np.cumprod(variacion, axis=1)
+    
+    icv = rng.beta(2, 12, size=(pares, meses))
+    cobertura = rng.uniform(0.6, 1.2, size=(pares, meses))
+    sald_30mas = sald_k * icv
+    prov_k = sald_30mas * cobertura
+    
+    def entero(valores):
+        return np.rint(valores).astype('int64').ravel()
+    
+    return pd.DataFrame({
+        'fecha_analisis': np.tile(mes_key, pares),
+        'alianza': np.repeat(nombres_alianza, productos * meses),
+        'producto': np.tile(np.repeat(nombres_producto, meses), alianzas),
+        'prov_k_ifrs': entero(prov_k),
+        'prov_t_ifrs': entero(prov_k * rng.uniform(1.3, 1.5, size=(pares, meses))),
+        'sald_30mas': entero(sald_30mas),
+        'sald_k_ifrs': entero(sald_k),
+        'sald_t_ifrs': entero(sald_k * rng.uniform(1.05, 1.15, size=(pares, meses))),
+        'saldo_castigo': entero(sald_k * rng.uniform(0.01, 0.03, size=(pares, meses))),
+        'saldo_castigo_t': entero(sald_k * rng.uniform(0.015, 0.04, size=(pares, meses)))
+    })
+
+def _generar_cond_recu(rng, prov, multiplicidad, fraccion_nulos):
+    """Movimientos de condonación y recuperación con fecha como serial de Excel"""
+    base = prov.loc[prov.index.repeat(multiplicidad), ['fecha_analisis', 'alianza', 'producto']]
+    n = len(base)
+    
+    # Día aleatorio dentro del mes, como número de serie de Excel
+    mes_key = base['fecha_analisis'].to_numpy()
+    primer_dia = pd.to_datetime({'year': mes_key // 100, 'month': mes_key % 100, 'day': 1})
+    dias = (primer_dia.to_numpy().astype('datetime64[D]') - ORIGEN_SERIAL).astype('int64')
+    serial = dias + rng.integers(0, 28, size=n)
+    
+    saldo = np.repeat(prov['sald_30mas'].to_numpy(), multiplicidad) / multiplicidad
+    condonaciones = np.rint(saldo * rng.uniform(0, 0.02, size=n))
+    recuperaciones = np.rint(saldo * rng.uniform(0, 0.05, size=n))
+    condonaciones[rng.random(n) < fraccion_nulos] = np.nan
+    recuperaciones[rng.random(n) < fraccion_nulos / 5] = np.nan
+    
+    return pd.DataFrame({
+        'fecha_analisis': serial,
+        'alianza': base['alianza'].to_numpy(),
+        'producto': base['producto'].to_numpy(),
+        'condonaciones': condonaciones,
+        'recuperaciones': recuperaciones
+    })
+
+def _escribir_hoja(ws, df):
+    """Escribe un DataFrame en una hoja write-only con tipos de Python nativos y None para nulos"""
+    ws.append(list(df.columns))
+    columnas = [df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns]
+    for fila in zip(*columnas):
+        ws.append(fila)
+
+def archivo_sintetico(tamano, semilla=42, directorio=DIRECTORIO_SINTETICOS):
+    """
+    Ruta del libro sintético de un tamaño; lo genera si aún no existe
+    
+    Returns:
+        str: Ruta del libro
+    """
+    parametros = TAMANOS[tamano]
+    nombre = '_'.join(f'{clave}{valor}' for clave, valor in parametros.items())
+    archivo = os.path.join(directorio, f'provisiones_{nombre}_s{semilla}.xlsx')
+    if not os.path.exists(archivo):
+        generar_provisiones(archivo, semilla=semilla, **parametros)
+    return archivo
+
+def _rss_pico_mb():
+    """Memoria residente pico del proceso (ru_maxrss está en KB en Linux y en bytes en macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+def _medir_tamano(tamano, archivo, modo_exportacion):
+    """
+    Ejecuta carga, cálculo y exportación en el proceso actual
+    
+    El RSS pico es el del proceso al terminar cada fase, por lo que solo es
+    comparable si el proceso es nuevo; ver ejecutar_benchmark.
+    
+    Returns:
+        list: Una medición por fase
+    """
+    from preparar_datos_powerbi import PowerBIDataPreparator
+    
+    preparador = PowerBIDataPreparator()
+    salida = tempfile.mkdtemp(prefix='benchmark_provisiones_')
+    mediciones = []
+    
+    def medir(fase, funcion, registros):
+        inicio = time.perf_counter()
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            funcion()
+        segundos = time.perf_counter() - inicio
+        filas = registros()
+        mediciones.append({
+            'tamaño': tamano,
+            'fase': fase,
+            'registros': filas,
+            'segundos': round(segundos, 4),
+            'rss_pico_mb': round(_rss_pico_mb(), 1),
+            'registros_por_segundo': round(filas / segundos, 1) if segundos > 0 else None
+        })
+    
+    try:
+        medir('carga', lambda: preparador.load_provisiones_data(archivo),
+              lambda: len(preparador.prov_df) + len(preparador.cond_recu_df))
+        medir('calculo', preparador.calculate_metrics,
+              lambda: len(preparador.dataset_final))
+        medir('exportacion',
+              lambda: preparador.export_for_powerbi(
+                  os.path.join(salida, 'provisiones_powerbi.xlsx'), modo=modo_exportacion),
+              lambda: len(preparador.dataset_final))
+    finally:
+        shutil.rmtree(salida, ignore_errors=True)
+    
+    return mediciones
+
+def ejecutar_benchmark(tamanos=('actual', 'pequeño', 'mediano'), modo_exportacion='excel',
+                       semilla=42):
+    """
+    Mide cada tamaño en un proceso nuevo para que el RSS pico no arrastre
+    memoria de tamaños anteriores
+    
+    Args:
+        tamanos (tuple): Claves de TAMANOS a medir
+        modo_exportacion (str): Modo de export_for_powerbi
+        semilla (int): Semilla de los libros sintéticos
+    
+    Returns:
+        pd.DataFrame: Una fila por tamaño y fase
+    """
+    desconocidos = [tamano for tamano in tamanos if tamano not in TAMANOS]
+    if desconocidos:
+        raise ValueError(f"Tamaños no definidos: {desconocidos}")
+    
+    mediciones = []
+    contexto = multiprocessing.get_context('spawn')
+    for tamano in tamanos:
+        archivo = archivo_sintetico(tamano, semilla)
+        print(f"Midiendo tamaño '{tamano}' ({archivo})...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+            mediciones.extend(
+                executor.submit(_medir_tamano, tamano, archivo, modo_exportacion).result()
+            )
+    
+    return pd.DataFrame(mediciones)
+
+def comparar_exportacion(tamano='mediano', semilla=42):
+    """
+    Compara los modos de export_for_powerbi sobre un libro sintético
+    
+    Returns:
+        pd.DataFrame: Resultado de benchmark_exportacion para el tamaño
+    """
+    from preparar_datos_powerbi import PowerBIDataPreparator, benchmark_exportacion
+    
+    preparador = PowerBIDataPreparator()
+    salida = tempfile.mkdtemp(prefix='benchmark_exportacion_')
+    try:
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            preparador.load_provisiones_data(archivo_sintetico(tamano, semilla))
+            preparador.calculate_metrics()
+            resultados = benchmark_exportacion(preparador, salida)
+    finally:
+        shutil.rmtree(salida, ignore_errors=True)
+    
+    resultados.insert(0, 'tamaño', tamano)
+    return resultados
+
+def guardar_linea_base(resultados, archivo=ARCHIVO_LINEA_BASE, modo_exportacion='excel', semilla=42):
+    """Guarda los resultados junto con el entorno y los parámetros de generación"""
+    contenido = {
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'nucleos': os.cpu_count()
+        },
+        'parametros': {
+            'semilla': semilla,
+            'modo_exportacion': modo_exportacion,
+            'tamaños': {tamano: TAMANOS[tamano] for tamano in resultados['tamaño'].unique()}
+        },
+        'resultados': resultados.to_dict(orient='records')
+    }
+    
+    os.makedirs(os.path.dirname(archivo) or '.', exist_ok=True)
+    temporal = archivo + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, archivo)
+
+def comparar_linea_base(resultados, archivo=ARCHIVO_LINEA_BASE):
+    """
+    Compara resultados contra una línea base guardada
+    
+    Returns:
+        pd.DataFrame: Segundos y RSS de ambas ejecuciones por tamaño y fase, con
+            la variación porcentual (positiva = más lento o más memoria)
+    """
+    with open(archivo, 'r', encoding='utf-8') as f:
+        base = pd.DataFrame(json.load(f)['resultados'])
+    
+    comparacion = resultados.merge(
+        base[['tamaño', 'fase', 'registros', 'segundos', 'rss_pico_mb']],
+        on=['tamaño', 'fase'], how='left', suffixes=('', '_base')
+    )
+    comparacion['var_segundos_pct'] = (
+        (comparacion['segundos'] / comparacion['segundos_base'] - 1) * 100
+    ).round(1)
+    comparacion['var_rss_pct'] = (
+        (comparacion['rss_pico_mb'] / comparacion['rss_pico_mb_base'] - 1) * 100
+    ).round(1)
+    
+    distintos = comparacion['registros_base'].notna() & (
+        comparacion['registros'] != comparacion['registros_base']
+    )
+    if distintos.any():
+        print("Advertencia: la línea base se midió con otros datos en "
+              f"{sorted(comparacion.loc[distintos, 'tamaño'].unique())}")
+    
+    return comparacion[['tamaño', 'fase', 'segundos_base', 'segundos', 'var_segundos_pct',
+                        'rss_pico_mb_base', 'rss_pico_mb', 'var_rss_pct']]
+
+def main():
+    """Ejecuta el benchmark y guarda o compara contra la línea base"""
+    parser = argparse.ArgumentParser(description='Benchmark de PowerBIDataPreparator')
+    parser.add_argument('tamanos', nargs='*', default=['actual', 'pequeño', 'mediano'],
+                        help=f"Tamaños a medir: {', '.join(TAMANOS)}")
+    parser.add_argument('--modo', default='excel', help='Modo de exportación')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--linea-base', default=ARCHIVO_LINEA_BASE)
+    parser.add_argument('--guardar', action='store_true',
+                        help='Sobrescribe la línea base con esta ejecución')
+    parser.add_argument('--exportacion', action='store_true',
+                        help='Compara tiempo y memoria de los modos de exportación en cada tamaño')
+    args = parser.parse_args()
+    
+    try:
+        if args.exportacion:
+            resultados = pd.concat(
+                [comparar_exportacion(tamano, args.semilla) for tamano in args.tamanos],
+                ignore_index=True
+            )
+            print("\nMODOS DE EXPORTACIÓN")
+            print(resultados.to_string(index=False))
+            return
+        
+        resultados = ejecutar_benchmark(args.tamanos, args.modo, args.semilla)
+        print("\nRESULTADOS")
+        print(resultados.to_string(index=False))
+        
+        if os.path.exists(args.linea_base) and not args.guardar:
+            print(f"\nCOMPARACIÓN CONTRA {args.linea_base}")
+            print(comparar_linea_base(resultados, args.linea_base).to_string(index=False))
+        else:
+            guardar_linea_base(resultados, args.linea_base, args.modo, args.semilla)
+            print(f"\nLínea base guardada en: {args.linea_base}")
+    
+    except Exception as e:
+        print(f"Error en el benchmark: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
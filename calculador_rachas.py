@@ -4,14 +4,23 @@ Calculador de Rachas - Ejercicio 3
 Identifica rachas consecutivas de clientes por nivel de deuda
 """
 
+import os
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
+from perfilador_calidad import PerfiladorCalidad, imprimir_reporte
+from cargador_excel import leer_libro, ESPECIFICACION_RACHAS
+from almacen_columnar import guardar_columnas, abrir_columnas
+
+DIRECTORIO_ALMACEN = 'data/output/almacen_rachas'
 
 class CalculadorRachas:
     """Clase para calcular rachas de clientes por nivel de saldo"""
     
+    # Estado de destino de los clientes que salen por retiro
+    ESTADO_RETIRO = 'RETIRO'
+    
     def __init__(self, fecha_base='2024-12-31'):
         """
         Inicializa el calculador
@@ -22,6 +31,10 @@ class CalculadorRachas:
         self.fecha_base = pd.to_datetime(fecha_base)
         self.historia_df = None
         self.retiros_df = None
+        self.serie_completa_df = None
+        self.indice_clientes = None
+        self.almacen = None
+        self.reporte_calidad = None
         self.niveles_definidos = {
             'N0': (0, 300000),
             'N1': (300000, 1000000),
@@ -30,23 +43,91 @@ class CalculadorRachas:
             'N4': (5000000, float('inf'))
         }
     
-    def cargar_datos(self, archivo_rachas='data/raw/Rachas.xlsx'):
-        """Carga los datos desde el archivo Excel"""
-        print(f"Cargando datos desde {archivo_rachas}...")
+    def cargar_datos(self, archivo_rachas='data/raw/Rachas.xlsx', muestra_max=None):
+        """
+        Carga los datos desde el archivo Excel
         
-        # Cargar historia
-        self.historia_df = pd.read_excel(archivo_rachas, sheet_name='historia')
-        self.historia_df['corte_mes'] = pd.to_datetime(self.historia_df['corte_mes'])
+        Args:
+            archivo_rachas (str): Libro con las hojas 'historia' y 'retiros'
+            muestra_max (int): Perfila la calidad sobre una muestra de este tamaño
+                en hojas mayores; el reporte queda marcado como aproximado
+        """
+        print(f"Cargando datos desde {archivo_rachas}...")
         
-        # Cargar retiros
-        self.retiros_df = pd.read_excel(archivo_rachas, sheet_name='retiros')
-        self.retiros_df['fecha_retiro'] = pd.to_datetime(self.retiros_df['fecha_retiro'])
+        # Cargar historia y retiros abriendo el libro una sola vez
+        hojas = leer_libro(archivo_rachas, ESPECIFICACION_RACHAS)
+        self.historia_df = hojas['historia']
+        self.retiros_df = hojas['retiros']
         
         print(f"Datos cargados: {len(self.historia_df)} registros de historia, {len(self.retiros_df)} retiros")
         
+        self.perfilar_datos(muestra_max)
+        
         # Filtrar por fecha base
         self.historia_df = self.historia_df[self.historia_df['corte_mes'] <= self.fecha_base]
         print(f"Filtrado por fecha base {self.fecha_base}: {len(self.historia_df)} registros")
+        
+        self.construir_indice_clientes()
+    
+    def construir_indice_clientes(self):
+        """
+        Construye el índice de clientes sobre historia_df
+        
+        La historia queda ordenada por (identificacion, corte_mes) en arreglos
+        contiguos y cada cliente apunta a su tramo [inicio, fin). Las consultas
+        por cliente cortan esos arreglos en lugar de recorrer todo el DataFrame.
+        El orden es estable, de modo que ante registros duplicados de un mes se
+        conserva el primero en el orden del archivo.
+        
+        Returns:
+            dict: Índice con arreglos ordenados, tramos por cliente, fechas del
+                periodo y fechas de retiro
+        """
+        identificaciones = self.historia_df['identificacion'].to_numpy()
+        orden = np.lexsort((self.historia_df['corte_mes'].to_numpy(), identificaciones))
+        ids = identificaciones[orden]
+        
+        # Inicio de cada cliente donde cambia la identificación en el arreglo ordenado
+        cortes = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        inicios = np.concatenate(([0], cortes)) if len(ids) else np.array([], dtype=int)
+        fines = np.concatenate((cortes, [len(ids)])) if len(ids) else np.array([], dtype=int)
+        
+        self.indice_clientes = {
+            'tramos': {ids[i]: (int(i), int(f)) for i, f in zip(inicios, fines)},
+            'fechas': self.historia_df['corte_mes'].to_numpy()[orden],
+            'saldos': self.historia_df['saldo'].to_numpy()[orden],
+            'fechas_unicas': np.sort(self.historia_df['corte_mes'].unique()),
+            'retiros': dict(zip(self.retiros_df['identificacion'], self.retiros_df['fecha_retiro']))
+        }
+        return self.indice_clientes
+    
+    def perfilar_datos(self, muestra_max=None):
+        """
+        Perfila la calidad de historia y retiros
+        
+        Args:
+            muestra_max (int): Perfila una muestra de este tamaño en datasets mayores
+            
+        Returns:
+            dict: Reporte de calidad por hoja
+        """
+        perfilador = PerfiladorCalidad(muestra_max=muestra_max)
+        self.reporte_calidad = {
+            'historia': perfilador.perfilar(
+                self.historia_df, 'historia',
+                claves=['identificacion', 'corte_mes'],
+                reglas_rango={'saldo': (0, None), 'corte_mes': (None, self.fecha_base)}
+            ),
+            'retiros': perfilador.perfilar(
+                self.retiros_df, 'retiros', claves=['identificacion']
+            )
+        }
+        
+        print("Calidad de datos (completitud %):")
+        for reporte in self.reporte_calidad.values():
+            imprimir_reporte(reporte)
+        
+        return self.reporte_calidad
     
     def clasificar_nivel(self, saldo):
         """Clasifica un saldo en su nivel correspondiente"""
@@ -62,58 +143,13 @@ class CalculadorRachas:
         """
         print("Generando serie temporal completa...")
         
-        # Obtener todas las fechas únicas
-        fechas_unicas = sorted(self.historia_df['corte_mes'].unique())
-        clientes_unicos = self.historia_df['identificacion'].unique()
+        if self.indice_clientes is None:
+            self.construir_indice_clientes()
         
-        # Crear diccionario de retiros para consulta rápida
-        retiros_dict = {}
-        for _, row in self.retiros_df.iterrows():
-            retiros_dict[row['identificacion']] = row['fecha_retiro']
-        
-        # Lista para almacenar la serie completa
+        # Clientes en orden de primera aparición, como historia_df['identificacion'].unique()
         serie_completa = []
-        
-        for cliente in clientes_unicos:
-            # Obtener datos del cliente
-            datos_cliente = self.historia_df[
-                self.historia_df['identificacion'] == cliente
-            ].sort_values('corte_mes')
-            
-            # Fecha de retiro del cliente (si existe)
-            fecha_retiro = retiros_dict.get(cliente)
-            
-            # Primera aparición del cliente
-            primera_fecha = datos_cliente['corte_mes'].min()
-            
-            for fecha in fechas_unicas:
-                # Solo considerar fechas desde la primera aparición
-                if fecha < primera_fecha:
-                    continue
-                
-                # Si el cliente se retiró y la fecha es posterior, no incluir
-                if fecha_retiro and fecha > fecha_retiro:
-                    continue
-                
-                # Buscar el registro para esta fecha
-                registro = datos_cliente[datos_cliente['corte_mes'] == fecha]
-                
-                if len(registro) > 0:
-                    # Existe registro real
-                    saldo = registro.iloc[0]['saldo']
-                    nivel = self.clasificar_nivel(saldo)
-                else:
-                    # No existe registro, asignar N0
-                    saldo = 0
-                    nivel = 'N0'
-                
-                serie_completa.append({
-                    'identificacion': cliente,
-                    'corte_mes': fecha,
-                    'saldo': saldo,
-                    'nivel': nivel,
-                    'es_real': len(registro) > 0
-                })
+        for cliente in self.historia_df['identificacion'].unique():
+            serie_completa.extend(self._serie_desde_indice(cliente))
         
         # Convertir a DataFrame
         self.serie_completa_df = pd.DataFrame(serie_completa)
@@ -122,6 +158,125 @@ class CalculadorRachas:
         print(f"Serie temporal completa generada: {len(self.serie_completa_df)} registros")
         return self.serie_completa_df
     
+    def _serie_desde_indice(self, cliente):
+        """
+        Serie mensual de un cliente desde su tramo en el índice
+        
+        Incluye las fechas del periodo desde su primera aparición y hasta su
+        retiro; los meses sin registro se asumen N0 con saldo 0.
+        
+        Returns:
+            list: Un dict por mes, vacío si el cliente no está en la historia
+        """
+        tramo = self.indice_clientes['tramos'].get(cliente)
+        if tramo is None:
+            return []
+        
+        inicio, fin = tramo
+        fechas_cliente = self.indice_clientes['fechas'][inicio:fin]
+        saldos_cliente = self.indice_clientes['saldos'][inicio:fin]
+        fechas = self.indice_clientes['fechas_unicas']
+        
+        # Solo considerar fechas desde la primera aparición y, si se retiró, hasta el retiro
+        fechas = fechas[fechas >= fechas_cliente[0]]
+        fecha_retiro = self.indice_clientes['retiros'].get(cliente)
+        if fecha_retiro and not pd.isna(fecha_retiro):
+            fechas = fechas[fechas <= np.datetime64(fecha_retiro)]
+        
+        # Posición del primer registro real de cada fecha dentro del tramo
+        posiciones = np.searchsorted(fechas_cliente, fechas, side='left')
+        es_real = posiciones < len(fechas_cliente)
+        es_real[es_real] = fechas_cliente[posiciones[es_real]] == fechas[es_real]
+        
+        serie = []
+        for fecha, posicion, real in zip(fechas, posiciones, es_real):
+            if real:
+                saldo = saldos_cliente[posicion]
+                nivel = self.clasificar_nivel(saldo)
+            else:
+                saldo = 0
+                nivel = 'N0'
+            serie.append({
+                'identificacion': cliente,
+                'corte_mes': pd.Timestamp(fecha),
+                'saldo': saldo,
+                'nivel': nivel,
+                'es_real': bool(real)
+            })
+        return serie
+    
+    def serie_clientes(self, clientes):
+        """
+        Serie temporal completa de uno o varios clientes sin generar la del portafolio
+        
+        Args:
+            clientes (str | list): Identificación o lista de identificaciones
+        
+        Returns:
+            pd.DataFrame: Mismas columnas que generar_serie_temporal_completa
+        """
+        if self.indice_clientes is None:
+            self.construir_indice_clientes()
+        
+        serie = []
+        for cliente in self._como_lista(clientes):
+            serie.extend(self._serie_desde_indice(cliente))
+        return pd.DataFrame(serie, columns=['identificacion', 'corte_mes', 'saldo', 'nivel', 'es_real'])
+    
+    def rachas_clientes(self, clientes, min_racha=1):
+        """
+        Todas las rachas de uno o varios clientes
+        
+        Args:
+            clientes (str | list): Identificación o lista de identificaciones
+            min_racha (int): Número mínimo de meses consecutivos
+        
+        Returns:
+            pd.DataFrame: identificacion, nivel, longitud, fecha_inicio y fecha_fin
+        """
+        rachas = []
+        for cliente in self._como_lista(clientes):
+            datos_cliente = self.serie_clientes(cliente)
+            for racha in self._calcular_rachas_cliente(datos_cliente, min_racha):
+                rachas.append({'identificacion': cliente, **racha})
+        
+        rachas_df = pd.DataFrame(
+            rachas, columns=['identificacion', 'nivel', 'longitud', 'fecha_inicio', 'fecha_fin']
+        )
+        rachas_df['fecha_inicio'] = pd.to_datetime(rachas_df['fecha_inicio'])
+        rachas_df['fecha_fin'] = pd.to_datetime(rachas_df['fecha_fin'])
+        return rachas_df
+    
+    def mejor_racha_clientes(self, clientes, min_racha=1):
+        """
+        Mejor racha de uno o varios clientes con los criterios de calcular_rachas
+        
+        Args:
+            clientes (str | list): Identificación o lista de identificaciones
+            min_racha (int): Número mínimo de meses consecutivos
+        
+        Returns:
+            pd.DataFrame: Mismas columnas y orden que calcular_rachas; los
+                clientes sin racha válida no aparecen
+        """
+        resultado = []
+        for cliente in self._como_lista(clientes):
+            datos_cliente = self.serie_clientes(cliente)
+            mejor_racha = self._seleccionar_mejor_racha(
+                self._calcular_rachas_cliente(datos_cliente, min_racha)
+            )
+            if mejor_racha:
+                resultado.append(self._fila_resultado(cliente, mejor_racha))
+        
+        return self._ordenar_resultado(
+            pd.DataFrame(resultado, columns=['identificacion', 'racha', 'fecha_fin', 'nivel'])
+        )
+    
+    @staticmethod
+    def _como_lista(clientes):
+        """Acepta una identificación suelta o una colección de identificaciones"""
+        return [clientes] if isinstance(clientes, str) else list(clientes)
+    
     def calcular_rachas(self, min_racha=1):
         """
         Calcula las rachas consecutivas por cliente y nivel
@@ -134,15 +289,21 @@ class CalculadorRachas:
         """
         print(f"Calculando rachas (mínimo {min_racha} meses)...")
         
-        if self.serie_completa_df is None:
-            self.generar_serie_temporal_completa()
+        self._asegurar_serie()
         
         rachas_resultado = []
         
-        for cliente in self.serie_completa_df['identificacion'].unique():
-            datos_cliente = self.serie_completa_df[
-                self.serie_completa_df['identificacion'] == cliente
-            ].sort_values('corte_mes')
+        # La serie está ordenada por (identificacion, corte_mes): cada cliente es un
+        # tramo contiguo y se recorre por cortes en lugar de filtrar el DataFrame
+        serie = self.serie_completa_df.sort_values(['identificacion', 'corte_mes'])
+        ids = serie['identificacion'].to_numpy()
+        cortes = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        
+        for inicio, fin in zip(np.concatenate(([0], cortes)), np.concatenate((cortes, [len(ids)]))):
+            if inicio == fin:
+                continue
+            cliente = ids[inicio]
+            datos_cliente = serie.iloc[inicio:fin]
             
             # Calcular rachas por nivel
             rachas_cliente = self._calcular_rachas_cliente(datos_cliente, min_racha)
@@ -151,21 +312,31 @@ class CalculadorRachas:
             mejor_racha = self._seleccionar_mejor_racha(rachas_cliente)
             
             if mejor_racha:
-                rachas_resultado.append({
-                    'identificacion': cliente,
-                    'racha': mejor_racha['longitud'],
-                    'fecha_fin': mejor_racha['fecha_fin'],
-                    'nivel': mejor_racha['nivel']
-                })
+                rachas_resultado.append(self._fila_resultado(cliente, mejor_racha))
         
         # Convertir a DataFrame y ordenar
-        resultado_df = pd.DataFrame(rachas_resultado)
-        if not resultado_df.empty:
-            resultado_df = resultado_df.sort_values(['racha', 'fecha_fin'], ascending=[False, False])
+        resultado_df = self._ordenar_resultado(pd.DataFrame(rachas_resultado))
         
         print(f"Rachas calculadas: {len(resultado_df)} clientes con rachas >= {min_racha}")
         return resultado_df
     
+    @staticmethod
+    def _fila_resultado(cliente, mejor_racha):
+        """Fila del resultado de rachas para la mejor racha de un cliente"""
+        return {
+            'identificacion': cliente,
+            'racha': mejor_racha['longitud'],
+            'fecha_fin': mejor_racha['fecha_fin'],
+            'nivel': mejor_racha['nivel']
+        }
+    
+    @staticmethod
+    def _ordenar_resultado(resultado_df):
+        """Ordena por racha y fecha_fin descendentes"""
+        if not resultado_df.empty:
+            resultado_df = resultado_df.sort_values(['racha', 'fecha_fin'], ascending=[False, False])
+        return resultado_df
+    
     def _calcular_rachas_cliente(self, datos_cliente, min_racha):
         """Calcula todas las rachas de un cliente específico"""
         rachas = []
@@ -241,8 +412,499 @@ class CalculadorRachas:
         
         return rachas_validas[0]
     
-    def generar_reporte(self, resultado_df):
-        """Genera un reporte detallado de los resultados"""
+    def calcular_transiciones(self):
+        """
+        Matrices de migración entre niveles en meses consecutivos
+        
+        Cada par de meses consecutivos de un cliente en la serie completa es una
+        transición (origen, destino) atribuida al mes de destino. La última fila
+        de un cliente retirado antes del último mes genera una salida a RETIRO en
+        el mes siguiente. Los pares se codifican como un índice entero
+        (mes, origen, destino) y se cuentan con una sola llamada a np.bincount.
+        
+        Returns:
+            dict: 'mensual' con las transiciones de cada mes en formato largo y
+                la tasa sobre los clientes del nivel de origen, y 'acumulada'
+                con la matriz de conteos del periodo (origen x destino)
+        """
+        print("Calculando matrices de transición...")
+        
+        id_cliente, clientes, id_mes, meses, nivel = self._codificar_serie()
+        niveles = list(self.niveles_definidos)
+        destinos = niveles + [self.ESTADO_RETIRO]
+        n_origen, n_destino = len(niveles), len(destinos)
+        
+        # Pares de meses consecutivos del mismo cliente
+        mismo_cliente = id_cliente[1:] == id_cliente[:-1]
+        origen = nivel[:-1][mismo_cliente]
+        destino = nivel[1:][mismo_cliente]
+        mes = id_mes[1:][mismo_cliente]
+        
+        # Salidas: última fila de clientes con retiro cuya serie termina antes del último mes
+        con_retiro = pd.Series(clientes).map(self._mapa_retiros()).notna().to_numpy()
+        es_ultima = np.append(~mismo_cliente, True)[:len(id_cliente)]
+        salida = es_ultima & con_retiro[id_cliente] & (id_mes + 1 < len(meses))
+        
+        origen = np.concatenate((origen, nivel[salida]))
+        destino = np.concatenate((destino, np.full(int(salida.sum()), n_origen)))
+        mes = np.concatenate((mes, id_mes[salida] + 1))
+        
+        # Niveles fuera de niveles_definidos ('ERROR') no entran en las matrices
+        validos = (origen >= 0) & (destino >= 0)
+        if not validos.all():
+            print(f"Transiciones descartadas por nivel no definido: {int((~validos).sum())}")
+        
+        conteos = np.bincount(
+            (mes[validos] * n_origen + origen[validos]) * n_destino + destino[validos],
+            minlength=len(meses) * n_origen * n_destino
+        ).reshape(len(meses), n_origen, n_destino)
+        
+        # El primer mes no es destino de ninguna transición
+        por_mes = conteos[1:]
+        totales = por_mes.sum(axis=2, keepdims=True)
+        tasas = np.divide(por_mes, totales, out=np.zeros(por_mes.shape), where=totales > 0)
+        
+        mensual = pd.DataFrame({
+            'corte_mes': np.repeat(meses[1:], n_origen * n_destino),
+            'nivel_origen': np.tile(np.repeat(niveles, n_destino), len(meses) - 1),
+            'nivel_destino': np.tile(destinos, (len(meses) - 1) * n_origen),
+            'clientes': por_mes.ravel(),
+            'tasa': tasas.ravel().round(6)
+        })
+        
+        acumulada = pd.DataFrame(
+            conteos.sum(axis=0),
+            index=pd.Index(niveles, name='nivel_origen'),
+            columns=destinos
+        )
+        
+        print(f"Transiciones calculadas: {int(conteos.sum())} en {len(meses) - 1} meses "
+              f"({int(salida.sum())} salidas por retiro)")
+        return {'mensual': mensual, 'acumulada': acumulada}
+    
+    def _codificar_serie(self, columnas_extra=()):
+        """
+        Serie completa como arreglos enteros ordenados por (cliente, mes)
+        
+        Args:
+            columnas_extra (tuple): Columnas de la serie a retornar en el mismo orden
+        
+        Returns:
+            tuple: (código de cliente, identificaciones, índice de mes, meses
+                ordenados, código de nivel según niveles_definidos con -1 para
+                niveles no definidos, seguidos de un arreglo por columna extra)
+        """
+        niveles = list(self.niveles_definidos)
+        
+        if self.serie_completa_df is None and self.almacen is not None:
+            # Directo sobre las columnas mapeadas: códigos de cliente y de mes sin
+            # materializar el DataFrame; el nivel se traduce con una tabla de búsqueda
+            tabla = self.almacen['serie']
+            id_cliente = tabla.columnas['identificacion']
+            clientes = tabla.diccionario('identificacion')
+            id_mes, meses = tabla.indice_meses('corte_mes')
+            traduccion = [niveles.index(valor) if valor in niveles else -1
+                          for valor in tabla.diccionario('nivel')]
+            nivel = np.array(traduccion + [-1], dtype='int64')[tabla.columnas['nivel']]
+            extras = [tabla.columnas[col] for col in columnas_extra]
+        else:
+            self._asegurar_serie()
+            serie = self.serie_completa_df
+            meses = np.sort(serie['corte_mes'].unique())
+            id_cliente, clientes = pd.factorize(serie['identificacion'])
+            id_mes = np.searchsorted(meses, serie['corte_mes'].to_numpy())
+            nivel = pd.Categorical(serie['nivel'], categories=niveles).codes.astype('int64')
+            extras = [serie[col].to_numpy() for col in columnas_extra]
+        
+        # La serie generada ya viene ordenada y en ese caso no se reordena
+        llave = id_cliente.astype('int64') * len(meses) + id_mes
+        if not (llave[1:] > llave[:-1]).all():
+            orden = np.argsort(llave, kind='stable')
+            id_cliente, id_mes, nivel = id_cliente[orden], id_mes[orden], nivel[orden]
+            extras = [valores[orden] for valores in extras]
+        
+        return (id_cliente, clientes, id_mes, meses, nivel, *extras)
+    
+    def _mapa_retiros(self):
+        """Fecha de retiro por cliente: la del índice si está construido, si no desde retiros_df"""
+        if self.indice_clientes is not None:
+            return self.indice_clientes['retiros']
+        return dict(zip(self.retiros_df['identificacion'], self.retiros_df['fecha_retiro']))
+    
+    def _asegurar_serie(self):
+        """Serie completa desde el almacén abierto si lo hay; si no, la genera"""
+        if self.serie_completa_df is not None:
+            return self.serie_completa_df
+        if self.almacen is not None:
+            self.serie_completa_df = self.almacen['serie'].to_dataframe()
+            return self.serie_completa_df
+        return self.generar_serie_temporal_completa()
+    
+    def guardar_almacen(self, directorio=DIRECTORIO_ALMACEN, todas_rachas=None):
+        """
+        Persiste la serie completa, la tabla de todas las rachas y los retiros en columnas binarias
+        
+        Cada tabla queda en su subdirectorio (serie/, rachas/ y retiros/) con el
+        formato de almacen_columnar. La serie se guarda ordenada por
+        (identificacion, corte_mes), de modo que al reabrirla los análisis no la
+        reordenan. Los retiros permiten atribuir las salidas a RETIRO sin volver
+        a leer el Excel.
+        
+        Args:
+            directorio (str): Directorio del almacén
+            todas_rachas (pd.DataFrame): Resultado de calcular_todas_rachas; se
+                calcula si no se entrega
+            
+        Returns:
+            str: Directorio del almacén
+        """
+        serie = self._asegurar_serie()
+        if todas_rachas is None:
+            todas_rachas = self.calcular_todas_rachas()
+        
+        guardar_columnas(os.path.join(directorio, 'serie'),
+                         serie.sort_values(['identificacion', 'corte_mes'], kind='stable'))
+        guardar_columnas(os.path.join(directorio, 'rachas'), todas_rachas)
+        guardar_columnas(os.path.join(directorio, 'retiros'),
+                         self.retiros_df[['identificacion', 'fecha_retiro']])
+        
+        print(f"Almacén guardado en {directorio}: {len(serie)} registros de serie, "
+              f"{len(todas_rachas)} rachas, {len(self.retiros_df)} retiros")
+        return directorio
+    
+    def abrir_almacen(self, directorio=DIRECTORIO_ALMACEN):
+        """
+        Abre un almacén guardado con guardar_almacen sin leer los datos
+        
+        Las columnas quedan mapeadas en memoria y compartidas con otros procesos
+        que abran el mismo almacén. Los análisis vectorizados (transiciones,
+        todas las rachas, escenarios) trabajan directo sobre ellas; calcular_rachas
+        materializa serie_completa_df desde el almacén en lugar de regenerarla.
+        retiros_df se reconstruye desde el almacén, que es una tabla pequeña.
+        
+        Returns:
+            dict: {'serie': TablaColumnar, 'rachas': TablaColumnar, 'retiros': TablaColumnar}
+        """
+        self.almacen = {
+            'serie': abrir_columnas(os.path.join(directorio, 'serie')),
+            'rachas': abrir_columnas(os.path.join(directorio, 'rachas')),
+            'retiros': abrir_columnas(os.path.join(directorio, 'retiros'))
+        }
+        self.retiros_df = self.almacen['retiros'].to_dataframe()
+        self.serie_completa_df = None
+        return self.almacen
+    
+    def exportar_transiciones(self, transiciones, directorio='data/output'):
+        """
+        Exporta las matrices de transición junto al resultado de rachas
+        
+        Args:
+            transiciones (dict): Resultado de calcular_transiciones
+            directorio (str): Directorio de salida
+            
+        Returns:
+            list: Rutas de los archivos escritos
+        """
+        os.makedirs(directorio, exist_ok=True)
+        rutas = [
+            os.path.join(directorio, 'transiciones_mensuales.csv'),
+            os.path.join(directorio, 'transiciones_acumuladas.csv')
+        ]
+        transiciones['mensual'].to_csv(rutas[0], index=False)
+        transiciones['acumulada'].to_csv(rutas[1])
+        return rutas
+    
+    def calcular_todas_rachas(self, min_racha=1):
+        """
+        Todas las rachas de todos los clientes, no solo la mejor de cada uno
+        
+        Una racha es un tramo máximo de meses consecutivos de un cliente en el
+        mismo nivel, igual que en _calcular_rachas_cliente. Se obtienen con una
+        codificación por longitud de corridas sobre la serie completa: una
+        racha nueva empieza donde cambia el cliente o el nivel.
+        
+        Una racha está censurada si sigue abierta en el último corte de la serie:
+        es la última del cliente, termina en el último mes observado (no
+        posterior a fecha_base) y el cliente no tiene retiro en o antes de ese
+        mes. Su duración real es al menos la observada. Si el cliente se retiró
+        en el último mes, la racha terminó con el retiro y no está censurada.
+        
+        Args:
+            min_racha (int): Longitud mínima de las rachas retornadas
+            
+        Returns:
+            pd.DataFrame: identificacion, nivel, longitud, fecha_inicio,
+                fecha_fin y censurada, una fila por racha
+        """
+        print(f"Calculando todas las rachas (mínimo {min_racha} meses)...")
+        
+        id_cliente, clientes, id_mes, meses, nivel = self._codificar_serie()
+        
+        nuevo_cliente = np.ones(len(id_cliente), dtype=bool)
+        nuevo_cliente[1:] = id_cliente[1:] != id_cliente[:-1]
+        inicio = nuevo_cliente.copy()
+        inicio[1:] |= nivel[1:] != nivel[:-1]
+        
+        posicion_inicio = np.flatnonzero(inicio)
+        posicion_fin = np.append(posicion_inicio[1:], len(id_cliente)) - 1
+        longitud = posicion_fin - posicion_inicio + 1
+        
+        # La racha termina en la última fila del cliente si la siguiente fila es de otro cliente
+        ultima_del_cliente = np.append(nuevo_cliente[1:], True)[posicion_fin]
+        fechas_retiro = pd.to_datetime(pd.Series(clientes).map(self._mapa_retiros()))
+        retirado = (fechas_retiro <= meses[-1]).to_numpy() if len(meses) else np.zeros(len(clientes), dtype=bool)
+        censurada = (ultima_del_cliente & (id_mes[posicion_fin] == len(meses) - 1)
+                     & ~retirado[id_cliente[posicion_fin]])
+        
+        # Rachas en niveles no definidos ('ERROR') no se reportan
+        validas = (nivel[posicion_inicio] >= 0) & (longitud >= min_racha)
+        posicion_inicio, posicion_fin = posicion_inicio[validas], posicion_fin[validas]
+        
+        niveles = np.array(list(self.niveles_definidos), dtype=object)
+        rachas_df = pd.DataFrame({
+            'identificacion': np.asarray(clientes, dtype=object)[id_cliente[posicion_inicio]],
+            'nivel': niveles[nivel[posicion_inicio]],
+            'longitud': longitud[validas],
+            'fecha_inicio': meses[id_mes[posicion_inicio]],
+            'fecha_fin': meses[id_mes[posicion_fin]],
+            'censurada': censurada[validas]
+        })
+        
+        print(f"Rachas encontradas: {len(rachas_df)} ({int(rachas_df['censurada'].sum())} censuradas)")
+        return rachas_df
+    
+    def estadisticas_rachas(self, rachas_df):
+        """
+        Distribución y supervivencia de la longitud de las rachas por nivel
+        
+        Los conteos por (nivel, longitud) salen de una sola llamada a
+        np.bincount; las curvas se obtienen con sumas acumuladas sobre esos
+        conteos. La supervivencia empírica es la fracción de rachas con longitud
+        >= k. La de Kaplan-Meier trata las rachas censuradas como observadas
+        solo hasta su longitud actual: S(k) = prod_{j<k} (1 - d_j / n_j), con d_j
+        rachas terminadas en j meses y n_j rachas que llegaron a j meses.
+        
+        Args:
+            rachas_df (pd.DataFrame): Resultado de calcular_todas_rachas
+            
+        Returns:
+            dict: 'histograma' (nivel, longitud, rachas, censuradas) y
+                'supervivencia' (nivel, meses, en_riesgo, terminadas,
+                censuradas, supervivencia_empirica, supervivencia_km)
+        """
+        niveles = list(self.niveles_definidos)
+        codigo = pd.Categorical(rachas_df['nivel'], categories=niveles).codes.astype('int64')
+        longitud = rachas_df['longitud'].to_numpy().astype('int64')
+        censurada = rachas_df['censurada'].to_numpy().astype(bool)
+        max_longitud = int(longitud.max()) if len(longitud) else 0
+        ancho = max_longitud + 1
+        
+        def contar(mascara):
+            return np.bincount(
+                codigo[mascara] * ancho + longitud[mascara], minlength=len(niveles) * ancho
+            ).reshape(len(niveles), ancho)
+        
+        validas = codigo >= 0
+        total = contar(validas)
+        censuradas = contar(validas & censurada)
+        terminadas = total - censuradas
+        
+        # Rachas con longitud >= k: suma acumulada desde las longitudes mayores
+        en_riesgo = np.cumsum(total[:, ::-1], axis=1)[:, ::-1]
+        rachas_nivel = en_riesgo[:, :1]
+        empirica = np.divide(en_riesgo, rachas_nivel, out=np.zeros(en_riesgo.shape),
+                             where=rachas_nivel > 0)
+        
+        # Kaplan-Meier: S(k) es el producto de las supervivencias condicionales de j < k
+        condicional = 1 - np.divide(terminadas, en_riesgo, out=np.zeros(en_riesgo.shape),
+                                    where=en_riesgo > 0)
+        km = np.cumprod(np.concatenate(
+            (np.ones((len(niveles), 1)), condicional[:, :-1]), axis=1
+        ), axis=1)
+        
+        # Longitud 0 no existe; las tablas empiezan en 1 mes
+        histograma = pd.DataFrame({
+            'nivel': np.repeat(niveles, max_longitud),
+            'longitud': np.tile(np.arange(1, ancho), len(niveles)),
+            'rachas': total[:, 1:].ravel(),
+            'censuradas': censuradas[:, 1:].ravel()
+        })
+        supervivencia = pd.DataFrame({
+            'nivel': np.repeat(niveles, max_longitud),
+            'meses': np.tile(np.arange(1, ancho), len(niveles)),
+            'en_riesgo': en_riesgo[:, 1:].ravel(),
+            'terminadas': terminadas[:, 1:].ravel(),
+            'censuradas': censuradas[:, 1:].ravel(),
+            'supervivencia_empirica': empirica[:, 1:].ravel().round(6),
+            'supervivencia_km': km[:, 1:].ravel().round(6)
+        })
+        
+        return {'histograma': histograma, 'supervivencia': supervivencia}
+    
+    def exportar_estadisticas_rachas(self, rachas_df, estadisticas, directorio='data/output'):
+        """
+        Exporta todas las rachas, el histograma y las curvas de supervivencia
+        
+        Returns:
+            list: Rutas de los archivos escritos
+        """
+        os.makedirs(directorio, exist_ok=True)
+        tablas = {
+            'rachas_todas.csv': rachas_df,
+            'rachas_histograma.csv': estadisticas['histograma'],
+            'rachas_supervivencia.csv': estadisticas['supervivencia']
+        }
+        rutas = []
+        for nombre, tabla in tablas.items():
+            ruta = os.path.join(directorio, nombre)
+            tabla.to_csv(ruta, index=False)
+            rutas.append(ruta)
+        return rutas
+    
+    def evaluar_escenarios(self, escenarios, min_racha=1, base='base'):
+        """
+        Mejor racha por cliente bajo varias tablas de umbrales en una pasada
+        
+        Los saldos de la serie completa se ordenan una sola vez; en cada
+        escenario la clasificación es una búsqueda binaria de sus límites sobre
+        ese arreglo ordenado. Los códigos de nivel de todos los escenarios
+        forman una matriz (escenario x fila) sobre la que se detectan las
+        rachas y se elige la mejor de cada cliente con los mismos criterios de
+        calcular_rachas (más larga y, en empate, la más reciente).
+        
+        Los meses sin registro quedan en N0 en todos los escenarios, como en
+        generar_serie_temporal_completa, de modo que cada escenario coincide con
+        una corrida completa de calcular_rachas con esa tabla de umbrales.
+        
+        Args:
+            escenarios (dict): {nombre: tabla de umbrales} con el formato de
+                niveles_definidos, p. ej. {'n2_1_5M': {'N0': (0, 300000),
+                'N1': (300000, 1500000), 'N2': (1500000, 3000000), ...}}
+            min_racha (int): Número mínimo de meses consecutivos
+            base (str): Nombre del escenario con niveles_definidos; se agrega
+                si no viene en escenarios
+            
+        Returns:
+            dict: 'detalle' con la mejor racha por escenario y cliente (mismas
+                columnas y orden que calcular_rachas más 'escenario') y
+                'comparacion' con un resumen por escenario frente al base
+        """
+        escenarios = {base: self.niveles_definidos, **escenarios}
+        nombres = list(escenarios)
+        print(f"Evaluando {len(nombres)} escenarios de umbrales (mínimo {min_racha} meses)...")
+        
+        id_cliente, clientes, id_mes, meses, _, saldos, es_real = self._codificar_serie(('saldo', 'es_real'))
+        imputado = ~es_real.astype(bool)
+        n = len(id_cliente)
+        
+        # Orden único de saldos; los nulos quedan al final y no caen en ningún nivel
+        saldos = saldos.astype('float64')
+        orden = np.argsort(saldos, kind='stable')
+        saldos_ordenados = saldos[orden]
+        
+        niveles_por_escenario = [list(tabla) for tabla in escenarios.values()]
+        codigos = np.full((len(nombres), n), -1, dtype='int16')
+        for fila, tabla in enumerate(escenarios.values()):
+            codigos_ordenados = np.full(n, -1, dtype='int16')
+            # En orden inverso para que, si los rangos se traslapan, gane el
+            # primer nivel que cumple min <= saldo < max como en clasificar_nivel
+            for k, (minimo, maximo) in reversed(list(enumerate(tabla.values()))):
+                desde = np.searchsorted(saldos_ordenados, minimo, side='left')
+                hasta = np.searchsorted(saldos_ordenados, maximo, side='left')
+                codigos_ordenados[desde:hasta] = k
+            codigos[fila, orden] = codigos_ordenados
+            codigos[fila, imputado] = list(tabla).index('N0') if 'N0' in tabla else -1
+        
+        # Inicio de racha: cambio de cliente o de nivel; la columna 0 inicia cada escenario
+        nuevo_cliente = np.ones(n, dtype=bool)
+        nuevo_cliente[1:] = id_cliente[1:] != id_cliente[:-1]
+        inicio = np.empty(codigos.shape, dtype=bool)
+        inicio[:, 0] = True
+        inicio[:, 1:] = (codigos[:, 1:] != codigos[:, :-1]) | nuevo_cliente[1:]
+        
+        escenario, posicion_inicio = np.nonzero(inicio)
+        plano_inicio = escenario * n + posicion_inicio
+        plano_fin = np.append(plano_inicio[1:], codigos.size) - 1
+        posicion_fin = plano_fin - escenario * n
+        longitud = plano_fin - plano_inicio + 1
+        nivel = codigos.ravel()[plano_inicio]
+        
+        validas = (nivel >= 0) & (longitud >= min_racha) & (meses[id_mes[posicion_fin]] <= self.fecha_base)
+        escenario, cliente = escenario[validas], id_cliente[posicion_inicio[validas]]
+        longitud, nivel, mes_fin = longitud[validas], nivel[validas], id_mes[posicion_fin[validas]]
+        
+        # Mejor racha por (escenario, cliente): la primera tras ordenar por
+        # longitud y fecha de fin descendentes
+        orden = np.lexsort((-mes_fin, -longitud, cliente, escenario))
+        escenario, cliente = escenario[orden], cliente[orden]
+        primera = np.ones(len(orden), dtype=bool)
+        primera[1:] = (escenario[1:] != escenario[:-1]) | (cliente[1:] != cliente[:-1])
+        
+        escenario, cliente = escenario[primera], cliente[primera]
+        longitud, nivel, mes_fin = longitud[orden][primera], nivel[orden][primera], mes_fin[orden][primera]
+        nombres_nivel = [np.array(niveles, dtype=object) for niveles in niveles_por_escenario]
+        
+        detalle = []
+        for fila, nombre in enumerate(nombres):
+            seleccion = escenario == fila
+            resultado_df = self._ordenar_resultado(pd.DataFrame({
+                'identificacion': np.asarray(clientes, dtype=object)[cliente[seleccion]],
+                'racha': longitud[seleccion],
+                'fecha_fin': meses[mes_fin[seleccion]],
+                'nivel': nombres_nivel[fila][nivel[seleccion]]
+            }))
+            resultado_df.insert(0, 'escenario', nombre)
+            detalle.append(resultado_df)
+        detalle = pd.concat(detalle, ignore_index=True)
+        
+        print(f"Escenarios evaluados: {len(nombres)} sobre {n} registros de la serie")
+        return {'detalle': detalle, 'comparacion': self._comparar_escenarios(detalle, nombres, base)}
+    
+    @staticmethod
+    def _comparar_escenarios(detalle, nombres, base):
+        """Resumen por escenario y cambios de racha o nivel frente al escenario base"""
+        resumen = detalle.groupby('escenario', sort=False).agg(
+            clientes=('identificacion', 'size'),
+            racha_promedio=('racha', 'mean'),
+            racha_maxima=('racha', 'max')
+        ).reindex(nombres)
+        resumen['clientes'] = resumen['clientes'].fillna(0).astype('int64')
+        resumen['racha_promedio'] = resumen['racha_promedio'].round(2)
+        
+        por_nivel = pd.crosstab(detalle['escenario'], detalle['nivel']).reindex(nombres, fill_value=0)
+        por_nivel.columns = [f'clientes_{nivel}' for nivel in por_nivel.columns]
+        
+        # Cruce con el base por cliente: cambios de nivel, de longitud y clientes que entran o salen
+        cruce = detalle.merge(
+            detalle.loc[detalle['escenario'] == base, ['identificacion', 'racha', 'nivel']],
+            on='identificacion', how='left', suffixes=('', '_base')
+        )
+        cambios = pd.DataFrame({
+            'cambia_nivel': cruce['nivel'].notna() & cruce['nivel_base'].notna()
+                            & (cruce['nivel'] != cruce['nivel_base']),
+            'cambia_racha': cruce['racha'].notna() & cruce['racha_base'].notna()
+                            & (cruce['racha'] != cruce['racha_base']),
+            'ganan_racha': cruce['racha_base'].isna()
+        }).groupby(cruce['escenario']).sum().reindex(nombres, fill_value=0)
+        
+        # Clientes con racha en el base que no la tienen en el escenario
+        en_base = set(detalle.loc[detalle['escenario'] == base, 'identificacion'])
+        cambios['pierden_racha'] = [
+            len(en_base - set(detalle.loc[detalle['escenario'] == nombre, 'identificacion']))
+            for nombre in nombres
+        ]
+        
+        return pd.concat([resumen, cambios, por_nivel], axis=1).reset_index()
+    
+    def generar_reporte(self, resultado_df, estadisticas=None):
+        """
+        Genera un reporte detallado de los resultados
+        
+        Args:
+            resultado_df (pd.DataFrame): Mejor racha por cliente
+            estadisticas (dict): Resultado de estadisticas_rachas; si se entrega
+                se agrega la distribución de todas las rachas por nivel
+        """
         print("\n" + "="*60)
         print("REPORTE DE RACHAS")
         print("="*60)
@@ -274,6 +936,19 @@ class CalculadorRachas:
             print(f"  {i:2d}. {row['identificacion']}: {row['racha']} meses "
                   f"(Nivel {row['nivel']}, hasta {row['fecha_fin'].strftime('%Y-%m-%d')})")
         
+        if estadisticas is not None:
+            print(f"\nTODAS LAS RACHAS POR NIVEL:")
+            histograma = estadisticas['histograma']
+            supervivencia = estadisticas['supervivencia'].set_index(['nivel', 'meses'])
+            for nivel, tabla in histograma.groupby('nivel', sort=True):
+                rachas = tabla['rachas'].sum()
+                if rachas == 0:
+                    continue
+                promedio = (tabla['longitud'] * tabla['rachas']).sum() / rachas
+                km_3 = supervivencia['supervivencia_km'].get((nivel, 3), 0.0)
+                print(f"  {nivel}: {rachas} rachas, {tabla['censuradas'].sum()} censuradas, "
+                      f"promedio {promedio:.1f} meses, P(>= 3 meses) = {km_3:.2f}")
+        
         return resultado_df
 
 def main():
@@ -291,14 +966,28 @@ def main():
         # Calcular rachas con mínimo 3 meses
         resultado = calculador.calcular_rachas(min_racha=3)
         
+        # Todas las rachas con su distribución y supervivencia por nivel
+        todas_rachas = calculador.calcular_todas_rachas()
+        estadisticas = calculador.estadisticas_rachas(todas_rachas)
+        
         # Generar reporte
-        calculador.generar_reporte(resultado)
+        calculador.generar_reporte(resultado, estadisticas)
         
         # Guardar resultado
         if not resultado.empty:
             resultado.to_csv('data/output/rachas_resultado.csv', index=False)
             print(f"\nResultado guardado en: data/output/rachas_resultado.csv")
         
+        # Matrices de migración entre niveles
+        transiciones = calculador.calcular_transiciones()
+        print("\nMATRIZ DE TRANSICIÓN ACUMULADA:")
+        print(transiciones['acumulada'].to_string())
+        for ruta in calculador.exportar_transiciones(transiciones):
+            print(f"Transiciones guardadas en: {ruta}")
+        
+        for ruta in calculador.exportar_estadisticas_rachas(todas_rachas, estadisticas):
+            print(f"Estadísticas de rachas guardadas en: {ruta}")
+        
         return resultado
         
     except Exception as e:
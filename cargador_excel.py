@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Cargador de libros Excel
+Abre cada libro una sola vez en modo read-only y extrae todas las hojas
+requeridas con tipos y columnas de fecha declarados de antemano
+"""
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Especificación por hoja: {hoja: {columna: tipo}} con tipo en
+# 'texto', 'entero', 'decimal' o 'fecha'. Los montos y saldos son 'decimal':
+# 'entero' es solo para claves y exige valores sin parte fraccionaria. Las
+# columnas no declaradas se conservan con el tipo que infiera pandas
+ESPECIFICACION_RACHAS = {
+    'historia': {
+        'identificacion': 'texto',
+        'corte_mes': 'fecha',
+        'saldo': 'decimal'
+    },
+    'retiros': {
+        'identificacion': 'texto',
+        'fecha_retiro': 'fecha'
+    }
+}
+
+ESPECIFICACION_PROVISIONES = {
+    'Prov': {
+        'fecha_analisis': 'entero',
+        'alianza': 'texto',
+        'producto': 'texto',
+        'prov_k_ifrs': 'decimal',
+        'prov_t_ifrs': 'decimal',
+        'sald_30mas': 'decimal',
+        'sald_k_ifrs': 'decimal',
+        'sald_t_ifrs': 'decimal',
+        'saldo_castigo': 'decimal',
+        'saldo_castigo_t': 'decimal'
+    },
+    'cond y recu': {
+        'fecha_analisis': 'fecha',
+        'alianza': 'texto',
+        'producto': 'texto',
+        'condonaciones': 'decimal',
+        'recuperaciones': 'decimal'
+    }
+}
+
+# Origen de los números de serie de fecha de Excel (sistema 1900)
+ORIGEN_FECHAS_EXCEL = '1899-12-30'
+
+def leer_libro(archivo, especificacion):
+    """
+    Abre un libro una sola vez y extrae las hojas de la especificación
+    
+    Args:
+        archivo (str): Ruta al archivo Excel
+        especificacion (dict): {hoja: {columna: tipo}} de las hojas a extraer
+    
+    Returns:
+        dict: {hoja: pd.DataFrame} con los tipos declarados aplicados
+    """
+    wb = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hojas = {}
+        for hoja, tipos in especificacion.items():
+            if hoja not in wb.sheetnames:
+                raise ValueError(f"La hoja '{hoja}' no existe en {archivo}")
+            
+            filas = wb[hoja].iter_rows(values_only=True)
+            columnas = list(next(filas, ()))
+            datos = list(filas)
+            
+            # En modo read-only las dimensiones pueden incluir filas vacías al final
+            while datos and all(valor is None for valor in datos[-1]):
+                datos.pop()
+            
+            hojas[hoja] = aplicar_tipos(pd.DataFrame(datos, columns=columnas), tipos, hoja)
+        return hojas
+    finally:
+        wb.close()
+
+def iter_sheet_blocks(archivo, hoja, filas_por_bloque=100000, tipos=None):
+    """
+    Lee una hoja de Excel en modo read-only y la entrega por bloques de filas
+    
+    Args:
+        archivo (str): Ruta al archivo Excel
+        hoja (str): Nombre de la hoja; la primera fila se toma como encabezado
+        filas_por_bloque (int): Filas por DataFrame entregado
+        tipos (dict): {columna: tipo} aplicado a cada bloque
+    
+    Yields:
+        pd.DataFrame: Bloque de filas con las columnas del encabezado
+    """
+    wb = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = wb[hoja].iter_rows(values_only=True)
+        columnas = list(next(filas))
+        bloque = []
+        for fila in filas:
+            if all(valor is None for valor in fila):
+                continue
+            bloque.append(fila)
+            if len(bloque) >= filas_por_bloque:
+                yield aplicar_tipos(pd.DataFrame(bloque, columns=columnas), tipos, hoja)
+                bloque = []
+        if bloque:
+            yield aplicar_tipos(pd.DataFrame(bloque, columns=columnas), tipos, hoja)
+    finally:
+        wb.close()
+
+def aplicar_tipos(df, tipos, hoja=''):
+    """
+    Convierte las columnas declaradas a su tipo
+    
+    Los enteros con nulos quedan como float64, igual que con pd.read_excel; un
+    entero con parte fraccionaria es un error.
+    Las fechas aceptan tanto fechas de Excel como números de serie.
+    
+    Args:
+        df (pd.DataFrame): Filas leídas de la hoja
+        tipos (dict): {columna: tipo}
+        hoja (str): Nombre de la hoja para los mensajes de error
+    
+    Returns:
+        pd.DataFrame: DataFrame con los tipos aplicados
+    """
+    if not tipos:
+        return df
+    
+    faltantes = [col for col in tipos if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"Columnas faltantes en la hoja '{hoja}': {faltantes}")
+    
+    for col, tipo in tipos.items():
+        serie = df[col]
+        if tipo == 'fecha':
+            if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+                df[col] = pd.to_datetime(serie, unit='D', origin=ORIGEN_FECHAS_EXCEL)
+            else:
+                df[col] = pd.to_datetime(serie)
+        elif tipo == 'entero':
+            serie = pd.to_numeric(serie)
+            # Un valor con parte fraccionaria no es un entero: se rechaza en
+            # lugar de truncarlo al convertir
+            fraccionarios = serie.notna() & (serie % 1 != 0)
+            if fraccionarios.any():
+                raise ValueError(
+                    f"La columna '{col}' de la hoja '{hoja}' se declaró entera pero tiene "
+                    f"{int(fraccionarios.sum())} valores con decimales (p. ej. {serie[fraccionarios].iloc[0]})"
+                )
+            df[col] = serie.astype('float64' if serie.isna().any() else 'int64')
+        elif tipo == 'decimal':
+            df[col] = pd.to_numeric(serie).astype('float64')
+        elif tipo == 'texto':
+            df[col] = serie.astype(object).where(serie.isna(), serie.astype(str))
+        else:
+            raise ValueError(f"Tipo de columna desconocido para '{col}': {tipo}")
+    
+    return df
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Ejecutor del pipeline completo
+Modela los procesos batch como un grafo de etapas con entradas, salidas y
+parámetros declarados. Omite las etapas cuya huella no cambió y ejecuta en
+paralelo, en procesos separados, las ramas independientes
+"""
+
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import inspect
+import argparse
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+ARCHIVO_ESTADO = 'data/output/pipeline_estado.json'
+DIRECTORIO_LOGS = 'data/output/logs'
+
+def etapa_rachas_python(fecha_base, min_racha, salida):
+    """Rachas, matrices de transición y estadísticas de rachas con el calculador de Python"""
+    from calculador_rachas import CalculadorRachas
+    
+    calculador = CalculadorRachas(fecha_base=fecha_base)
+    calculador.cargar_datos()
+    calculador.generar_serie_temporal_completa()
+    resultado = calculador.calcular_rachas(min_racha=min_racha)
+    todas_rachas = calculador.calcular_todas_rachas()
+    estadisticas = calculador.estadisticas_rachas(todas_rachas)
+    calculador.generar_reporte(resultado, estadisticas)
+    resultado.to_csv(salida, index=False)
+    calculador.exportar_transiciones(calculador.calcular_transiciones(), os.path.dirname(salida))
+    calculador.exportar_estadisticas_rachas(todas_rachas, estadisticas, os.path.dirname(salida))
+
+def etapa_base_datos(fecha_base, db_path):
+    """Crea la base SQLite, carga el Excel y genera la serie completa"""
+    from src.ejercicio3_rachas.python.database_manager import DatabaseManager
+    
+    db_manager = DatabaseManager(db_path)
+    db_manager.connect()
+    try:
+        db_manager.create_schema()
+        db_manager.load_data_from_excel()
+        db_manager.generate_complete_series(fecha_base)
+    finally:
+        db_manager.disconnect()
+
+def etapa_rachas_sql(fecha_base, min_racha, db_path, salida, resultado_python):
+    """
+    Rachas con la consulta SQL y comparación contra el resultado de Python
+    
+    La comparación es por cliente sobre racha, fecha_fin y nivel; los clientes
+    que difieren se listan en el log de la etapa.
+    """
+    import pandas as pd
+    from src.ejercicio3_rachas.python.database_manager import DatabaseManager
+    
+    db_manager = DatabaseManager(db_path)
+    db_manager.connect()
+    try:
+        resultado_sql = db_manager.execute_rachas_query(min_racha=min_racha, fecha_base=fecha_base)
+        db_manager.export_results_to_csv(salida)
+    finally:
+        db_manager.disconnect()
+    
+    resultado_py = pd.read_csv(resultado_python)
+    print(f"COMPARACIÓN SQL vs PYTHON: {len(resultado_sql)} vs {len(resultado_py)} clientes")
+    
+    claves = ['identificacion', 'racha', 'fecha_fin', 'nivel']
+    comparables = [
+        resultado[claves].assign(fecha_fin=pd.to_datetime(resultado['fecha_fin']))
+        for resultado in (resultado_sql, resultado_py)
+    ]
+    cruce = comparables[0].merge(comparables[1], on='identificacion', how='outer',
+                                 suffixes=('_sql', '_python'), indicator=True)
+    distintos = cruce[
+        (cruce['_merge'] != 'both')
+        | (cruce['racha_sql'] != cruce['racha_python'])
+        | (cruce['fecha_fin_sql'] != cruce['fecha_fin_python'])
+        | (cruce['nivel_sql'] != cruce['nivel_python'])
+    ].sort_values('identificacion')
+    
+    if distintos.empty:
+        print("Resultados idénticos por cliente")
+    else:
+        print(f"ADVERTENCIA: {len(distintos)} clientes con racha, fecha_fin o nivel distintos:")
+        print(distintos.drop(columns='_merge').to_string(index=False))
+
+def etapa_powerbi(archivo, salida):
+    """Preparación de datos de provisiones para Power BI"""
+    from preparar_datos_powerbi import PowerBIDataPreparator
+    
+    preparador = PowerBIDataPreparator()
+    preparador.load_provisiones_data(archivo)
+    preparador.calculate_metrics()
+    preparador.export_for_powerbi(salida)
+
+# Grafo de etapas. 'entradas' son archivos externos al pipeline; la salida de
+# una etapa previa se declara con 'depende_de', y su huella entra en la huella
+# de las etapas dependientes. 'codigo' declara solo los módulos de entrada: los
+# módulos del proyecto que importan se agregan con codigo_etapa
+ETAPAS = {
+    'rachas_python': {
+        'funcion': etapa_rachas_python,
+        'depende_de': [],
+        'entradas': ['data/raw/Rachas.xlsx'],
+        'codigo': ['calculador_rachas.py'],
+        'parametros': {
+            'fecha_base': '2024-12-31',
+            'min_racha': 3,
+            'salida': 'data/output/rachas_resultado.csv'
+        },
+        'salidas': [
+            'data/output/rachas_resultado.csv',
+            'data/output/transiciones_mensuales.csv',
+            'data/output/transiciones_acumuladas.csv',
+            'data/output/rachas_todas.csv',
+            'data/output/rachas_histograma.csv',
+            'data/output/rachas_supervivencia.csv'
+        ]
+    },
+    'base_datos': {
+        'funcion': etapa_base_datos,
+        'depende_de': [],
+        'entradas': ['data/raw/Rachas.xlsx', 'src/ejercicio3_rachas/sql/schema.sql'],
+        'codigo': ['src/ejercicio3_rachas/python/database_manager.py'],
+        'parametros': {
+            'fecha_base': '2024-12-31',
+            'db_path': 'data/output/rachas.db'
+        },
+        'salidas': ['data/output/rachas.db']
+    },
+    'rachas_sql': {
+        'funcion': etapa_rachas_sql,
+        'depende_de': ['base_datos', 'rachas_python'],
+        'entradas': ['src/ejercicio3_rachas/sql/rachas_query.sql'],
+        'codigo': ['src/ejercicio3_rachas/python/database_manager.py'],
+        'parametros': {
+            'fecha_base': '2024-12-31',
+            'min_racha': 3,
+            'db_path': 'data/output/rachas.db',
+            'salida': 'data/output/rachas_sql_resultado.csv',
+            'resultado_python': 'data/output/rachas_resultado.csv'
+        },
+        'salidas': ['data/output/rachas_sql_resultado.csv']
+    },
+    'powerbi': {
+        'funcion': etapa_powerbi,
+        'depende_de': [],
+        'entradas': ['data/raw/Provisiones.xlsx'],
+        'codigo': ['preparar_datos_powerbi.py'],
+        'parametros': {
+            'archivo': 'data/raw/Provisiones.xlsx',
+            'salida': 'data/output/provisiones_powerbi.xlsx'
+        },
+        'salidas': ['data/output/provisiones_powerbi.xlsx']
+    }
+}
+
+def hash_archivo(ruta, bloque=1 << 20):
+    """SHA-256 del contenido de un archivo; None si no existe"""
+    if not os.path.exists(ruta):
+        return None
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for parte in iter(lambda: f.read(bloque), b''):
+            digest.update(parte)
+    return digest.hexdigest()
+
+def codigo_etapa(modulos):
+    """
+    Módulos declarados y, transitivamente, los módulos del proyecto que importan
+    
+    Las importaciones se leen con ast, incluidas las que están dentro de
+    funciones. Un nombre importado es del proyecto si su archivo .py existe
+    bajo la raíz o junto al módulo que lo importa; las bibliotecas externas
+    no se resuelven y quedan fuera.
+    
+    Args:
+        modulos (list): Rutas de los módulos de entrada de la etapa
+    
+    Returns:
+        list: Rutas ordenadas de todos los módulos del proyecto alcanzados
+    """
+    vistos = set()
+    pendientes = [os.path.normpath(ruta) for ruta in modulos]
+    while pendientes:
+        ruta = pendientes.pop()
+        if ruta in vistos:
+            continue
+        vistos.add(ruta)
+        if os.path.exists(ruta):
+            pendientes.extend(_importaciones_locales(ruta) - vistos)
+    return sorted(vistos)
+
+def _importaciones_locales(ruta):
+    """Rutas de los módulos del proyecto que importa un archivo"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        arbol = ast.parse(f.read(), filename=ruta)
+    
+    directorio = os.path.dirname(ruta)
+    nombres = []
+    for nodo in ast.walk(arbol):
+        if isinstance(nodo, ast.Import):
+            nombres.extend(alias.name for alias in nodo.names)
+        elif isinstance(nodo, ast.ImportFrom):
+            modulo = nodo.module or ''
+            if nodo.level:
+                # Importación relativa: se resuelve desde el paquete del archivo
+                base = directorio
+                for _ in range(nodo.level - 1):
+                    base = os.path.dirname(base)
+                modulo = '.'.join(filter(None, [base.replace(os.sep, '.'), modulo]))
+            nombres.append(modulo)
+            # 'from paquete import modulo' también puede nombrar un submódulo
+            nombres.extend(f'{modulo}.{alias.name}' for alias in nodo.names if modulo)
+    
+    encontrados = set()
+    for nombre in nombres:
+        relativa = nombre.replace('.', os.sep) + '.py'
+        for candidato in (relativa, os.path.join(directorio, relativa)):
+            if os.path.isfile(candidato):
+                encontrados.add(os.path.normpath(candidato))
+    return encontrados
+
+def calcular_huella(nombre, etapa, huellas_dependencias):
+    """
+    Huella de una etapa: contenido de entradas y código (incluido el fuente de
+    la función de la etapa), parámetros y huellas de las etapas de las que depende
+    
+    Args:
+        nombre (str): Nombre de la etapa
+        etapa (dict): Definición de la etapa en ETAPAS
+        huellas_dependencias (dict): Huella ya calculada de cada dependencia
+    
+    Returns:
+        str: SHA-256 hexadecimal
+    """
+    contenido = {
+        'etapa': nombre,
+        'entradas': {ruta: hash_archivo(ruta) for ruta in etapa['entradas']},
+        # La función de la etapa vive en este archivo y no en sus módulos de código
+        'funcion': hashlib.sha256(inspect.getsource(etapa['funcion']).encode('utf-8')).hexdigest(),
+        'codigo': {ruta: hash_archivo(ruta) for ruta in codigo_etapa(etapa['codigo'])},
+        'parametros': etapa['parametros'],
+        'dependencias': {dep: huellas_dependencias[dep] for dep in etapa['depende_de']}
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True).encode('utf-8')).hexdigest()
+
+def cargar_estado(ruta=ARCHIVO_ESTADO):
+    """Huellas de la última ejecución exitosa de cada etapa"""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_estado(estado, ruta=ARCHIVO_ESTADO):
+    """Guarda el estado de forma atómica"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def _ejecutar_etapa(nombre):
+    """
+    Ejecuta una etapa en el proceso trabajador con su salida redirigida a un log
+    
+    Returns:
+        float: Segundos de ejecución
+    """
+    etapa = ETAPAS[nombre]
+    os.makedirs(DIRECTORIO_LOGS, exist_ok=True)
+    ruta_log = os.path.join(DIRECTORIO_LOGS, f'{nombre}.log')
+    
+    inicio = time.perf_counter()
+    with open(ruta_log, 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            etapa['funcion'](**etapa['parametros'])
+        except Exception:
+            traceback.print_exc()
+            raise
+    return time.perf_counter() - inicio
+
+def validar_grafo(etapas):
+    """Verifica dependencias conocidas y ausencia de ciclos; retorna un orden topológico"""
+    orden = []
+    visitadas = {}
+    
+    def visitar(nombre, camino):
+        if visitadas.get(nombre) == 'listo':
+            return
+        if visitadas.get(nombre) == 'visitando':
+            raise ValueError(f"Ciclo en el pipeline: {' -> '.join(camino + [nombre])}")
+        visitadas[nombre] = 'visitando'
+        for dep in etapas[nombre]['depende_de']:
+            if dep not in etapas:
+                raise ValueError(f"La etapa '{nombre}' depende de una etapa desconocida: {dep}")
+            visitar(dep, camino + [nombre])
+        visitadas[nombre] = 'listo'
+        orden.append(nombre)
+    
+    for nombre in etapas:
+        visitar(nombre, [])
+    return orden
+
+def ejecutar_pipeline(seleccion=None, forzar=False, max_procesos=None):
+    """
+    Ejecuta el grafo de etapas
+    
+    Una etapa se omite si su huella coincide con la de la última ejecución
+    exitosa y todas sus salidas existen. Las etapas listas se envían al pool de
+    procesos en cuanto terminan sus dependencias. Si una etapa falla, sus
+    dependientes quedan bloqueadas.
+    
+    Args:
+        seleccion (list): Etapas a ejecutar (se agregan sus dependencias); None = todas
+        forzar (bool): Ejecuta todas las etapas aunque su huella no haya cambiado
+        max_procesos (int): Procesos trabajadores; por defecto uno por núcleo
+    
+    Returns:
+        dict: {etapa: {'estado': ..., 'segundos': ...}}
+    """
+    orden = validar_grafo(ETAPAS)
+    
+    if seleccion:
+        incluidas = set()
+        pendientes = list(seleccion)
+        while pendientes:
+            nombre = pendientes.pop()
+            if nombre not in ETAPAS:
+                raise ValueError(f"Etapa desconocida: {nombre}")
+            if nombre not in incluidas:
+                incluidas.add(nombre)
+                pendientes.extend(ETAPAS[nombre]['depende_de'])
+        orden = [nombre for nombre in orden if nombre in incluidas]
+    
+    estado = cargar_estado()
+    huellas = {}
+    resultados = {}
+    en_curso = {}
+    inicio_total = time.perf_counter()
+    
+    print("EJECUTANDO PIPELINE")
+    print("=" * 50)
+    
+    with ProcessPoolExecutor(max_workers=max_procesos) as executor:
+        while len(resultados) < len(orden):
+            for nombre in orden:
+                if nombre in resultados or nombre in en_curso.values():
+                    continue
+                
+                deps = ETAPAS[nombre]['depende_de']
+                fallidas = [dep for dep in deps
+                            if resultados.get(dep, {}).get('estado') in ('fallida', 'bloqueada')]
+                if fallidas:
+                    resultados[nombre] = {'estado': 'bloqueada', 'segundos': 0.0}
+                    print(f"  {nombre}: bloqueada por {', '.join(fallidas)}")
+                    continue
+                if not all(dep in resultados for dep in deps):
+                    continue
+                
+                etapa = ETAPAS[nombre]
+                huellas[nombre] = calcular_huella(nombre, etapa, huellas)
+                salidas_presentes = all(os.path.exists(ruta) for ruta in etapa['salidas'])
+                
+                if not forzar and salidas_presentes and estado.get(nombre) == huellas[nombre]:
+                    resultados[nombre] = {'estado': 'omitida', 'segundos': 0.0}
+                    print(f"  {nombre}: sin cambios, se omite")
+                    continue
+                
+                print(f"  {nombre}: en ejecución")
+                en_curso[executor.submit(_ejecutar_etapa, nombre)] = nombre
+            
+            if not en_curso:
+                continue
+            
+            terminados, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                try:
+                    segundos = futuro.result()
+                except Exception as e:
+                    resultados[nombre] = {'estado': 'fallida', 'segundos': 0.0}
+                    estado.pop(nombre, None)
+                    guardar_estado(estado)
+                    print(f"  {nombre}: falló ({e}); ver {DIRECTORIO_LOGS}/{nombre}.log")
+                    continue
+                
+                resultados[nombre] = {'estado': 'ejecutada', 'segundos': segundos}
+                estado[nombre] = huellas[nombre]
+                guardar_estado(estado)
+                print(f"  {nombre}: completada en {segundos:.2f} s")
+    
+    total = time.perf_counter() - inicio_total
+    imprimir_resumen(resultados, orden, total)
+    return resultados
+
+def imprimir_resumen(resultados, orden, total):
+    """Imprime el tiempo y estado de cada etapa"""
+    print(f"\nRESUMEN POR ETAPA:")
+    for nombre in orden:
+        resultado = resultados[nombre]
+        print(f"  {nombre:<15} {resultado['estado']:<10} {resultado['segundos']:8.2f} s")
+    
+    secuencial = sum(resultado['segundos'] for resultado in resultados.values())
+    print(f"  Tiempo total: {total:.2f} s (suma de etapas: {secuencial:.2f} s)")
+
+def main():
+    """Punto de entrada del pipeline"""
+    parser = argparse.ArgumentParser(description="Ejecuta el pipeline de rachas y provisiones")
+    parser.add_argument('etapas', nargs='*', help="Etapas a ejecutar (por defecto todas)")
+    parser.add_argument('--forzar', action='store_true', help="Ignora las huellas y ejecuta todo")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos trabajadores")
+    args = parser.parse_args()
+    
+    try:
+        resultados = ejecutar_pipeline(args.etapas or None, args.forzar, args.procesos)
+        if any(r['estado'] in ('fallida', 'bloqueada') for r in resultados.values()):
+            sys.exit(1)
+    except Exception as e:
+        print(f"Error en el pipeline: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
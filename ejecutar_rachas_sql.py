@@ -4,18 +4,29 @@ Ejecutor de consulta SQL para análisis de rachas
 Compara resultados SQL vs Python
 """
 
+import argparse
 import pandas as pd
-from src.ejercicio3_rachas.python.database_manager import DatabaseManager
+from src.ejercicio3_rachas.python.database_manager import crear_manager
+from src.ejercicio3_rachas.python.trazador_sql import TrazadorSQL
 
 def main():
     """Ejecuta análisis de rachas SQL y compara con Python"""
+    parser = argparse.ArgumentParser(description='Análisis de rachas SQL')
+    parser.add_argument('--fragmentos', type=int, default=1,
+                        help='Cantidad de archivos SQLite creados con database_manager.py --fragmentos')
+    parser.add_argument('--trazar', action='store_true',
+                        help='Registra tiempos por sentencia y operación, y las sentencias lentas con su plan')
+    parser.add_argument('--umbral-lento-ms', type=float, default=100,
+                        help='Duración desde la cual una sentencia va al log de lentas')
+    args = parser.parse_args()
+    trazador = TrazadorSQL(args.umbral_lento_ms) if args.trazar else None
     
     print("EJECUTANDO ANÁLISIS DE RACHAS SQL")
     print("="*50)
     
     try:
         # Conectar a la base de datos
-        db_manager = DatabaseManager()
+        db_manager = crear_manager(fragmentos=args.fragmentos, trazador=trazador)
         db_manager.connect()
         
         # Ejecutar consulta SQL de rachas
@@ -86,6 +97,9 @@ def main():
         # Cerrar conexión
         db_manager.disconnect()
         
+        if trazador:
+            trazador.imprimir_resumen()
+        
         print(f"\nANÁLISIS SQL COMPLETADO")
         print("="*50)
         
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Perfilador de calidad de datos
+Implementa las dimensiones de completitud, unicidad y consistencia descritas en
+ejercicio2_kpis/sistema_kpis_calidad.md sobre DataFrames de pandas
+"""
+
+import pandas as pd
+import numpy as np
+
+class CompletenessMetrics:
+    """Métricas de completitud de datos"""
+    
+    def calculate_completeness(self, perfil_columnas, total_registros, patrones_nulos):
+        """
+        Args:
+            perfil_columnas (dict): Perfil por columna generado por PerfiladorCalidad
+            total_registros (int): Registros perfilados
+            patrones_nulos (list): Combinaciones de columnas nulas más frecuentes
+        """
+        completitud = {
+            col: 100.0 if total_registros == 0 else
+            (1 - perfil['nulos'] / total_registros) * 100
+            for col, perfil in perfil_columnas.items()
+        }
+        celdas = total_registros * len(perfil_columnas)
+        nulos = sum(perfil['nulos'] for perfil in perfil_columnas.values())
+        
+        return {
+            'completitud_por_columna': completitud,
+            'completitud_general': 100.0 if celdas == 0 else (1 - nulos / celdas) * 100,
+            'patrones_nulos': patrones_nulos
+        }
+    
+    # KPI Target: >= 95%
+    # Alert Threshold: < 90%
+
+class UniquenessMetrics:
+    """Métricas de unicidad de datos"""
+    
+    def calculate_uniqueness(self, hashes_filas, hashes_claves=None, claves=None):
+        """
+        Cuenta duplicados sobre hashes uint64 por fila en lugar de comparar filas
+        como objetos
+        
+        Args:
+            hashes_filas (np.ndarray): Hash de cada fila completa
+            hashes_claves (np.ndarray): Hash de las columnas clave de cada fila
+            claves (list): Columnas que deberían identificar cada registro
+        """
+        total = len(hashes_filas)
+        duplicados = self._count_duplicates(hashes_filas)
+        resultado = {
+            'registros_duplicados': duplicados,
+            'unicidad': 100.0 if total == 0 else (1 - duplicados / total) * 100
+        }
+        
+        if claves:
+            duplicados_clave = self._count_duplicates(hashes_claves)
+            resultado['claves'] = list(claves)
+            resultado['duplicados_por_clave'] = duplicados_clave
+            resultado['unicidad_clave'] = 100.0 if total == 0 else (1 - duplicados_clave / total) * 100
+        
+        return resultado
+    
+    @staticmethod
+    def _count_duplicates(hashes):
+        """Filas repetidas según su hash"""
+        return int(len(hashes) - len(pd.unique(hashes)))
+    
+    # KPI Target: >= 99%
+    # Alert Threshold: < 97%
+
+class ConsistencyMetrics:
+    """Métricas de consistencia de datos"""
+    
+    def calculate_consistency(self, perfil_columnas, total_registros, reglas_rango=None):
+        """
+        Args:
+            perfil_columnas (dict): Perfil por columna generado por PerfiladorCalidad
+            total_registros (int): Registros perfilados
+            reglas_rango (dict): {columna: (mínimo, máximo)} con límites inclusivos;
+                None en un extremo lo deja abierto
+        """
+        rangos = {
+            col: {'min': perfil['min'], 'max': perfil['max']}
+            for col, perfil in perfil_columnas.items() if 'min' in perfil
+        }
+        
+        fuera_de_rango = {
+            col: perfil_columnas[col]['fuera_de_rango']
+            for col in (reglas_rango or {}) if col in perfil_columnas
+        }
+        evaluados = total_registros * len(fuera_de_rango)
+        
+        return {
+            'rangos': rangos,
+            'fuera_de_rango': fuera_de_rango,
+            'consistencia': 100.0 if evaluados == 0 else
+            (1 - sum(fuera_de_rango.values()) / evaluados) * 100
+        }
+    
+    # KPI Target: >= 96%
+    # Alert Threshold: < 92%
+
+class PerfiladorCalidad:
+    """Perfilador de una pasada por bloque de columnas"""
+    
+    def __init__(self, muestra_max=None, columnas_por_bloque=16, max_patrones=5, semilla=42):
+        """
+        Args:
+            muestra_max (int): Si el dataset supera este número de filas, se perfila
+                una muestra aleatoria de ese tamaño y el reporte queda marcado como
+                aproximado. None perfila siempre el dataset completo
+            columnas_por_bloque (int): Columnas procesadas juntas en cada pasada
+            max_patrones (int): Patrones de nulos más frecuentes a reportar
+            semilla (int): Semilla del muestreo
+        """
+        self.muestra_max = muestra_max
+        self.columnas_por_bloque = columnas_por_bloque
+        self.max_patrones = max_patrones
+        self.semilla = semilla
+        self.completeness = CompletenessMetrics()
+        self.uniqueness = UniquenessMetrics()
+        self.consistency = ConsistencyMetrics()
+    
+    def perfilar(self, dataset, nombre='dataset', claves=None, reglas_rango=None):
+        """
+        Perfila un DataFrame y retorna un reporte estructurado
+        
+        Args:
+            dataset (pd.DataFrame): Datos a perfilar
+            nombre (str): Nombre del dataset en el reporte
+            claves (list): Columnas que deberían ser únicas en conjunto
+            reglas_rango (dict): {columna: (mínimo, máximo)} para consistencia; solo
+                columnas numéricas o de fecha
+        
+        Returns:
+            dict: Reporte con completitud, unicidad, consistencia y perfil por columna
+        """
+        no_ordenables = [
+            col for col in (reglas_rango or {})
+            if col in dataset.columns
+            and not (pd.api.types.is_numeric_dtype(dataset[col])
+                     or pd.api.types.is_datetime64_any_dtype(dataset[col]))
+        ]
+        if no_ordenables:
+            raise ValueError(
+                f"Reglas de rango sobre columnas no numéricas ni de fecha en {nombre}: {no_ordenables}"
+            )
+        
+        total_original = len(dataset)
+        aproximado = self.muestra_max is not None and total_original > self.muestra_max
+        if aproximado:
+            dataset = dataset.sample(n=self.muestra_max, random_state=self.semilla)
+        
+        total = len(dataset)
+        perfil_columnas, patrones_nulos, hashes = self._profile_columns(dataset, reglas_rango or {})
+        
+        return {
+            'dataset': nombre,
+            'registros': total_original,
+            'registros_perfilados': total,
+            'aproximado': aproximado,
+            'columnas': perfil_columnas,
+            'completitud': self.completeness.calculate_completeness(
+                perfil_columnas, total, patrones_nulos
+            ),
+            'unicidad': self.uniqueness.calculate_uniqueness(
+                self._combine_hashes(hashes, dataset.columns, total),
+                self._combine_hashes(hashes, claves, total) if claves else None,
+                claves
+            ),
+            'consistencia': self.consistency.calculate_consistency(
+                perfil_columnas, total, reglas_rango
+            )
+        }
+    
+    def _profile_columns(self, dataset, reglas_rango):
+        """
+        Recorre las columnas por bloques: la matriz de nulos de cada bloque se
+        calcula una sola vez y alimenta conteos, rangos y el código de patrón de
+        nulos por fila. Cada columna se hashea una sola vez; ese hash da la
+        cardinalidad y luego se combina para los duplicados por fila y por clave
+        """
+        perfil = {}
+        hashes = {}
+        patron = np.zeros(len(dataset), dtype=np.uint64)
+        columnas = list(dataset.columns)
+        
+        for inicio in range(0, len(columnas), self.columnas_por_bloque):
+            bloque = dataset[columnas[inicio:inicio + self.columnas_por_bloque]]
+            nulos = bloque.isna().to_numpy()
+            conteo_nulos = nulos.sum(axis=0)
+            
+            # Código de patrón: cada bloque aporta sus bits de nulos al hash de la fila
+            pesos = np.left_shift(np.uint64(1), np.arange(nulos.shape[1], dtype=np.uint64))
+            codigo_bloque = (nulos * pesos).sum(axis=1, dtype=np.uint64)
+            patron = patron * np.uint64(1000003) + codigo_bloque
+            
+            for j, col in enumerate(bloque.columns):
+                serie = bloque[col]
+                hashes[col] = pd.util.hash_pandas_object(serie, index=False).to_numpy()
+                no_nulos = hashes[col][~nulos[:, j]]
+                datos = {
+                    'tipo': str(serie.dtype),
+                    'nulos': int(conteo_nulos[j]),
+                    'cardinalidad': len(pd.unique(no_nulos))
+                }
+                
+                if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+                    validos = serie[~nulos[:, j]]
+                    datos['min'] = validos.min() if len(validos) else None
+                    datos['max'] = validos.max() if len(validos) else None
+                    if pd.api.types.is_numeric_dtype(serie) and len(validos):
+                        datos['rango'] = datos['max'] - datos['min']
+                    
+                    if col in reglas_rango:
+                        minimo, maximo = reglas_rango[col]
+                        fuera = np.zeros(len(validos), dtype=bool)
+                        if minimo is not None:
+                            fuera |= (validos < minimo).to_numpy()
+                        if maximo is not None:
+                            fuera |= (validos > maximo).to_numpy()
+                        datos['fuera_de_rango'] = int(fuera.sum())
+                
+                perfil[col] = datos
+        
+        return perfil, self._null_patterns(dataset, patron), hashes
+    
+    @staticmethod
+    def _combine_hashes(hashes, columnas, total):
+        """Combina hashes de columna en un hash por fila (aritmética uint64 con desborde)"""
+        combinado = np.zeros(total, dtype=np.uint64)
+        for col in columnas:
+            combinado = (combinado * np.uint64(1000003)) ^ hashes[col]
+        return combinado
+    
+    def _null_patterns(self, dataset, patron):
+        """Combinaciones de columnas nulas más frecuentes (excluye filas completas)"""
+        if len(patron) == 0:
+            return []
+        
+        codigos, primera_fila, conteos = np.unique(patron, return_index=True, return_counts=True)
+        orden = np.argsort(-conteos, kind='stable')
+        
+        patrones = []
+        for k in orden:
+            if codigos[k] == 0:
+                continue
+            fila = dataset.iloc[int(primera_fila[k])]
+            patrones.append({
+                'columnas_nulas': [col for col, nulo in fila.isna().items() if nulo],
+                'registros': int(conteos[k])
+            })
+            if len(patrones) >= self.max_patrones:
+                break
+        return patrones
+
+def imprimir_reporte(reporte):
+    """Imprime un resumen legible de un reporte de calidad"""
+    sufijo = " (aproximado por muestreo)" if reporte['aproximado'] else ""
+    print(f"{reporte['dataset']}: {reporte['registros']} registros{sufijo}")
+    
+    for col, pct in reporte['completitud']['completitud_por_columna'].items():
+        print(f"  {col}: {pct:.1f}%")
+    
+    unicidad = reporte['unicidad']
+    print(f"  Registros duplicados: {unicidad['registros_duplicados']}")
+    if 'duplicados_por_clave' in unicidad:
+        print(f"  Duplicados por clave {unicidad['claves']}: {unicidad['duplicados_por_clave']}")
+    
+    for col, cantidad in reporte['consistencia']['fuera_de_rango'].items():
+        print(f"  Fuera de rango en {col}: {cantidad}")
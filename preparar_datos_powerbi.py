@@ -8,223 +8,1581 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+import json
+import argparse
+import hashlib
+import time
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from perfilador_calidad import PerfiladorCalidad, imprimir_reporte
+from cargador_excel import leer_libro, iter_sheet_blocks, ESPECIFICACION_PROVISIONES
 
 class PowerBIDataPreparator:
     """Preparador de datos para dashboard Power BI de provisiones"""
     
+    # Columnas exportadas con su tipo y formato numérico declarados de antemano,
+    # de modo que la exportación streaming no tenga que inferirlos por celda
+    COLUMNAS_POWERBI = {
+        'fecha_analisis': ('fecha', 'yyyy-mm-dd'),
+        'año': ('entero', '0'),
+        'mes': ('entero', '0'),
+        'año_mes': ('texto', None),
+        'trimestre': ('entero', '0'),
+        'año_trimestre': ('texto', None),
+        'alianza': ('texto', None),
+        'producto': ('texto', None),
+        'prov_k_ifrs': ('decimal', '#,##0'),
+        'prov_t_ifrs': ('decimal', '#,##0'),
+        'sald_30mas': ('decimal', '#,##0'),
+        'sald_k_ifrs': ('decimal', '#,##0'),
+        'sald_t_ifrs': ('decimal', '#,##0'),
+        'saldo_castigo': ('decimal', '#,##0'),
+        'saldo_castigo_t': ('decimal', '#,##0'),
+        'condonaciones': ('decimal', '#,##0'),
+        'recuperaciones': ('decimal', '#,##0'),
+        'icv_30': ('decimal', '0.0000'),
+        'gasto_provision': ('decimal', '#,##0'),
+        'gasto_provision_neto': ('decimal', '#,##0'),
+        'ratio_provision_saldo': ('decimal', '0.0000'),
+        'cobertura_provision': ('decimal', '0.0000'),
+        'gasto_provision_neto_3m': ('decimal', '#,##0'),
+        'gasto_provision_neto_6m': ('decimal', '#,##0'),
+        'gasto_provision_neto_12m': ('decimal', '#,##0'),
+        'icv_30_3m': ('decimal', '0.0000'),
+        'icv_30_6m': ('decimal', '0.0000'),
+        'icv_30_12m': ('decimal', '0.0000'),
+        'var_mensual_sald_k_ifrs': ('decimal', '#,##0'),
+        'var_mensual_prov_k_ifrs': ('decimal', '#,##0'),
+        'var_mensual_icv_30': ('decimal', '0.0000')
+    }
+    
+    # Columnas propias del cubo de agregación, además de las de COLUMNAS_POWERBI
+    COLUMNAS_CUBO = {
+        'agrupacion': ('texto', None),
+        'grouping_id': ('entero', '0'),
+        'registros': ('entero', '0')
+    }
+    
+    # Dimensiones del cubo en el orden usado para el bitmask grouping_id
+    DIMENSIONES_CUBO = ['alianza', 'producto', 'año', 'año_trimestre', 'año_mes']
+    
+    # Medidas aditivas del cubo; los ratios se derivan de ellas después de sumar
+    MEDIDAS_CUBO = [
+        'prov_k_ifrs', 'prov_t_ifrs',
+        'sald_30mas', 'sald_k_ifrs', 'sald_t_ifrs',
+        'saldo_castigo', 'saldo_castigo_t',
+        'condonaciones', 'recuperaciones',
+        'gasto_provision', 'gasto_provision_neto'
+    ]
+    
+    # Llaves sustitutas del esquema estrella
+    COLUMNAS_ESTRELLA = {
+        'id_fecha': ('entero', '0'),
+        'id_alianza': ('entero', '0'),
+        'id_producto': ('entero', '0')
+    }
+    
+    # Atributos que en el esquema estrella viven en las dimensiones y no en la tabla de hechos
+    ATRIBUTOS_DIMENSION = ['fecha_analisis', 'año', 'mes', 'año_mes', 'trimestre',
+                           'año_trimestre', 'alianza', 'producto']
+    
+    MODOS_EXPORTACION = ('excel', 'streaming', 'csv')
+    ESQUEMAS_EXPORTACION = ('plano', 'estrella')
+    GRANULARIDADES_PARTICION = ('año_mes', 'año')
+    
+    # Ventanas móviles en meses calendario y columnas que las alimentan; un
+    # bloque de periodos necesita como contexto los meses previos que cubre la
+    # ventana más larga
+    VENTANAS_MOVILES = (3, 6, 12)
+    COLUMNAS_VENTANA = ['gasto_provision_neto', 'sald_30mas', 'sald_k_ifrs', 'prov_k_ifrs']
+    VARIACIONES_MENSUALES = ['sald_k_ifrs', 'prov_k_ifrs', 'icv_30']
+    
+    # Ratios calculados: en modo de bajo consumo pasan a float32 si el error
+    # relativo máximo no supera esta tolerancia. Montos y enteros solo se
+    # reducen cuando la conversión es exacta
+    COLUMNAS_RATIO = ['icv_30', 'ratio_provision_saldo', 'cobertura_provision']
+    TOLERANCIA_RATIOS = 1e-6
+    
     def __init__(self):
         """Inicializa el preparador de datos"""
         self.prov_df = None
         self.cond_recu_df = None
         self.dataset_final = None
+        self.estado_provision = None
+        self.reporte_calidad = None
+        self.memoria_por_etapa = None
     
-    def load_provisiones_data(self, archivo='data/raw/Provisiones.xlsx'):
-        """Carga datos desde archivo Excel de provisiones"""
+    def load_provisiones_data(self, archivo='data/raw/Provisiones.xlsx', muestra_max=None):
+        """
+        Carga datos desde archivo Excel de provisiones
+        
+        Args:
+            archivo (str): Libro con las hojas 'Prov' y 'cond y recu'
+            muestra_max (int): Perfila la calidad sobre una muestra de este tamaño
+                en hojas mayores; el reporte queda marcado como aproximado
+        """
         print(f"Cargando datos de provisiones desde: {archivo}")
         
         try:
-            self.prov_df = pd.read_excel(archivo, sheet_name='Prov')
+            # Ambas hojas se extraen abriendo el libro una sola vez
+            hojas = leer_libro(archivo, ESPECIFICACION_PROVISIONES)
+            
+            self.prov_df = hojas['Prov']
             print(f"Datos de provisiones cargados: {len(self.prov_df)} registros")
             
-            self.cond_recu_df = pd.read_excel(archivo, sheet_name='cond y recu')
+            self.cond_recu_df = hojas['cond y recu']
             print(f"Datos de condonaciones y recuperaciones cargados: {len(self.cond_recu_df)} registros")
             
-            self._validate_data_quality()
+            self._validate_data_quality(muestra_max)
             
         except Exception as e:
             print(f"Error cargando datos: {e}")
             raise
     
-    def _validate_data_quality(self):
-        """Valida la calidad e integridad de los datos cargados"""
+    def _validate_data_quality(self, muestra_max=None):
+        """
+        Valida la calidad e integridad de los datos cargados
+        
+        El reporte estructurado queda en self.reporte_calidad por hoja.
+        
+        Args:
+            muestra_max (int): Perfila una muestra de este tamaño en datasets mayores
+        """
         print("Validando calidad de datos...")
         
-        prov_completeness = (self.prov_df.notna().sum() / len(self.prov_df)) * 100
-        cond_completeness = (self.cond_recu_df.notna().sum() / len(self.cond_recu_df)) * 100
+        perfilador = PerfiladorCalidad(muestra_max=muestra_max)
+        self.reporte_calidad = {
+            'Prov': perfilador.perfilar(
+                self.prov_df, 'Provisiones',
+                claves=['fecha_analisis', 'alianza', 'producto']
+            ),
+            'cond y recu': perfilador.perfilar(
+                self.cond_recu_df, 'Condonaciones y Recuperaciones',
+                reglas_rango={'condonaciones': (0, None), 'recuperaciones': (0, None)}
+            )
+        }
         
         print("Completitud de datos (%):")
-        print("Provisiones:")
-        for col, pct in prov_completeness.items():
-            print(f"  {col}: {pct:.1f}%")
-        
-        print("Condonaciones y Recuperaciones:")
-        for col, pct in cond_completeness.items():
-            print(f"  {col}: {pct:.1f}%")
+        for reporte in self.reporte_calidad.values():
+            imprimir_reporte(reporte)
         
-        prov_duplicates = self.prov_df.duplicated().sum()
-        cond_duplicates = self.cond_recu_df.duplicated().sum()
+        rango = self.reporte_calidad['Prov']['columnas'].get('fecha_analisis')
+        if rango and 'min' in rango:
+            print(f"Rango de fechas provisiones: {rango['min']} a {rango['max']}")
+    
+    def calculate_metrics(self, bajo_consumo=False, presupuesto_mb=None):
+        """
+        Calcula las métricas requeridas para el dashboard
         
-        print(f"Registros duplicados - Provisiones: {prov_duplicates}, Cond/Recu: {cond_duplicates}")
+        Args:
+            bajo_consumo (bool): Calcula columna a columna sin copias intermedias
+                del DataFrame, con alianza/producto categóricos y tipos reducidos
+                donde la precisión lo permite
+            presupuesto_mb (float): Memoria máxima que puede asignar el cálculo
+                (sin contar los datos ya cargados). Se verifica por etapa, antes
+                de empezarla con su estimación y al terminarla con el pico
+                medido, y se lanza PresupuestoMemoriaExcedido. No es un tope
+                duro: una etapa que asigna más de lo estimado sigue hasta terminar
+        """
+        print("Calculando métricas financieras...")
         
-        if 'fecha_analisis' in self.prov_df.columns:
-            fecha_min = self.prov_df['fecha_analisis'].min()
-            fecha_max = self.prov_df['fecha_analisis'].max()
-            print(f"Rango de fechas provisiones: {fecha_min} a {fecha_max}")
+        try:
+            if bajo_consumo or presupuesto_mb is not None:
+                with _MonitorMemoria(presupuesto_mb) as monitor:
+                    if bajo_consumo:
+                        dataset = self._compute_metrics_low_memory(
+                            self.prov_df, self.cond_recu_df, monitor
+                        )
+                    else:
+                        monitor.verificar_estimacion(self.prov_df)
+                        with monitor.etapa('calculo', monitor.columnas_estimadas):
+                            dataset = self._compute_metrics(self.prov_df, self.cond_recu_df)
+                
+                self.memoria_por_etapa = monitor.picos
+                print("Memoria pico por etapa (MB):")
+                for etapa, pico in monitor.picos.items():
+                    print(f"  {etapa}: {pico:.1f}")
+            else:
+                # Sin presupuesto ni bajo consumo no se activa tracemalloc: su
+                # registro de asignaciones hace más lento el cálculo estándar
+                dataset = self._compute_metrics(self.prov_df, self.cond_recu_df)
+                self.memoria_por_etapa = None
+            
+            self.dataset_final = dataset
+            self.estado_provision = self._last_provision_state(dataset)
+            
+            self._print_metrics_summary(dataset)
+            
+        except Exception as e:
+            print(f"Error calculando métricas: {e}")
+            raise
     
-    def calculate_metrics(self):
-        """Calcula las métricas requeridas para el dashboard"""
-        print("Calculando métricas financieras...")
+    def calculate_metrics_incremental(self, dataset_previo):
+        """
+        Calcula métricas solo para los periodos posteriores al dataset previo
+        
+        El rezago de gasto_provision se siembra con la última prov_k_ifrs conocida
+        de cada (alianza, producto), de modo que el resultado agregado es idéntico
+        al de un recálculo completo. Los pares que aparecen por primera vez parten
+        de provisión anterior 0, igual que en el cálculo completo. Solo se procesan
+        periodos estrictamente posteriores al último exportado; correcciones sobre
+        meses ya exportados requieren un recálculo completo.
+        
+        Args:
+            dataset_previo (pd.DataFrame | str): Dataset exportado previamente, o
+                ruta al Excel / directorio CSV generado por export_for_powerbi
+                
+        Returns:
+            pd.DataFrame: Filas nuevas agregadas al dataset
+        """
+        print("Calculando métricas incrementales...")
         
         try:
-            dataset = self.prov_df.copy()
+            if isinstance(dataset_previo, str):
+                dataset_previo = self.load_previous_export(dataset_previo)
             
-            # Convertir fecha_analisis de formato YYYYMM a datetime
-            dataset['fecha_analisis'] = pd.to_datetime(
-                dataset['fecha_analisis'].astype(str), 
-                format='%Y%m'
-            )
+            if not pd.api.types.is_integer_dtype(dataset_previo['fecha_analisis']):
+                # Las exportaciones traen la fecha como datetime; se vuelve a la llave YYYYMM
+                dataset_previo = dataset_previo.copy()
+                dataset_previo['fecha_analisis'] = self._to_month_key(dataset_previo['fecha_analisis'])
             
-            # 1. Calcular ICV_30
-            dataset['icv_30'] = np.where(
-                dataset['sald_k_ifrs'] != 0,
-                dataset['sald_30mas'] / dataset['sald_k_ifrs'],
-                0
-            )
+            ultimo_periodo = dataset_previo['fecha_analisis'].max()
+            print(f"Último periodo exportado: {ultimo_periodo // 100}-{ultimo_periodo % 100:02d}")
+            
+            prov_nuevos = self.prov_df[self.prov_df['fecha_analisis'] > ultimo_periodo]
+            meses_cond = self._to_month_key(self.cond_recu_df['fecha_analisis'])
+            cond_nuevos = self.cond_recu_df[meses_cond > ultimo_periodo]
             
-            # 2. Calcular Gasto de Provisión
+            if prov_nuevos.empty:
+                print("No hay periodos nuevos para procesar")
+                self.dataset_final = dataset_previo
+                self.estado_provision = self._last_provision_state(dataset_previo)
+                return prov_nuevos
+            
+            prov_anterior = self._last_provision_state(dataset_previo)
+            contexto = self._rolling_context(dataset_previo)
+            nuevos = self._compute_metrics(prov_nuevos, cond_nuevos, prov_anterior, contexto)
+            
+            dataset = pd.concat(
+                [dataset_previo, nuevos[dataset_previo.columns]], ignore_index=True
+            )
             dataset = dataset.sort_values(['alianza', 'producto', 'fecha_analisis'])
-            dataset['prov_mes_anterior'] = dataset.groupby(['alianza', 'producto'])['prov_k_ifrs'].shift(1)
-            dataset['gasto_provision'] = dataset['prov_k_ifrs'] - dataset['prov_mes_anterior'].fillna(0)
-            
-            # 3. Preparar datos de condonaciones y recuperaciones
-            cond_recu_work = self.cond_recu_df.copy()
-            
-            # Convertir fecha_analisis en cond_recu_df (ya está en datetime)
-            if cond_recu_work['fecha_analisis'].dtype != 'datetime64[ns]':
-            # Si es numérico, convertir desde serial de Excel
-                cond_recu_work['fecha_analisis'] = pd.to_datetime(
-                cond_recu_work['fecha_analisis'], 
-                origin='1899-12-30', 
-                unit='D'
+            dataset = dataset.reset_index(drop=True)
+            
+            self.dataset_final = dataset
+            self.estado_provision = self._last_provision_state(dataset)
+            
+            print(f"Periodos nuevos procesados: {nuevos['fecha_analisis'].nunique()}")
+            self._print_metrics_summary(dataset)
+            
+            return nuevos
+            
+        except Exception as e:
+            print(f"Error calculando métricas incrementales: {e}")
+            raise
+    
+    def load_previous_export(self, archivo):
+        """
+        Carga una exportación previa (Excel o paquete CSV) como dataset plano
+        
+        Una exportación en esquema estrella se vuelve a aplanar uniendo
+        Hechos_Provision con sus dimensiones, así que ambos esquemas sirven
+        como punto de partida de calculate_metrics_incremental.
+        """
+        hojas_estrella = ['Hechos_Provision', 'dim_alianza', 'dim_producto', 'dim_calendario']
+        libro = None
+        if os.path.isdir(archivo):
+            disponibles = {os.path.splitext(f)[0] for f in os.listdir(archivo) if f.endswith('.csv')}
+        else:
+            libro = pd.ExcelFile(archivo)
+            disponibles = set(libro.sheet_names)
+        
+        try:
+            if 'Datos_Principales' in disponibles:
+                hojas = ['Datos_Principales']
+            elif set(hojas_estrella) <= disponibles:
+                hojas = hojas_estrella
+            else:
+                raise ValueError(
+                    f"{archivo} no tiene Datos_Principales ni las hojas del esquema estrella "
+                    f"({', '.join(hojas_estrella)})"
+                )
+            
+            if libro is None:
+                claves = {'alianza': str, 'producto': str}
+                datos = {hoja: pd.read_csv(os.path.join(archivo, f'{hoja}.csv'), dtype=claves)
+                         for hoja in hojas}
+            else:
+                datos = {hoja: libro.parse(hoja) for hoja in hojas}
+        finally:
+            if libro is not None:
+                libro.close()
+        
+        if 'Datos_Principales' in datos:
+            dataset = datos['Datos_Principales']
+        else:
+            dataset = self._flatten_star_schema(datos)
+        dataset['fecha_analisis'] = pd.to_datetime(dataset['fecha_analisis'])
+        return dataset
+    
+    def _flatten_star_schema(self, hojas):
+        """Reconstruye Datos_Principales desde Hechos_Provision y sus dimensiones"""
+        dataset = (
+            hojas['Hechos_Provision']
+            .merge(hojas['dim_calendario'], on='id_fecha', how='left')
+            .merge(hojas['dim_alianza'], on='id_alianza', how='left')
+            .merge(hojas['dim_producto'], on='id_producto', how='left')
+        )
+        return dataset[list(self.COLUMNAS_POWERBI)]
+    
+    def _compute_metrics(self, prov_df, cond_recu_df, prov_anterior=None, contexto=None):
+        """
+        Calcula las métricas sobre un bloque de periodos
+        
+        Todo el cálculo usa fecha_analisis como llave entera YYYYMM; la columna
+        datetime solo se construye al exportar.
+        
+        Args:
+            prov_df (pd.DataFrame): Provisiones con fecha_analisis en formato YYYYMM
+            cond_recu_df (pd.DataFrame): Condonaciones y recuperaciones del mismo bloque
+            prov_anterior (pd.Series): Última prov_k_ifrs por (alianza, producto) de
+                periodos anteriores al bloque; None si el bloque inicia la historia
+            contexto (pd.DataFrame): Filas ya calculadas de los meses previos al
+                bloque (ver _rolling_context) para las ventanas móviles
+        """
+        dataset = prov_df.copy()
+        dataset['fecha_analisis'] = dataset['fecha_analisis'].astype('int64')
+        
+        # 1. Calcular ICV_30
+        dataset['icv_30'] = np.where(
+            dataset['sald_k_ifrs'] != 0,
+            dataset['sald_30mas'] / dataset['sald_k_ifrs'],
+            0
+        )
+        
+        # 2. Calcular Gasto de Provisión
+        dataset = dataset.sort_values(['alianza', 'producto', 'fecha_analisis'])
+        grupos = dataset.groupby(['alianza', 'producto'])
+        dataset['prov_mes_anterior'] = grupos['prov_k_ifrs'].shift(1)
+        
+        if prov_anterior is not None:
+            # La primera fila de cada par en el bloque toma la provisión del último
+            # periodo ya procesado; los pares nuevos quedan en NaN
+            es_primera = grupos.cumcount() == 0
+            claves = pd.MultiIndex.from_frame(dataset.loc[es_primera, ['alianza', 'producto']])
+            dataset.loc[es_primera, 'prov_mes_anterior'] = prov_anterior.reindex(claves).to_numpy()
+        
+        dataset['gasto_provision'] = dataset['prov_k_ifrs'] - dataset['prov_mes_anterior'].fillna(0)
+        
+        # 3. Agregar condonaciones y recuperaciones y cruzarlas por llave entera
+        dataset = dataset.reset_index(drop=True)
+        categorias = (pd.Categorical(dataset['alianza']).categories,
+                      pd.Categorical(dataset['producto']).categories)
+        cond_recu_agg = self._aggregate_cond_recu(cond_recu_df, categorias)
+        llave = self._join_key(dataset['alianza'], dataset['producto'],
+                               dataset['fecha_analisis'], categorias)
+        cruce = cond_recu_agg.reindex(llave)
+        
+        dataset['condonaciones'] = cruce['condonaciones'].fillna(0).to_numpy()
+        dataset['recuperaciones'] = cruce['recuperaciones'].fillna(0).to_numpy()
+        
+        # 4. Calcular Gasto de Provisión Neto
+        dataset['gasto_provision_neto'] = (
+            dataset['gasto_provision'] + 
+            dataset['condonaciones'] - 
+            dataset['recuperaciones']
+        )
+        
+        # 5. Métricas adicionales
+        dataset['ratio_provision_saldo'] = np.where(
+            dataset['sald_k_ifrs'] != 0,
+            dataset['prov_k_ifrs'] / dataset['sald_k_ifrs'],
+            0
+        )
+        
+        dataset['cobertura_provision'] = np.where(
+            dataset['sald_30mas'] != 0,
+            dataset['prov_k_ifrs'] / dataset['sald_30mas'],
+            0
         )
-# Si ya es datetime, no hacer nada
+        
+        # Dimensiones temporales: aritmética sobre la llave y etiquetas desde el calendario
+        mes_key = dataset['fecha_analisis'].to_numpy()
+        dataset['año'] = mes_key // 100
+        dataset['mes'] = mes_key % 100
+        dataset['trimestre'] = (dataset['mes'] - 1) // 3 + 1
+        
+        calendario = self._build_calendario(mes_key)
+        posiciones = calendario.index.get_indexer(mes_key)
+        dataset['año_mes'] = calendario['año_mes'].array.take(posiciones)
+        dataset['año_trimestre'] = calendario['año_trimestre'].array.take(posiciones)
+        
+        # 6. KPIs de ventana móvil y variaciones mensuales
+        return self._add_rolling_kpis(dataset, contexto)
+    
+    def _add_rolling_kpis(self, dataset, contexto=None):
+        """
+        Agrega las columnas de ventana móvil a un dataset ordenado por
+        alianza, producto y fecha_analisis
+        
+        Las filas de contexto solo aportan historia a las ventanas; el resultado
+        conserva las filas y el orden de dataset.
+        """
+        claves = ['alianza', 'producto', 'fecha_analisis']
+        base = dataset[claves + self.COLUMNAS_VENTANA]
+        es_nueva = np.ones(len(base), dtype=bool)
+        
+        if contexto is not None and not contexto.empty:
+            base = pd.concat([contexto[claves + self.COLUMNAS_VENTANA], base], ignore_index=True)
+            es_nueva = np.concatenate([np.zeros(len(contexto), dtype=bool), es_nueva])
+            # Las llaves no se repiten, así que las filas del bloque conservan su orden relativo
+            orden = base.sort_values(claves).index.to_numpy()
+            base = base.iloc[orden]
+            es_nueva = es_nueva[orden]
+        
+        par = base.groupby(
+            ['alianza', 'producto'], sort=False, observed=True, dropna=False
+        ).ngroup().to_numpy()
+        kpis = self._rolling_kpis(par, base['fecha_analisis'].to_numpy(), base)
+        
+        for col, valores in kpis.items():
+            dataset[col] = valores[es_nueva]
+        return dataset
+    
+    def _rolling_kpis(self, par, mes_key, columnas):
+        """
+        KPIs de ventana móvil en una sola pasada vectorizada
+        
+        Las filas deben venir ordenadas por par y mes. Cada fila recibe una llave
+        par * 10^6 + ordinal de mes; sobre ella, searchsorted ubica el inicio de
+        cada ventana en meses calendario y las sumas salen de diferencias de
+        sumas acumuladas. Los meses faltantes no cuentan dentro de la ventana y
+        la variación mensual queda nula si el mes calendario anterior no existe.
+        
+        Args:
+            par (np.ndarray): Identificador no decreciente de (alianza, producto)
+            mes_key (np.ndarray): Llave YYYYMM de cada fila
+            columnas (pd.DataFrame | dict): Columnas de COLUMNAS_VENTANA
             
-            # Normalizar fechas al primer día del mes
-            cond_recu_work['fecha_analisis'] = cond_recu_work['fecha_analisis'].dt.to_period('M').dt.start_time
-            dataset['fecha_analisis'] = dataset['fecha_analisis'].dt.to_period('M').dt.start_time
+        Returns:
+            dict: {columna: np.ndarray float64} con las ventanas y variaciones
+        """
+        mes_key = np.asarray(mes_key, dtype='int64')
+        llave = np.asarray(par, dtype='int64') * 1000000 + (mes_key // 100) * 12 + mes_key % 100 - 1
+        n = len(llave)
+        
+        acumulados = {
+            col: np.concatenate([[0.0], np.cumsum(np.asarray(columnas[col], dtype='float64'))])
+            for col in ('gasto_provision_neto', 'sald_30mas', 'sald_k_ifrs')
+        }
+        fin = np.arange(1, n + 1)
+        
+        kpis = {}
+        for meses in self.VENTANAS_MOVILES:
+            inicio = np.searchsorted(llave, llave - (meses - 1))
+            suma = {col: acum[fin] - acum[inicio] for col, acum in acumulados.items()}
+            kpis[f'gasto_provision_neto_{meses}m'] = suma['gasto_provision_neto']
+            icv = np.zeros(n, dtype='float64')
+            np.divide(suma['sald_30mas'], suma['sald_k_ifrs'], out=icv, where=suma['sald_k_ifrs'] != 0)
+            kpis[f'icv_30_{meses}m'] = icv
+        
+        # Variación contra el mes calendario anterior del mismo par; icv_30 se
+        # recalcula en float64 desde sus componentes por si la columna viene reducida
+        anterior = np.minimum(np.searchsorted(llave, llave - 1), max(n - 1, 0))
+        existe = np.zeros(n, dtype=bool)
+        if n:
+            existe = llave[anterior] == llave - 1
+        icv_30 = np.zeros(n, dtype='float64')
+        sald_k_ifrs = np.asarray(columnas['sald_k_ifrs'], dtype='float64')
+        np.divide(np.asarray(columnas['sald_30mas'], dtype='float64'), sald_k_ifrs,
+                  out=icv_30, where=sald_k_ifrs != 0)
+        for col in self.VARIACIONES_MENSUALES:
+            valores = icv_30 if col == 'icv_30' else np.asarray(columnas[col], dtype='float64')
+            variacion = np.full(n, np.nan)
+            variacion[existe] = valores[existe] - valores[anterior[existe]]
+            kpis[f'var_mensual_{col}'] = variacion
+        
+        return kpis
+    
+    def _rolling_context(self, dataset):
+        """
+        Filas de los últimos meses de un dataset que necesita la ventana más
+        larga para continuar el cálculo en un bloque posterior
+        """
+        mes_key = dataset['fecha_analisis'].to_numpy().astype('int64')
+        ordinal = (mes_key // 100) * 12 + mes_key % 100 - 1
+        if len(ordinal) == 0:
+            return dataset[['alianza', 'producto', 'fecha_analisis'] + self.COLUMNAS_VENTANA]
+        
+        desde = ordinal.max() - (max(self.VENTANAS_MOVILES) - 1)
+        return dataset.loc[ordinal >= desde,
+                           ['alianza', 'producto', 'fecha_analisis'] + self.COLUMNAS_VENTANA]
+    
+    def _compute_metrics_low_memory(self, prov_df, cond_recu_df, monitor):
+        """
+        Versión de bajo consumo de _compute_metrics
+        
+        Cada columna se ordena y calcula por separado como arreglo de numpy y el
+        DataFrame final se arma una sola vez sin consolidar bloques. El resultado
+        tiene las mismas columnas y filas que _compute_metrics; alianza y
+        producto quedan categóricos y los tipos se reducen con _downcast.
+        
+        Args:
+            prov_df (pd.DataFrame): Provisiones con fecha_analisis en formato YYYYMM
+            cond_recu_df (pd.DataFrame): Condonaciones y recuperaciones
+            monitor (_MonitorMemoria): Registra la memoria pico de cada etapa
+        """
+        monitor.verificar_estimacion(prov_df)
+        columnas = {}
+        
+        with monitor.etapa('orden', len(prov_df.columns) + 3):
+            alianza = pd.Categorical(prov_df['alianza'])
+            producto = pd.Categorical(prov_df['producto'])
+            cod_alianza = self._codes_nulls_last(alianza)
+            cod_producto = self._codes_nulls_last(producto)
+            mes_key = prov_df['fecha_analisis'].to_numpy(dtype='int64')
             
-            # Agregar condonaciones y recuperaciones
-            cond_recu_agg = cond_recu_work.groupby(
-                ['fecha_analisis', 'alianza', 'producto']
-            ).agg({
-                'condonaciones': 'sum',
-                'recuperaciones': 'sum'
-            }).reset_index()
+            orden = np.lexsort((mes_key, cod_producto, cod_alianza))
+            cod_alianza = cod_alianza[orden]
+            cod_producto = cod_producto[orden]
+            mes_key = mes_key[orden]
             
-            # Merge
-            dataset = dataset.merge(
-                cond_recu_agg,
-                on=['fecha_analisis', 'alianza', 'producto'],
-                how='left'
-            )
+            for col in prov_df.columns:
+                if col == 'fecha_analisis':
+                    columnas[col] = self._downcast(mes_key)
+                elif col == 'alianza':
+                    columnas[col] = alianza.take(orden)
+                elif col == 'producto':
+                    columnas[col] = producto.take(orden)
+                else:
+                    columnas[col] = self._downcast(prov_df[col].to_numpy()[orden])
+        
+        with monitor.etapa('icv_30', 1):
+            columnas['icv_30'] = self._ratio(columnas['sald_30mas'], columnas['sald_k_ifrs'])
+        
+        with monitor.etapa('gasto_provision', 4):
+            # El rezago se toma de la fila anterior salvo al cambiar de (alianza, producto)
+            prov = columnas['prov_k_ifrs']
+            n_productos = len(producto.categories) + 1
+            par = cod_alianza * n_productos + cod_producto
+            anterior = np.empty(len(prov), dtype='float64')
+            anterior[1:] = prov[:-1]
+            nuevo_par = np.ones(len(prov), dtype=bool)
+            nuevo_par[1:] = par[1:] != par[:-1]
+            anterior[nuevo_par] = np.nan
+            anterior[columnas['alianza'].isna() | columnas['producto'].isna()] = np.nan
             
-            dataset['condonaciones'] = dataset['condonaciones'].fillna(0)
-            dataset['recuperaciones'] = dataset['recuperaciones'].fillna(0)
+            columnas['prov_mes_anterior'] = self._downcast(anterior)
+            gasto_provision = prov - np.nan_to_num(anterior)
+            columnas['gasto_provision'] = self._downcast(gasto_provision)
+        
+        with monitor.etapa('cond_recu', 5):
+            categorias = (alianza.categories, producto.categories)
+            sumas = self._aggregate_cond_recu(cond_recu_df, categorias)
+            cruce = sumas.reindex(self._join_key(
+                columnas['alianza'], columnas['producto'], mes_key, categorias
+            ))
             
-            # 4. Calcular Gasto de Provisión Neto
-            dataset['gasto_provision_neto'] = (
-                dataset['gasto_provision'] + 
-                dataset['condonaciones'] - 
-                dataset['recuperaciones']
-            )
+            netos = gasto_provision
+            for col, signo in (('condonaciones', 1), ('recuperaciones', -1)):
+                valores = cruce[col].fillna(0).to_numpy(dtype='float64')
+                netos = netos + signo * valores
+                columnas[col] = self._downcast(valores)
+            columnas['gasto_provision_neto'] = self._downcast(netos)
+        
+        with monitor.etapa('ratios', 2):
+            columnas['ratio_provision_saldo'] = self._ratio(columnas['prov_k_ifrs'], columnas['sald_k_ifrs'])
+            columnas['cobertura_provision'] = self._ratio(columnas['prov_k_ifrs'], columnas['sald_30mas'])
+        
+        with monitor.etapa('calendario', 5):
+            columnas['año'] = self._downcast(mes_key // 100)
+            columnas['mes'] = self._downcast(mes_key % 100)
+            columnas['trimestre'] = self._downcast((mes_key % 100 - 1) // 3 + 1)
             
-            # 5. Métricas adicionales
-            dataset['ratio_provision_saldo'] = np.where(
-                dataset['sald_k_ifrs'] != 0,
-                dataset['prov_k_ifrs'] / dataset['sald_k_ifrs'],
-                0
-            )
+            calendario = self._build_calendario(mes_key)
+            posiciones = calendario.index.get_indexer(mes_key)
+            columnas['año_mes'] = calendario['año_mes'].array.take(posiciones)
+            columnas['año_trimestre'] = calendario['año_trimestre'].array.take(posiciones)
+        
+        with monitor.etapa('ventanas_moviles',
+                               len(self.VENTANAS_MOVILES) * len(self.COLUMNAS_VENTANA)
+                               + len(self.VARIACIONES_MENSUALES)):
+            for col, valores in self._rolling_kpis(par, mes_key, columnas).items():
+                tolerancia = self.TOLERANCIA_RATIOS if 'icv_30' in col else 0
+                columnas[col] = self._downcast(valores, tolerancia)
+        
+        with monitor.etapa('ensamblado', 1):
+            dataset = pd.DataFrame(columnas, copy=False)
+        
+        return dataset
+    
+    def _aggregate_cond_recu(self, cond_recu_df, categorias):
+        """
+        Suma condonaciones y recuperaciones por llave entera (alianza, producto, mes)
+        
+        Las filas cuya alianza o producto no están en categorias, o sin fecha,
+        no pueden cruzar con provisiones y se descartan antes de agrupar.
+        """
+        llave = self._join_key(
+            cond_recu_df['alianza'], cond_recu_df['producto'],
+            self._to_month_key(cond_recu_df['fecha_analisis']), categorias
+        )
+        validos = llave >= 0
+        return pd.DataFrame({
+            'condonaciones': cond_recu_df['condonaciones'].to_numpy()[validos],
+            'recuperaciones': cond_recu_df['recuperaciones'].to_numpy()[validos]
+        }).groupby(llave[validos]).sum()
+    
+    def _join_key(self, alianza, producto, mes_key, categorias):
+        """
+        Llave entera de cruce a partir de las llaves sustitutas de alianza y
+        producto y de la llave de mes YYYYMM; -1 si falta algún componente
+        
+        Args:
+            alianza, producto: Valores de las dimensiones
+            mes_key: Llaves YYYYMM
+            categorias (tuple): Categorías de alianza y de producto que definen
+                las llaves sustitutas
+        """
+        id_alianza, _ = self._surrogate_keys(alianza, categorias[0])
+        id_producto, _ = self._surrogate_keys(producto, categorias[1])
+        mes_key = np.asarray(mes_key, dtype='int64')
+        llave = (id_alianza * (len(categorias[1]) + 1) + id_producto) * 1000000 + mes_key
+        return np.where((id_alianza == 0) | (id_producto == 0) | (mes_key < 0), -1, llave)
+    
+    @staticmethod
+    def _surrogate_keys(valores, categorias=None):
+        """
+        Llave sustituta entera 1..n según la posición en categorias (por defecto
+        los valores únicos ordenados); 0 para nulos o valores fuera de categorias
+        
+        Returns:
+            tuple: (np.ndarray int64 con las llaves, categorías usadas)
+        """
+        categorico = pd.Categorical(valores, categories=categorias)
+        return categorico.codes.astype('int64') + 1, categorico.categories
+    
+    def _ratio(self, numerador, denominador):
+        """numerador / denominador con 0 donde el denominador es 0, reducido a float32 si aplica"""
+        resultado = np.zeros(len(numerador), dtype='float64')
+        np.divide(numerador, denominador, out=resultado, where=denominador != 0)
+        return self._downcast(resultado, self.TOLERANCIA_RATIOS)
+    
+    @staticmethod
+    def _codes_nulls_last(categorico):
+        """Códigos de un categórico como int64, con los nulos al final como en sort_values"""
+        codigos = categorico.codes.astype('int64')
+        codigos[codigos < 0] = len(categorico.categories)
+        return codigos
+    
+    @staticmethod
+    def _downcast(valores, tolerancia=0):
+        """
+        Reduce el tipo de un arreglo numérico cuando la precisión lo permite
+        
+        Los enteros pasan a int32 si caben. Los float64 pasan a float32 si la
+        conversión es exacta o, con tolerancia > 0, si el error relativo máximo
+        no la supera. No se baja de 32 bits para no desbordar aritmética posterior.
+        """
+        if valores.dtype == np.int64:
+            if len(valores) == 0 or (
+                valores.min() >= np.iinfo(np.int32).min and valores.max() <= np.iinfo(np.int32).max
+            ):
+                return valores.astype(np.int32)
+            return valores
+        
+        if valores.dtype == np.float64:
+            reducido = valores.astype(np.float32)
+            with np.errstate(over='ignore', invalid='ignore'):
+                error = np.abs(reducido.astype(np.float64) - valores)
+            nulos = np.isnan(valores)
+            if tolerancia > 0:
+                permitido = tolerancia * np.abs(valores)
+            else:
+                permitido = np.zeros(len(valores))
+            if np.all(nulos | (error <= permitido)):
+                return reducido
+        return valores
+    
+    @staticmethod
+    def _to_month_key(fechas):
+        """
+        Convierte fechas (datetime o serial de Excel) a llave entera YYYYMM
+        
+        La conversión es aritmética sobre datetime64[M]; las fechas nulas quedan
+        con llave -1 para que no crucen con ningún periodo.
+        """
+        if pd.api.types.is_datetime64_any_dtype(fechas):
+            meses = fechas.to_numpy().astype('datetime64[M]')
+        else:
+            # Si es numérico, convertir desde serial de Excel (día 25569 = 1970-01-01)
+            dias = np.floor(fechas.to_numpy(dtype='float64')) - 25569
+            meses = dias.astype('datetime64[D]').astype('datetime64[M]')
+        
+        nulos = np.isnat(meses)
+        ordinal = meses.astype('int64')
+        llave = (ordinal // 12 + 1970) * 100 + ordinal % 12 + 1
+        return pd.Series(np.where(nulos, -1, llave), index=fechas.index)
+    
+    @staticmethod
+    def _build_calendario(mes_key):
+        """
+        Dimensión calendario para las llaves YYYYMM presentes
+        
+        Se construye solo sobre los meses únicos, de modo que el formateo de
+        etiquetas y la creación de datetimes no dependen del tamaño de la tabla.
+        """
+        claves = np.unique(mes_key)
+        año = claves // 100
+        mes = claves % 100
+        trimestre = (mes - 1) // 3 + 1
+        año_mes = [f"{a}-{m:02d}" for a, m in zip(año, mes)]
+        año_trimestre = [f"{a}-Q{t}" for a, t in zip(año, trimestre)]
+        
+        return pd.DataFrame({
+            'fecha': pd.to_datetime({'year': año, 'month': mes, 'day': 1}).to_numpy(),
+            'año': año,
+            'mes': mes,
+            'año_mes': pd.Categorical(año_mes),
+            'trimestre': trimestre,
+            'año_trimestre': pd.Categorical(año_trimestre)
+        }, index=pd.Index(claves, name='fecha_analisis'))
+    
+    @staticmethod
+    def _last_provision_state(dataset):
+        """Última prov_k_ifrs conocida por (alianza, producto)"""
+        ultimos = dataset.sort_values('fecha_analisis').drop_duplicates(
+            ['alianza', 'producto'], keep='last'
+        )
+        return ultimos.set_index(['alianza', 'producto'])['prov_k_ifrs']
+    
+    def _print_metrics_summary(self, dataset):
+        """Imprime el resumen de métricas calculadas"""
+        print("Métricas calculadas exitosamente:")
+        print(f"  - ICV_30: Promedio {dataset['icv_30'].mean():.3f}")
+        print(f"  - Gasto Provisión: Total {dataset['gasto_provision'].sum():,.0f}")
+        print(f"  - Gasto Provisión Neto: Total {dataset['gasto_provision_neto'].sum():,.0f}")
+        print(f"  - Registros procesados: {len(dataset)}")
+    
+    def export_for_powerbi(self, output_file='data/output/provisiones_powerbi.xlsx',
+                           modo='excel', chunk_size=50000, formatos_excel=True,
+                           esquema='plano'):
+        """
+        Exporta datos preparados para Power BI
+        
+        Args:
+            output_file (str): Archivo Excel de salida. En modo 'csv' se usa su
+                nombre sin extensión como directorio del paquete de CSVs
+            modo (str): 'excel' (pandas + openpyxl en modo normal), 'streaming'
+                (openpyxl write-only, fila a fila) o 'csv' (un CSV por hoja).
+                'streaming' no retiene el libro en memoria: con 38.400 filas su
+                pico es unas 15 veces menor que 'excel' (ver benchmark_exportacion)
+            chunk_size (int): Filas convertidas por bloque en modo streaming
+            formatos_excel (bool): Aplica los formatos numéricos declarados en modo
+                streaming. Desactivarlo reduce el tiempo de escritura a la mitad
+            esquema (str): 'plano' (hoja Datos_Principales desnormalizada) o
+                'estrella' (Hechos_Provision con llaves enteras más dim_alianza,
+                dim_producto y dim_calendario; ver build_star_schema)
+        """
+        if self.dataset_final is None:
+            print("Error: Dataset final no disponible.")
+            return None
+        
+        if modo not in self.MODOS_EXPORTACION:
+            raise ValueError(f"Modo de exportación no soportado: {modo}")
+        
+        if esquema not in self.ESQUEMAS_EXPORTACION:
+            raise ValueError(f"Esquema de exportación no soportado: {esquema}")
+        
+        try:
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
             
-            dataset['cobertura_provision'] = np.where(
-                dataset['sald_30mas'] != 0,
-                dataset['prov_k_ifrs'] / dataset['sald_30mas'],
-                0
-            )
+            export_data = self._prepare_export_frame(self.dataset_final)
+            resumenes = self._build_resumenes(export_data)
             
-            # Dimensiones temporales
-            dataset['año'] = dataset['fecha_analisis'].dt.year
-            dataset['mes'] = dataset['fecha_analisis'].dt.month
-            dataset['año_mes'] = dataset['fecha_analisis'].dt.strftime('%Y-%m')
-            dataset['trimestre'] = dataset['fecha_analisis'].dt.quarter
-            dataset['año_trimestre'] = dataset['año'].astype(str) + '-Q' + dataset['trimestre'].astype(str)
+            if esquema == 'estrella':
+                hojas = self.build_star_schema(self.dataset_final)
+                export_data = hojas['Hechos_Provision']
+            else:
+                hojas = {'Datos_Principales': export_data}
+            hojas.update(resumenes)
             
-            self.dataset_final = dataset
+            if modo == 'excel':
+                with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+                    for hoja, datos in hojas.items():
+                        datos.to_excel(writer, sheet_name=hoja, index=False)
+            elif modo == 'streaming':
+                self._export_excel_streaming(hojas, output_file, chunk_size, formatos_excel)
+            else:
+                output_file = self._export_csv_bundle(hojas, output_file)
             
-            print("Métricas calculadas exitosamente:")
-            print(f"  - ICV_30: Promedio {dataset['icv_30'].mean():.3f}")
-            print(f"  - Gasto Provisión: Total {dataset['gasto_provision'].sum():,.0f}")
-            print(f"  - Gasto Provisión Neto: Total {dataset['gasto_provision_neto'].sum():,.0f}")
-            print(f"  - Registros procesados: {len(dataset)}")
+            print(f"Datos exportados exitosamente a: {output_file}")
+            print(f"Registros exportados: {len(export_data)}")
+            
+            return export_data
             
         except Exception as e:
-            print(f"Error calculando métricas: {e}")
+            print(f"Error exportando datos: {e}")
             raise
     
-    def export_for_powerbi(self, output_file='data/output/provisiones_powerbi.xlsx'):
-        """Exporta datos preparados para Power BI"""
+    def _prepare_export_frame(self, dataset):
+        """Selecciona las columnas exportadas y construye fecha_analisis como datetime"""
+        mes_key = dataset['fecha_analisis'].to_numpy()
+        calendario = self._build_calendario(mes_key)
+        
+        # El frame se arma una sola vez desde las columnas, sin copia previa del dataset
+        columnas = {col: dataset[col] for col in self.COLUMNAS_POWERBI}
+        columnas['fecha_analisis'] = pd.Series(
+            calendario['fecha'].to_numpy()[calendario.index.get_indexer(mes_key)],
+            index=dataset.index
+        )
+        return pd.DataFrame(columnas, copy=False)
+    
+    def build_star_schema(self, dataset):
+        """
+        Esquema estrella para Power BI
+        
+        La tabla de hechos conserva solo llaves enteras y medidas; alianza,
+        producto y los atributos de fecha pasan a dimensiones pequeñas. id_fecha
+        es la llave YYYYMM, e id_alianza / id_producto son la posición 1..n en el
+        orden alfabético, las mismas llaves sustitutas del cruce interno con
+        cond y recu. Las llaves de alianza y producto dependen del conjunto de
+        valores exportados, así que cada exportación debe cargarse completa.
+        
+        Args:
+            dataset (pd.DataFrame): Dataset con fecha_analisis como llave YYYYMM
+            
+        Returns:
+            dict: {hoja: pd.DataFrame} con Hechos_Provision, dim_alianza,
+                dim_producto y dim_calendario
+        """
+        mes_key = dataset['fecha_analisis'].to_numpy().astype('int64')
+        id_alianza, alianzas = self._surrogate_keys(dataset['alianza'])
+        id_producto, productos = self._surrogate_keys(dataset['producto'])
+        
+        columnas = {
+            'id_fecha': mes_key,
+            'id_alianza': id_alianza,
+            'id_producto': id_producto
+        }
+        for col in self.COLUMNAS_POWERBI:
+            if col not in self.ATRIBUTOS_DIMENSION:
+                columnas[col] = dataset[col].to_numpy()
+        hechos = pd.DataFrame(columnas, copy=False)
+        
+        calendario = self._build_calendario(mes_key)
+        dim_calendario = pd.DataFrame({
+            'id_fecha': calendario.index.to_numpy(),
+            'fecha_analisis': calendario['fecha'].to_numpy(),
+            'año': calendario['año'].to_numpy(),
+            'mes': calendario['mes'].to_numpy(),
+            'año_mes': calendario['año_mes'].astype(str).to_numpy(),
+            'trimestre': calendario['trimestre'].to_numpy(),
+            'año_trimestre': calendario['año_trimestre'].astype(str).to_numpy()
+        })
+        
+        return {
+            'Hechos_Provision': hechos,
+            'dim_alianza': self._dimension_table('alianza', alianzas, (id_alianza == 0).any()),
+            'dim_producto': self._dimension_table('producto', productos, (id_producto == 0).any()),
+            'dim_calendario': dim_calendario
+        }
+    
+    @staticmethod
+    def _dimension_table(nombre, categorias, con_nulos):
+        """Dimensión con su llave sustituta; la llave 0 representa valores nulos si los hay"""
+        dimension = pd.DataFrame({
+            f'id_{nombre}': np.arange(1, len(categorias) + 1),
+            nombre: categorias.to_numpy(dtype=object)
+        })
+        if con_nulos:
+            nulos = pd.DataFrame({f'id_{nombre}': [0], nombre: [None]})
+            dimension = pd.concat([nulos, dimension], ignore_index=True)
+        return dimension
+    
+    def _build_resumenes(self, export_data):
+        """Construye el cubo de agregación y las hojas de resumen derivadas de él"""
+        return self._resumenes_from_base(self._aggregate_base(export_data))
+    
+    def _aggregate_base(self, export_data):
+        """
+        Única pasada agrupada sobre la tabla de hechos
+        
+        Suma las medidas aditivas al grano (alianza, producto, mes). El resultado
+        es pequeño y aditivo, por lo que bases de distintas particiones pueden
+        concatenarse y volver a sumarse sin perder exactitud.
+        """
+        # Las medidas se acumulan en 64 bits aunque el dataset venga reducido
+        columnas = {col: export_data[col] for col in ['alianza', 'producto']}
+        for col in self.MEDIDAS_CUBO:
+            valores = export_data[col].to_numpy()
+            columnas[col] = valores.astype('int64' if np.issubdtype(valores.dtype, np.integer) else 'float64')
+        columnas['fecha_analisis'] = (export_data['año'].to_numpy().astype('int64') * 100
+                                      + export_data['mes'].to_numpy())
+        columnas['registros'] = 1
+        base = pd.DataFrame(columnas)
+        return base.groupby(
+            ['alianza', 'producto', 'fecha_analisis'], observed=True
+        ).sum().reset_index()
+    
+    def _resumenes_from_base(self, base):
+        """Arma el cubo desde la base agregada y extrae los resúmenes por alianza y producto"""
+        cubo = self.build_rollup_cube(base)
+        columnas = ['sald_k_ifrs', 'prov_k_ifrs', 'icv_30', 'gasto_provision_neto']
+        
+        resumenes = {}
+        for hoja, dimension in (('Resumen_Alianza', 'alianza'), ('Resumen_Producto', 'producto')):
+            resumen = cubo[cubo['agrupacion'] == dimension]
+            resumenes[hoja] = resumen[[dimension] + columnas].round(2).reset_index(drop=True)
+        resumenes['Cubo_Resumen'] = cubo
+        return resumenes
+    
+    def build_rollup_cube(self, base):
+        """
+        Cubo de agregación estilo GROUPING SETS
+        
+        Cubre toda combinación de alianza (o total) x producto (o total) x nivel
+        de tiempo (mes, trimestre, año o total), incluido el total general. Cada
+        conjunto se deriva de la base ya agregada, no de la tabla de hechos. Los
+        ratios se recalculan desde numeradores y denominadores sumados, nunca
+        promediando ratios de filas.
+        
+        Args:
+            base (pd.DataFrame): Salida de _aggregate_base
+            
+        Returns:
+            pd.DataFrame: Una fila por combinación; las dimensiones agregadas
+                quedan nulas y grouping_id marca con un bit cada una, en el orden
+                de DIMENSIONES_CUBO (como GROUPING_ID en SQL)
+        """
+        mes_key = base['fecha_analisis'].to_numpy()
+        calendario = self._build_calendario(mes_key)
+        posiciones = calendario.index.get_indexer(mes_key)
+        base = base.assign(
+            año=mes_key // 100,
+            año_trimestre=calendario['año_trimestre'].array.take(posiciones),
+            año_mes=calendario['año_mes'].array.take(posiciones)
+        )
+        
+        niveles_tiempo = [['año', 'año_trimestre', 'año_mes'], ['año', 'año_trimestre'], ['año'], []]
+        medidas = self.MEDIDAS_CUBO + ['registros']
+        conjuntos = []
+        
+        for dims_alianza in (['alianza'], []):
+            for dims_producto in (['producto'], []):
+                for dims_tiempo in niveles_tiempo:
+                    claves = dims_alianza + dims_producto + dims_tiempo
+                    if claves:
+                        conjunto = base.groupby(claves, observed=True)[medidas].sum().reset_index()
+                    else:
+                        conjunto = base[medidas].sum().to_frame().T.astype(base[medidas].dtypes)
+                    
+                    conjunto['agrupacion'] = '+'.join(claves) or 'total'
+                    conjunto['grouping_id'] = sum(
+                        1 << (len(self.DIMENSIONES_CUBO) - 1 - i)
+                        for i, dim in enumerate(self.DIMENSIONES_CUBO) if dim not in claves
+                    )
+                    conjuntos.append(conjunto)
+        
+        cubo = pd.concat(conjuntos, ignore_index=True)
+        for col in ('alianza', 'producto', 'año_trimestre', 'año_mes'):
+            cubo[col] = cubo[col].astype(object)
+        
+        cubo['icv_30'] = self._safe_ratio(cubo['sald_30mas'], cubo['sald_k_ifrs'])
+        cubo['ratio_provision_saldo'] = self._safe_ratio(cubo['prov_k_ifrs'], cubo['sald_k_ifrs'])
+        cubo['cobertura_provision'] = self._safe_ratio(cubo['prov_k_ifrs'], cubo['sald_30mas'])
+        
+        columnas = ['agrupacion', 'grouping_id'] + self.DIMENSIONES_CUBO + medidas + [
+            'icv_30', 'ratio_provision_saldo', 'cobertura_provision'
+        ]
+        return cubo[columnas]
+    
+    @staticmethod
+    def _safe_ratio(numerador, denominador):
+        """Cociente con 0 cuando el denominador es 0, como en las métricas por fila"""
+        numerador = numerador.to_numpy(dtype='float64')
+        denominador = denominador.to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominador != 0, numerador / denominador, 0)
+    
+    def _column_types(self, columnas):
+        """Tipo y formato declarados para cada columna de una hoja exportada"""
+        tipos = {**self.COLUMNAS_POWERBI, **self.COLUMNAS_CUBO, **self.COLUMNAS_ESTRELLA}
+        return {col: tipos[col] for col in columnas}
+    
+    def _export_excel_streaming(self, hojas, output_file, chunk_size, formatos=True):
+        """
+        Escribe el libro en modo write-only de openpyxl
+        
+        Las filas se convierten y escriben por bloques de chunk_size, por lo que
+        nunca existe en memoria más de un bloque de celdas a la vez.
+        
+        Args:
+            hojas (dict): {hoja: pd.DataFrame} en el orden en que se escriben
+        """
+        wb = Workbook(write_only=True)
+        
+        for hoja, datos in hojas.items():
+            tipos = self._column_types(datos.columns)
+            self._write_sheet_streaming(wb.create_sheet(hoja), datos, tipos, chunk_size, formatos)
+        
+        wb.save(output_file)
+    
+    def _write_sheet_streaming(self, ws, df, tipos, chunk_size, formatos=True, encabezado=True):
+        """Escribe un DataFrame en una hoja write-only con tipos y formatos declarados"""
+        columnas = list(tipos)
+        if encabezado:
+            ws.append(columnas)
+        
+        # Una celda con estilo por columna, reutilizada en cada fila: openpyxl
+        # serializa cada celda en cuanto se agrega la fila
+        plantillas = []
+        for col in columnas:
+            formato = tipos[col][1] if formatos else None
+            if formato is None:
+                plantillas.append(None)
+            else:
+                celda = WriteOnlyCell(ws)
+                celda.number_format = formato
+                plantillas.append(celda)
+        
+        for inicio in range(0, len(df), chunk_size):
+            bloque = df.iloc[inicio:inicio + chunk_size]
+            valores = [self._column_to_python(bloque[col], tipos[col][0]) for col in columnas]
+            
+            for fila in zip(*valores):
+                celdas = []
+                for celda, valor in zip(plantillas, fila):
+                    if celda is None or valor is None:
+                        celdas.append(valor)
+                    else:
+                        celda.value = valor
+                        celdas.append(celda)
+                ws.append(celdas)
+    
+    @staticmethod
+    def _column_to_python(serie, tipo):
+        """Convierte una columna a una lista de valores nativos de Python (nulos como None)"""
+        nulos = serie.isna().to_numpy()
+        if tipo == 'fecha':
+            valores = serie.astype(object).tolist()
+        elif tipo == 'entero':
+            valores = serie.fillna(0).astype('int64').tolist()
+        elif tipo == 'decimal':
+            valores = serie.astype('float64').tolist()
+        else:
+            valores = serie.astype(object).tolist()
+        
+        if nulos.any():
+            valores = [None if nulo else valor for valor, nulo in zip(valores, nulos)]
+        return valores
+    
+    def _export_csv_bundle(self, hojas, output_file):
+        """Exporta un CSV por hoja en un directorio junto al archivo Excel"""
+        directorio = os.path.splitext(output_file)[0]
+        os.makedirs(directorio, exist_ok=True)
+        
+        for hoja, datos in hojas.items():
+            datos.to_csv(os.path.join(directorio, f'{hoja}.csv'),
+                         index=False, date_format='%Y-%m-%d')
+        
+        return directorio
+
+    def export_partitioned(self, directorio='data/output/provisiones_powerbi',
+                           granularidad='año_mes', formato='csv', esquema='plano'):
+        """
+        Exporta la tabla principal particionada por periodo para la
+        actualización incremental de Power BI
+        
+        Escribe un archivo por partición en directorio/<tabla>/<periodo>, las
+        tablas no particionadas (resúmenes y, en esquema estrella, dimensiones)
+        en directorio, y un manifiesto.json con el SHA-256 de cada archivo. El
+        checksum se calcula sobre el CSV canónico del contenido (filas ordenadas
+        por llave), así que no depende del formato del archivo. Solo se
+        reescriben los archivos cuyo checksum cambió respecto al manifiesto
+        previo; las particiones que ya no existen se eliminan.
+        
+        Args:
+            directorio (str): Directorio de salida con el manifiesto
+            granularidad (str): 'año_mes' (una partición por mes) o 'año'
+            formato (str): 'csv' o 'excel' (un libro write-only por archivo)
+            esquema (str): 'plano' o 'estrella', como en export_for_powerbi
+            
+        Returns:
+            dict: Archivos escritos, sin cambios y eliminados
+        """
         if self.dataset_final is None:
             print("Error: Dataset final no disponible.")
             return None
         
+        if granularidad not in self.GRANULARIDADES_PARTICION:
+            raise ValueError(f"Granularidad de partición no soportada: {granularidad}")
+        if formato not in ('csv', 'excel'):
+            raise ValueError(f"Formato de partición no soportado: {formato}")
+        if esquema not in self.ESQUEMAS_EXPORTACION:
+            raise ValueError(f"Esquema de exportación no soportado: {esquema}")
+        
+        print(f"Exportando particiones por {granularidad} a: {directorio}")
+        
         try:
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            os.makedirs(directorio, exist_ok=True)
+            ruta_manifiesto = os.path.join(directorio, 'manifiesto.json')
+            previo = self._load_manifest(ruta_manifiesto)
+            configuracion = {'granularidad': granularidad, 'formato': formato, 'esquema': esquema}
+            # Con otra configuración no se reutiliza ningún archivo previo
+            misma_configuracion = all(previo.get(k) == v for k, v in configuracion.items())
+            vigentes = previo.get('archivos', {}) if misma_configuracion else {}
+            
+            export_data = self._prepare_export_frame(self.dataset_final)
+            tablas = self._build_resumenes(export_data)
+            if esquema == 'estrella':
+                estrella = self.build_star_schema(self.dataset_final)
+                nombre, principal = 'Hechos_Provision', estrella.pop('Hechos_Provision')
+                claves = ['id_alianza', 'id_producto', 'id_fecha']
+                tablas = {**estrella, **tablas}
+            else:
+                nombre, principal = 'Datos_Principales', export_data
+                claves = ['alianza', 'producto', 'fecha_analisis']
             
-            export_data = self.dataset_final.copy()
+            extension = 'csv' if formato == 'csv' else 'xlsx'
+            archivos = {}
+            periodos = export_data[granularidad].astype(str).to_numpy()
+            for periodo, posiciones in pd.Series(np.arange(len(periodos))).groupby(periodos):
+                parte = principal.iloc[posiciones.to_numpy()].sort_values(claves)
+                archivos[f'{nombre}/{periodo}.{extension}'] = (parte.reset_index(drop=True), nombre)
+            for hoja, datos in tablas.items():
+                archivos[f'{hoja}.{extension}'] = (datos, hoja)
             
-            columns_powerbi = [
-                'fecha_analisis', 'año', 'mes', 'año_mes', 'trimestre', 'año_trimestre',
-                'alianza', 'producto',
-                'prov_k_ifrs', 'prov_t_ifrs',
-                'sald_30mas', 'sald_k_ifrs', 'sald_t_ifrs',
-                'saldo_castigo', 'saldo_castigo_t',
-                'condonaciones', 'recuperaciones',
-                'icv_30', 'gasto_provision', 'gasto_provision_neto',
-                'ratio_provision_saldo', 'cobertura_provision'
-            ]
+            resultado = {'escritos': [], 'sin_cambios': [], 'eliminados': []}
+            entradas = {}
+            for relativo, (datos, hoja) in archivos.items():
+                contenido = self._canonical_csv(datos)
+                checksum = hashlib.sha256(contenido).hexdigest()
+                ruta = os.path.join(directorio, relativo)
+                anterior = vigentes.get(relativo)
+                
+                if anterior and anterior['sha256'] == checksum and os.path.exists(ruta):
+                    entradas[relativo] = anterior
+                    resultado['sin_cambios'].append(relativo)
+                    continue
+                
+                self._write_partition_file(datos, contenido, ruta, formato, hoja)
+                entradas[relativo] = {
+                    'sha256': checksum,
+                    'registros': len(datos),
+                    'actualizado': datetime.now().isoformat(timespec='seconds')
+                }
+                resultado['escritos'].append(relativo)
+            
+            for relativo in previo.get('archivos', {}):
+                if relativo not in entradas:
+                    ruta = os.path.join(directorio, relativo)
+                    if os.path.exists(ruta):
+                        os.remove(ruta)
+                    resultado['eliminados'].append(relativo)
+            
+            self._write_atomic(ruta_manifiesto, json.dumps({
+                **configuracion,
+                'tabla_particionada': nombre,
+                'generado': datetime.now().isoformat(timespec='seconds'),
+                'archivos': entradas
+            }, indent=2, ensure_ascii=False).encode('utf-8'))
             
-            export_data = export_data[columns_powerbi]
+            print(f"Archivos escritos: {len(resultado['escritos'])}, "
+                  f"sin cambios: {len(resultado['sin_cambios'])}, "
+                  f"eliminados: {len(resultado['eliminados'])}")
             
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                export_data.to_excel(writer, sheet_name='Datos_Principales', index=False)
+            return resultado
+            
+        except Exception as e:
+            print(f"Error exportando particiones: {e}")
+            raise
+    
+    @staticmethod
+    def _load_manifest(ruta):
+        """Manifiesto de una exportación particionada previa; vacío si no existe"""
+        if not os.path.exists(ruta):
+            return {}
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    @staticmethod
+    def _canonical_csv(datos):
+        """Bytes del CSV canónico de una tabla, base del checksum de cada archivo"""
+        return datos.to_csv(index=False, date_format='%Y-%m-%d', lineterminator='\n').encode('utf-8')
+    
+    def _write_partition_file(self, datos, contenido, ruta, formato, hoja):
+        """Escribe un archivo de la exportación particionada de forma atómica"""
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        if formato == 'csv':
+            self._write_atomic(ruta, contenido)
+            return
+        
+        temporal = ruta + '.tmp'
+        wb = Workbook(write_only=True)
+        self._write_sheet_streaming(wb.create_sheet(hoja), datos,
+                                    self._column_types(datos.columns), len(datos) or 1)
+        wb.save(temporal)
+        os.replace(temporal, ruta)
+    
+    @staticmethod
+    def _write_atomic(ruta, contenido):
+        """Escribe bytes en un temporal y lo renombra, para no dejar archivos a medias"""
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    
+    def process_chunked(self, archivo='data/raw/Provisiones.xlsx',
+                        output_file='data/output/provisiones_powerbi.xlsx', modo='csv',
+                        filas_por_bloque=100000, meses_por_particion=1,
+                        directorio_temporal=None):
+        """
+        Procesa el archivo de provisiones fuera de memoria por particiones de tiempo
+        
+        Primero lee ambas hojas por bloques de filas y las reparte en archivos
+        temporales por mes (cond/recu ya agregado por bloque). Luego procesa los
+        meses en orden, arrastrando la última prov_k_ifrs por (alianza, producto)
+        entre particiones para que gasto_provision sea exacto, y escribe cada
+        partición a la salida en cuanto se calcula. La memoria pico queda acotada
+        por filas_por_bloque y por el tamaño de la partición más grande.
+        
+        Las filas de salida quedan ordenadas por periodo y, dentro de cada
+        partición, por alianza y producto.
+        
+        Args:
+            archivo (str): Archivo Excel con las hojas 'Prov' y 'cond y recu'
+            output_file (str): Archivo de salida, con la misma convención que export_for_powerbi
+            modo (str): 'csv' (paquete de CSVs) o 'streaming' (Excel write-only)
+            filas_por_bloque (int): Filas leídas del Excel por bloque
+            meses_por_particion (int): Meses procesados juntos en cada partición
+            directorio_temporal (str): Directorio para los archivos intermedios
+            
+        Returns:
+            dict: Registros y particiones procesadas, y ruta de salida
+        """
+        if modo not in ('csv', 'streaming'):
+            raise ValueError(f"Modo no soportado en procesamiento por particiones: {modo}")
+        
+        print(f"Procesando por particiones: {archivo}")
+        
+        try:
+            with tempfile.TemporaryDirectory(dir=directorio_temporal) as tmp:
+                meses = self._spill_by_month(archivo, tmp, filas_por_bloque)
+                
+                particiones = [
+                    meses[i:i + meses_por_particion]
+                    for i in range(0, len(meses), meses_por_particion)
+                ]
+                escritor = _EscritorParticiones(self, output_file, modo)
+                estado = None
+                contexto = None
+                total = 0
                 
-                resumen_alianza = export_data.groupby(['alianza']).agg({
-                    'sald_k_ifrs': 'sum',
-                    'prov_k_ifrs': 'sum',
-                    'icv_30': 'mean',
-                    'gasto_provision_neto': 'sum'
-                }).round(2)
-                resumen_alianza.to_excel(writer, sheet_name='Resumen_Alianza')
+                for particion in particiones:
+                    prov_part, cond_part = self._read_partition(tmp, particion)
+                    
+                    dataset = self._compute_metrics(prov_part, cond_part, estado, contexto)
+                    nuevo_estado = self._last_provision_state(dataset)
+                    estado = nuevo_estado if estado is None else nuevo_estado.combine_first(estado)
+                    
+                    # Cola de meses recientes para las ventanas de la siguiente partición
+                    reciente = self._rolling_context(dataset)
+                    contexto = reciente if contexto is None else self._rolling_context(
+                        pd.concat([contexto, reciente], ignore_index=True)
+                    )
+                    
+                    escritor.write(self._prepare_export_frame(dataset))
+                    total += len(dataset)
+                    print(f"  Partición {particion[0]}-{particion[-1]}: {len(dataset)} registros")
                 
-                resumen_producto = export_data.groupby(['producto']).agg({
-                    'sald_k_ifrs': 'sum',
-                    'prov_k_ifrs': 'sum',
-                    'icv_30': 'mean',
-                    'gasto_provision_neto': 'sum'
-                }).round(2)
-                resumen_producto.to_excel(writer, sheet_name='Resumen_Producto')
+                output = escritor.close()
             
-            print(f"Datos exportados exitosamente a: {output_file}")
-            print(f"Registros exportados: {len(export_data)}")
+            self.estado_provision = estado
             
-            return export_data
+            print(f"Datos exportados exitosamente a: {output}")
+            print(f"Registros exportados: {total} en {len(particiones)} particiones")
+            
+            return {'registros': total, 'particiones': len(particiones), 'output': output}
             
         except Exception as e:
-            print(f"Error exportando datos: {e}")
+            print(f"Error procesando por particiones: {e}")
             raise
+    
+    def _spill_by_month(self, archivo, directorio, filas_por_bloque):
+        """
+        Reparte ambas hojas en CSVs temporales por mes; retorna los meses ordenados
+        
+        Las filas de Prov sin fecha_analisis no pertenecen a ningún mes: se
+        descartan con una advertencia, igual que las omite groupby en memoria.
+        """
+        meses = set()
+        sin_mes = 0
+        
+        for bloque in iter_sheet_blocks(archivo, 'Prov', filas_por_bloque,
+                                        ESPECIFICACION_PROVISIONES['Prov']):
+            # Un mes nulo deja la columna como float64: se descartan esas filas
+            # y la llave vuelve a entero para que el CSV sea prov_YYYYMM.csv
+            nulos = bloque['fecha_analisis'].isna()
+            if nulos.any():
+                sin_mes += int(nulos.sum())
+                bloque = bloque[~nulos].astype({'fecha_analisis': 'int64'})
+            for mes, grupo in bloque.groupby('fecha_analisis'):
+                self._append_csv(grupo, os.path.join(directorio, f'prov_{int(mes)}.csv'))
+                meses.add(int(mes))
+        
+        if sin_mes:
+            print(f"Advertencia: {sin_mes} registros de provisiones sin fecha_analisis descartados")
+        
+        for bloque in iter_sheet_blocks(archivo, 'cond y recu', filas_por_bloque,
+                                        ESPECIFICACION_PROVISIONES['cond y recu']):
+            # Las sumas son aditivas, así que agregar por bloque no altera el resultado
+            bloque = bloque.assign(fecha_analisis=self._to_month_key(bloque['fecha_analisis']))
+            agregado = bloque.groupby(['fecha_analisis', 'alianza', 'producto']).agg({
+                'condonaciones': 'sum',
+                'recuperaciones': 'sum'
+            }).reset_index()
+            for mes, grupo in agregado.groupby('fecha_analisis'):
+                self._append_csv(grupo, os.path.join(directorio, f'cond_{mes}.csv'))
+        
+        return sorted(meses)
+    
+    def _read_partition(self, directorio, meses):
+        """Lee de los CSVs temporales las provisiones y cond/recu de una partición"""
+        claves = {'alianza': str, 'producto': str}
+        prov = pd.concat(
+            [pd.read_csv(os.path.join(directorio, f'prov_{mes}.csv'), dtype=claves) for mes in meses],
+            ignore_index=True
+        )
+        
+        archivos_cond = [os.path.join(directorio, f'cond_{mes}.csv') for mes in meses]
+        cond = [pd.read_csv(f, dtype=claves) for f in archivos_cond if os.path.exists(f)]
+        if cond:
+            cond = pd.concat(cond, ignore_index=True)
+        else:
+            cond = pd.DataFrame(
+                columns=['fecha_analisis', 'alianza', 'producto', 'condonaciones', 'recuperaciones']
+            ).astype({'fecha_analisis': 'int64', 'condonaciones': 'float64', 'recuperaciones': 'float64'})
+        
+        # cond/recu ya viene con llave YYYYMM; se expresa como datetime para _compute_metrics
+        cond['fecha_analisis'] = pd.to_datetime(cond['fecha_analisis'].astype(str), format='%Y%m')
+        return prov, cond
+    
+    @staticmethod
+    def _append_csv(df, path):
+        """Agrega filas a un CSV, escribiendo el encabezado solo si el archivo es nuevo"""
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+class PresupuestoMemoriaExcedido(MemoryError):
+    """El cálculo superó el presupuesto de memoria configurado"""
+
+class _MonitorMemoria:
+    """
+    Mide con tracemalloc la memoria pico de cada etapa y aplica un presupuesto opcional
+    
+    El presupuesto se verifica por etapa y no es un tope duro: antes de empezar
+    una etapa se compara la memoria ya retenida más su estimación, y al
+    terminar, el pico medido. Una etapa que asigna más de lo estimado solo se
+    detecta cuando termina.
+    """
+    
+    # Cota por celda para estimar el dataset final antes de empezar
+    BYTES_POR_CELDA = 8
+    COLUMNAS_AGREGADAS = 13
+    
+    def __init__(self, presupuesto_mb=None):
+        """
+        Args:
+            presupuesto_mb (float): Memoria máxima asignable; None no limita
+        """
+        self.presupuesto_mb = presupuesto_mb
+        self.picos = {}
+        self.filas = 0
+        self.columnas_estimadas = 0
+        self._propio = False
+    
+    def __enter__(self):
+        # Si ya hay un tracemalloc activo (p. ej. un benchmark) se reutiliza
+        self._propio = not tracemalloc.is_tracing()
+        if self._propio:
+            tracemalloc.start()
+        return self
+    
+    def __exit__(self, *exc):
+        if self._propio:
+            tracemalloc.stop()
+        return False
+    
+    @contextmanager
+    def etapa(self, nombre, columnas=1):
+        """
+        Registra la memoria pico de un bloque y verifica el presupuesto antes y después
+        
+        Args:
+            nombre (str): Etapa para el registro y los mensajes
+            columnas (int): Columnas de largo filas que la etapa asigna; con la
+                cota de verificar_estimacion dan la estimación previa
+        """
+        retenidos, _ = tracemalloc.get_traced_memory()
+        self.verificar(retenidos + self.filas * columnas * self.BYTES_POR_CELDA,
+                       f'{nombre} (estimación previa)')
+        tracemalloc.reset_peak()
+        yield
+        _, pico = tracemalloc.get_traced_memory()
+        self.picos[nombre] = pico / 1024 ** 2
+        self.verificar(pico, nombre)
+    
+    def verificar_estimacion(self, prov_df):
+        """
+        Falla antes de empezar si el dataset final estimado no cabe en el presupuesto
+        
+        Guarda las filas y columnas estimadas para las verificaciones previas de cada etapa.
+        """
+        self.filas = len(prov_df)
+        self.columnas_estimadas = len(prov_df.columns) + self.COLUMNAS_AGREGADAS
+        self.verificar(self.filas * self.columnas_estimadas * self.BYTES_POR_CELDA, 'estimación inicial')
+    
+    def verificar(self, bytes_usados, etapa):
+        """Lanza PresupuestoMemoriaExcedido si bytes_usados supera el presupuesto"""
+        if self.presupuesto_mb is None:
+            return
+        usados_mb = bytes_usados / 1024 ** 2
+        if usados_mb > self.presupuesto_mb:
+            raise PresupuestoMemoriaExcedido(
+                f"La etapa '{etapa}' requiere {usados_mb:.1f} MB, "
+                f"por encima del presupuesto de {self.presupuesto_mb} MB"
+            )
+
+class _EscritorParticiones:
+    """Escribe particiones sucesivas al paquete CSV o a un Excel write-only"""
+    
+    def __init__(self, preparador, output_file, modo):
+        self.preparador = preparador
+        self.output_file = output_file
+        self.modo = modo
+        self.bases = []
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        
+        if modo == 'csv':
+            self.directorio = os.path.splitext(output_file)[0]
+            os.makedirs(self.directorio, exist_ok=True)
+            self.datos_path = os.path.join(self.directorio, 'Datos_Principales.csv')
+            if os.path.exists(self.datos_path):
+                os.remove(self.datos_path)
+        else:
+            self.wb = Workbook(write_only=True)
+            self.ws = self.wb.create_sheet('Datos_Principales')
+            self.ws.append(list(preparador.COLUMNAS_POWERBI))
+    
+    def write(self, export_data):
+        """Escribe una partición y acumula su base agregada para el cubo"""
+        if self.modo == 'csv':
+            export_data.to_csv(
+                self.datos_path, mode='a', header=not os.path.exists(self.datos_path),
+                index=False, date_format='%Y-%m-%d'
+            )
+        else:
+            self.preparador._write_sheet_streaming(
+                self.ws, export_data, self.preparador.COLUMNAS_POWERBI,
+                len(export_data) or 1, encabezado=False
+            )
+        
+        self.bases.append(self.preparador._aggregate_base(export_data))
+    
+    def close(self):
+        """Escribe el cubo y los resúmenes desde las bases acumuladas y cierra la salida"""
+        base = pd.concat(self.bases, ignore_index=True).groupby(
+            ['alianza', 'producto', 'fecha_analisis'], observed=True
+        ).sum().reset_index()
+        resumenes = self.preparador._resumenes_from_base(base)
+        
+        if self.modo == 'csv':
+            for hoja, resumen in resumenes.items():
+                resumen.to_csv(os.path.join(self.directorio, f'{hoja}.csv'), index=False)
+            return self.directorio
+        
+        for hoja, resumen in resumenes.items():
+            tipos = self.preparador._column_types(resumen.columns)
+            self.preparador._write_sheet_streaming(
+                self.wb.create_sheet(hoja), resumen, tipos, len(resumen) or 1
+            )
+        self.wb.save(self.output_file)
+        return self.output_file
+
+def benchmark_exportacion(preparador, directorio='data/output/benchmark_exportacion',
+                          modos=PowerBIDataPreparator.MODOS_EXPORTACION):
+    """
+    Compara tiempo y memoria pico de los modos de exportación
+    
+    Cada modo se ejecuta dos veces: una para medir tiempo sin la sobrecarga de
+    tracemalloc y otra para medir la memoria pico asignada durante la exportación.
+    Las columnas relativas dividen por el primer modo ('excel' por defecto), de
+    modo que un valor menor que 1 es la ganancia de ese modo frente a la base.
+    
+    Args:
+        preparador (PowerBIDataPreparator): Preparador con métricas ya calculadas
+        directorio (str): Directorio donde se escriben los archivos de prueba
+        modos (tuple): Modos de exportación a comparar; el primero es la base
+        
+    Returns:
+        pd.DataFrame: Segundos y MB pico por modo, absolutos y relativos a la base
+    """
+    output_file = os.path.join(directorio, 'provisiones_powerbi.xlsx')
+    resultados = []
+    
+    for modo in modos:
+        inicio = time.perf_counter()
+        preparador.export_for_powerbi(output_file, modo=modo)
+        segundos = time.perf_counter() - inicio
+        
+        tracemalloc.start()
+        preparador.export_for_powerbi(output_file, modo=modo)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        resultados.append({
+            'modo': modo,
+            'registros': len(preparador.dataset_final),
+            'segundos': round(segundos, 3),
+            'memoria_pico_mb': round(pico / 1024 ** 2, 1)
+        })
+    
+    resultados = pd.DataFrame(resultados)
+    base = resultados.iloc[0]
+    resultados['segundos_relativos'] = (resultados['segundos'] / base['segundos']).round(2)
+    resultados['memoria_relativa'] = (resultados['memoria_pico_mb'] / base['memoria_pico_mb']).round(2)
+    return resultados
 
 def main():
     """Función principal de preparación de datos"""
+    parser = argparse.ArgumentParser(description='Preparación de datos de provisiones para Power BI')
+    parser.add_argument('--archivo', default='data/raw/Provisiones.xlsx', help='Libro de provisiones')
+    parser.add_argument('--salida', default='data/output/provisiones_powerbi.xlsx',
+                        help='Archivo de salida de export_for_powerbi')
+    parser.add_argument('--modo', default='excel', choices=PowerBIDataPreparator.MODOS_EXPORTACION)
+    parser.add_argument('--incremental', metavar='EXPORTACION_PREVIA',
+                        help='Calcula solo los meses posteriores a esta exportación plana '
+                             '(Excel o directorio CSV) y la extiende')
+    args = parser.parse_args()
+    
     try:
         print("Iniciando preparación de datos para Power BI")
         print("=" * 50)
         
         preparador = PowerBIDataPreparator()
-        preparador.load_provisiones_data()
-        preparador.calculate_metrics()
-        preparador.export_for_powerbi()
+        preparador.load_provisiones_data(args.archivo)
+        if args.incremental:
+            preparador.calculate_metrics_incremental(args.incremental)
+        else:
+            preparador.calculate_metrics()
+        preparador.export_for_powerbi(args.salida, modo=args.modo)
         
         print("\nPreparación de datos completada exitosamente")
-        print("Archivo generado: data/output/provisiones_powerbi.xlsx")
+        generado = os.path.splitext(args.salida)[0] if args.modo == 'csv' else args.salida
+        print(f"Archivo generado: {generado}")
         
     except Exception as e:
         print(f"Error en preparación de datos: {e}")
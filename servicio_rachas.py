@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Servicio de consulta de rachas
+API HTTP local sobre asyncio que sirve la mejor racha y el nivel de cada
+cliente desde un índice en memoria construido con rachas_resultado.csv.
+Recarga el índice cuando aparece una nueva versión del archivo
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+import pandas as pd
+
+ARCHIVO_RACHAS = 'data/output/rachas_resultado.csv'
+MAX_LOTE = 1000
+MAX_TOP = 1000
+MAX_CUERPO = 1024 * 1024
+
+ESTADOS_HTTP = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error'
+}
+
+class IndiceRachas:
+    """
+    Índice hash inmutable de una instantánea de rachas
+    
+    Cada registro se serializa a JSON una sola vez al construir el índice, de
+    modo que una consulta puntual es una búsqueda en diccionario. Los clientes
+    de cada nivel quedan ordenados como en rachas_resultado (racha y fecha_fin
+    descendentes) para responder top-N con un corte de lista.
+    """
+    
+    def __init__(self, rachas_df, version):
+        """
+        Args:
+            rachas_df (pd.DataFrame): Columnas identificacion, racha, fecha_fin y nivel
+            version (tuple): Identificador de la instantánea (mtime_ns, tamaño)
+        """
+        faltantes = {'identificacion', 'racha', 'fecha_fin', 'nivel'} - set(rachas_df.columns)
+        if faltantes:
+            raise ValueError(f"Columnas faltantes en el resultado de rachas: {sorted(faltantes)}")
+        
+        ordenado = rachas_df.sort_values(['racha', 'fecha_fin'], ascending=[False, False], kind='stable')
+        registros = [
+            {'identificacion': ident, 'racha': int(racha), 'fecha_fin': fecha, 'nivel': nivel}
+            for ident, racha, fecha, nivel in zip(
+                ordenado['identificacion'], ordenado['racha'],
+                ordenado['fecha_fin'], ordenado['nivel']
+            )
+        ]
+        
+        self.version = version
+        self.cargado = time.time()
+        self.registros = {registro['identificacion']: registro for registro in registros}
+        self.json_por_cliente = {
+            ident: json.dumps(registro, ensure_ascii=False).encode('utf-8')
+            for ident, registro in self.registros.items()
+        }
+        self.por_nivel = {}
+        for registro in registros:
+            self.por_nivel.setdefault(registro['nivel'], []).append(registro)
+        self.todos = registros
+    
+    @classmethod
+    def desde_csv(cls, archivo):
+        """Carga una instantánea de rachas_resultado.csv"""
+        estado = os.stat(archivo)
+        rachas_df = pd.read_csv(archivo, dtype={'identificacion': str, 'nivel': str, 'fecha_fin': str})
+        return cls(rachas_df, (estado.st_mtime_ns, estado.st_size))
+    
+    def __len__(self):
+        return len(self.registros)
+    
+    def top(self, n, nivel=None):
+        """Las n mejores rachas, opcionalmente de un solo nivel"""
+        fuente = self.todos if nivel is None else self.por_nivel.get(nivel, [])
+        return fuente[:n]
+    
+    def resumen(self):
+        """Clientes, racha promedio y máxima por nivel"""
+        niveles = {}
+        for nivel, registros in sorted(self.por_nivel.items()):
+            rachas = [registro['racha'] for registro in registros]
+            niveles[nivel] = {
+                'clientes': len(rachas),
+                'racha_promedio': round(sum(rachas) / len(rachas), 2),
+                'racha_maxima': max(rachas)
+            }
+        return {'clientes': len(self), 'niveles': niveles}
+
+class CacheLRU:
+    """Cache LRU de respuestas ya serializadas, con aciertos y fallos contados"""
+    
+    def __init__(self, capacidad=256):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def obtener(self, clave, calcular):
+        """Retorna el valor de clave, calculándolo con calcular() si no está"""
+        if clave in self._datos:
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return self._datos[clave]
+        
+        self.fallos += 1
+        valor = calcular()
+        self._datos[clave] = valor
+        if len(self._datos) > self.capacidad:
+            self._datos.popitem(last=False)
+        return valor
+    
+    def limpiar(self):
+        self._datos.clear()
+
+class ServicioRachas:
+    """
+    Servidor HTTP/1.1 mínimo con conexiones persistentes
+    
+    Endpoints:
+        GET  /rachas/<identificacion>    Mejor racha de un cliente
+        GET  /rachas?ids=a,b,c           Consulta por lote
+        POST /rachas/lote                Consulta por lote, {"identificaciones": [...]}
+        GET  /top?n=10&nivel=N4          Mejores rachas, opcionalmente por nivel
+        GET  /resumen                    Agregados por nivel
+        GET  /salud                      Estado, versión y cache
+    """
+    
+    def __init__(self, archivo=ARCHIVO_RACHAS, intervalo_recarga=2.0, capacidad_cache=256):
+        """
+        Args:
+            archivo (str): Resultado de rachas a servir
+            intervalo_recarga (float): Segundos entre revisiones del archivo
+            capacidad_cache (int): Respuestas agregadas retenidas en el cache LRU
+        """
+        self.archivo = archivo
+        self.intervalo_recarga = intervalo_recarga
+        self.cache = CacheLRU(capacidad_cache)
+        self.indice = IndiceRachas.desde_csv(archivo)
+        self.recargas = 0
+        self.solicitudes = 0
+        self._servidor = None
+        self._tarea_recarga = None
+        self._version_fallida = None
+    
+    async def iniciar(self, host='127.0.0.1', puerto=8080):
+        """Abre el socket y lanza la revisión periódica del archivo"""
+        self._servidor = await asyncio.start_server(self._atender_conexion, host, puerto)
+        self._tarea_recarga = asyncio.create_task(self._vigilar_archivo())
+        puerto_real = self._servidor.sockets[0].getsockname()[1]
+        print(f"Servicio de rachas en http://{host}:{puerto_real} "
+              f"({len(self.indice)} clientes desde {self.archivo})")
+        return puerto_real
+    
+    async def detener(self):
+        """Cierra el socket y cancela la revisión del archivo"""
+        if self._tarea_recarga:
+            self._tarea_recarga.cancel()
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+    
+    async def _vigilar_archivo(self):
+        """
+        Recarga el índice cuando cambia el mtime o el tamaño del archivo
+        
+        La lectura y construcción del índice corren en un hilo para no bloquear
+        las consultas; el índice anterior se sigue sirviendo hasta el reemplazo,
+        que es una sola asignación. Si la nueva instantánea no se puede leer se
+        conserva la anterior.
+        """
+        loop = asyncio.get_running_loop()
+        version = None
+        while True:
+            await asyncio.sleep(self.intervalo_recarga)
+            try:
+                estado = os.stat(self.archivo)
+                version = (estado.st_mtime_ns, estado.st_size)
+                if version in (self.indice.version, self._version_fallida):
+                    continue
+                indice = await loop.run_in_executor(None, IndiceRachas.desde_csv, self.archivo)
+            except Exception as e:
+                # La instantánea inválida no se reintenta hasta que el archivo cambie
+                self._version_fallida = version
+                print(f"Error recargando {self.archivo}: {e}")
+                continue
+            
+            self.indice = indice
+            self.cache.limpiar()
+            self.recargas += 1
+            print(f"Índice recargado: {len(indice)} clientes")
+    
+    async def _atender_conexion(self, reader, writer):
+        """Atiende solicitudes sucesivas de una conexión hasta que el cliente la cierre"""
+        try:
+            while True:
+                try:
+                    encabezado = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                
+                lineas = encabezado.decode('latin-1').split('\r\n')
+                try:
+                    metodo, ruta, protocolo = lineas[0].split(' ', 2)
+                except ValueError:
+                    writer.write(self._respuesta(400, {'error': 'Solicitud mal formada'}, False))
+                    break
+                
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if ':' in linea:
+                        nombre, valor = linea.split(':', 1)
+                        cabeceras[nombre.strip().lower()] = valor.strip()
+                
+                # Sin una longitud válida no se sabe dónde empieza la siguiente
+                # solicitud, así que tras responder el error se cierra la conexión
+                try:
+                    longitud = int(cabeceras.get('content-length', 0) or 0)
+                except ValueError:
+                    writer.write(self._respuesta(400, {'error': 'Content-Length inválido'}, False))
+                    break
+                if not 0 <= longitud <= MAX_CUERPO:
+                    writer.write(self._respuesta(
+                        413, {'error': f'Content-Length debe estar entre 0 y {MAX_CUERPO} bytes'}, False
+                    ))
+                    break
+                
+                cuerpo = b''
+                if longitud:
+                    try:
+                        cuerpo = await reader.readexactly(longitud)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        break
+                
+                conexion = cabeceras.get('connection', '').lower()
+                mantener = conexion != 'close' and (protocolo == 'HTTP/1.1' or conexion == 'keep-alive')
+                
+                self.solicitudes += 1
+                try:
+                    estado, contenido = self.despachar(metodo, ruta, cuerpo)
+                except Exception as e:
+                    estado, contenido = 500, {'error': str(e)}
+                
+                writer.write(self._respuesta(estado, contenido, mantener))
+                await writer.drain()
+                if not mantener:
+                    break
+        finally:
+            writer.close()
+    
+    def despachar(self, metodo, ruta, cuerpo=b''):
+        """
+        Resuelve una solicitud contra el índice vigente
+        
+        Returns:
+            tuple: (estado HTTP, dict o bytes JSON ya serializados)
+        """
+        partes = urlsplit(ruta)
+        camino = partes.path.rstrip('/')
+        parametros = parse_qs(partes.query)
+        indice = self.indice
+        
+        if camino == '/rachas/lote':
+            if metodo != 'POST':
+                return 405, {'error': 'Use POST'}
+            try:
+                identificaciones = json.loads(cuerpo or b'{}')['identificaciones']
+            except (ValueError, KeyError, TypeError):
+                return 400, {'error': 'Se espera {"identificaciones": [...]}'}
+            return self._lote(indice, identificaciones)
+        
+        if metodo != 'GET':
+            return 405, {'error': 'Use GET'}
+        
+        if camino.startswith('/rachas/'):
+            registro = indice.json_por_cliente.get(camino[len('/rachas/'):])
+            if registro is None:
+                return 404, {'error': 'Cliente sin racha registrada'}
+            return 200, registro
+        
+        if camino == '/rachas':
+            ids = [ident for valor in parametros.get('ids', []) for ident in valor.split(',') if ident]
+            return self._lote(indice, ids)
+        
+        if camino == '/top':
+            try:
+                n = int(parametros.get('n', ['10'])[0])
+            except ValueError:
+                return 400, {'error': 'n debe ser entero'}
+            if not 0 < n <= MAX_TOP:
+                return 400, {'error': f'n debe estar entre 1 y {MAX_TOP}'}
+            nivel = parametros.get('nivel', [None])[0]
+            return 200, self.cache.obtener(
+                (indice.version, 'top', nivel, n),
+                lambda: self._serializar({'nivel': nivel, 'rachas': indice.top(n, nivel)})
+            )
+        
+        if camino == '/resumen':
+            return 200, self.cache.obtener(
+                (indice.version, 'resumen'),
+                lambda: self._serializar(indice.resumen())
+            )
+        
+        if camino == '/salud':
+            return 200, {
+                'estado': 'ok',
+                'archivo': self.archivo,
+                'clientes': len(indice),
+                'version_mtime_ns': indice.version[0],
+                'cargado': indice.cargado,
+                'recargas': self.recargas,
+                'solicitudes': self.solicitudes,
+                'cache': {'aciertos': self.cache.aciertos, 'fallos': self.cache.fallos}
+            }
+        
+        return 404, {'error': f'Ruta no encontrada: {partes.path}'}
+    
+    @staticmethod
+    def _lote(indice, identificaciones):
+        """Consulta por lote: registros encontrados y lista de no encontrados"""
+        if not isinstance(identificaciones, list):
+            return 400, {'error': 'identificaciones debe ser una lista'}
+        if len(identificaciones) > MAX_LOTE:
+            return 413, {'error': f'Máximo {MAX_LOTE} identificaciones por lote'}
+        
+        encontrados = []
+        no_encontrados = []
+        for ident in identificaciones:
+            registro = indice.registros.get(str(ident))
+            if registro is None:
+                no_encontrados.append(ident)
+            else:
+                encontrados.append(registro)
+        return 200, {'rachas': encontrados, 'no_encontrados': no_encontrados}
+    
+    @staticmethod
+    def _serializar(contenido):
+        return json.dumps(contenido, ensure_ascii=False).encode('utf-8')
+    
+    def _respuesta(self, estado, contenido, mantener):
+        """Respuesta HTTP completa con cuerpo JSON"""
+        if not isinstance(contenido, bytes):
+            contenido = self._serializar(contenido)
+        encabezado = (
+            f"HTTP/1.1 {estado} {ESTADOS_HTTP[estado]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(contenido)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+        )
+        return encabezado.encode('latin-1') + contenido
+
+async def _servir(archivo, host, puerto, intervalo_recarga):
+    servicio = ServicioRachas(archivo, intervalo_recarga)
+    await servicio.iniciar(host, puerto)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servicio.detener()
+
+async def _cliente_carga(host, puerto, rutas, cantidad, latencias):
+    """Conexión persistente que envía cantidad solicitudes GET en secuencia"""
+    reader, writer = await asyncio.open_connection(host, puerto)
+    errores = 0
+    try:
+        for i in range(cantidad):
+            ruta = rutas[i % len(rutas)]
+            inicio = time.perf_counter()
+            writer.write(f"GET {ruta} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            encabezado = await reader.readuntil(b'\r\n\r\n')
+            longitud = 0
+            for linea in encabezado.split(b'\r\n'):
+                if linea.lower().startswith(b'content-length:'):
+                    longitud = int(linea.split(b':', 1)[1])
+            await reader.readexactly(longitud)
+            latencias.append(time.perf_counter() - inicio)
+            if not encabezado.startswith(b'HTTP/1.1 200'):
+                errores += 1
+    finally:
+        writer.close()
+    return errores
+
+async def prueba_carga(host='127.0.0.1', puerto=8080, solicitudes=20000, concurrencia=50,
+                       rutas=None):
+    """
+    Genera carga contra un servicio en ejecución
+    
+    Args:
+        host, puerto: Dirección del servicio
+        solicitudes (int): Total de solicitudes a enviar
+        concurrencia (int): Conexiones persistentes simultáneas
+        rutas (list): Rutas a consultar en rotación; por defecto consultas
+            puntuales de todos los clientes del archivo de rachas
+    
+    Returns:
+        dict: Solicitudes por segundo, latencias p50/p99 en ms y errores
+    """
+    if rutas is None:
+        ids = pd.read_csv(ARCHIVO_RACHAS, dtype={'identificacion': str})['identificacion']
+        rutas = [f'/rachas/{ident}' for ident in ids]
+    
+    por_conexion = [solicitudes // concurrencia + (1 if i < solicitudes % concurrencia else 0)
+                    for i in range(concurrencia)]
+    latencias = []
+    
+    inicio = time.perf_counter()
+    errores = await asyncio.gather(*[
+        _cliente_carga(host, puerto, rutas[i:] + rutas[:i], cantidad, latencias)
+        for i, cantidad in enumerate(por_conexion) if cantidad
+    ])
+    segundos = time.perf_counter() - inicio
+    
+    latencias.sort()
+    return {
+        'solicitudes': len(latencias),
+        'segundos': round(segundos, 3),
+        'solicitudes_por_segundo': round(len(latencias) / segundos, 1),
+        'latencia_p50_ms': round(latencias[len(latencias) // 2] * 1000, 3),
+        'latencia_p99_ms': round(latencias[int(len(latencias) * 0.99)] * 1000, 3),
+        'errores': sum(errores)
+    }
+
+def _iniciar_servicio_local(archivo, puerto, espera=15.0):
+    """Levanta el servicio en un subproceso y espera a que acepte conexiones"""
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'servir', '--archivo', archivo,
+         '--puerto', str(puerto)],
+        stdout=subprocess.DEVNULL
+    )
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        try:
+            asyncio.run(_probar_conexion(puerto))
+            return proceso
+        except OSError:
+            if proceso.poll() is not None:
+                break
+            time.sleep(0.1)
+    proceso.terminate()
+    raise RuntimeError(f"El servicio local no respondió en el puerto {puerto}")
+
+async def _probar_conexion(puerto):
+    _, writer = await asyncio.open_connection('127.0.0.1', puerto)
+    writer.close()
+
+def main():
+    """Sirve el índice de rachas o ejecuta una prueba de carga"""
+    parser = argparse.ArgumentParser(description='Servicio de consulta de rachas')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    
+    servir = subcomandos.add_parser('servir', help='Inicia el servicio')
+    servir.add_argument('--archivo', default=ARCHIVO_RACHAS)
+    servir.add_argument('--host', default='127.0.0.1')
+    servir.add_argument('--puerto', type=int, default=8080)
+    servir.add_argument('--intervalo-recarga', type=float, default=2.0)
+    
+    carga = subcomandos.add_parser('carga', help='Prueba de carga contra el servicio')
+    carga.add_argument('--host', default='127.0.0.1')
+    carga.add_argument('--puerto', type=int, default=8080)
+    carga.add_argument('--solicitudes', type=int, default=20000)
+    carga.add_argument('--concurrencia', type=int, default=50)
+    carga.add_argument('--local', action='store_true',
+                       help='Levanta un servicio local con el archivo de rachas para la prueba')
+    
+    args = parser.parse_args()
+    
+    try:
+        if args.comando == 'servir':
+            asyncio.run(_servir(args.archivo, args.host, args.puerto, args.intervalo_recarga))
+            return
+        
+        proceso = _iniciar_servicio_local(ARCHIVO_RACHAS, args.puerto) if args.local else None
+        try:
+            resultado = asyncio.run(prueba_carga(
+                args.host, args.puerto, args.solicitudes, args.concurrencia
+            ))
+        finally:
+            if proceso:
+                proceso.terminate()
+                proceso.wait()
+        
+        print("RESULTADO DE LA PRUEBA DE CARGA")
+        for clave, valor in resultado.items():
+            print(f"  {clave}: {valor}")
+    
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error en el servicio de rachas: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -5,30 +5,78 @@ Maneja la conexión SQLite y carga de datos desde Excel
 """
 
 import sqlite3
+import sys
+import zlib
+import heapq
+import argparse
+import functools
+import numpy as np
 import pandas as pd
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# La raíz del proyecto se agrega al path para usar el cargador compartido
+# también cuando este archivo se ejecuta directamente como script
+RAIZ_PROYECTO = str(Path(__file__).resolve().parents[3])
+if RAIZ_PROYECTO not in sys.path:
+    sys.path.insert(0, RAIZ_PROYECTO)
+
+from cargador_excel import leer_libro, ESPECIFICACION_RACHAS
+from src.ejercicio3_rachas.python.trazador_sql import TrazadorSQL, ConexionTrazada
+
+# Orden global del resultado de rachas. Todas las claves son descendentes
+# (identificacion desempata) para que el orden sea total y los resultados de
+# varios fragmentos se puedan mezclar con heapq.merge(reverse=True)
+COLUMNAS_ORDEN = ['racha', 'fecha_fin', 'identificacion']
+
+def _operacion(nombre):
+    """Decorador: con trazador, atribuye las sentencias del método a la operación lógica 'nombre'"""
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            if self.trazador is None:
+                return metodo(self, *args, **kwargs)
+            with self.trazador.operacion(nombre):
+                return metodo(self, *args, **kwargs)
+        return envoltura
+    return decorador
 
 class DatabaseManager:
     """Manager para base de datos SQLite del análisis de rachas"""
     
-    def __init__(self, db_path='data/output/rachas.db'):
+    def __init__(self, db_path='data/output/rachas.db', trazador=None):
         """
         Inicializa el manager de base de datos
         
         Args:
             db_path (str): Ruta al archivo de base de datos SQLite
+            trazador (TrazadorSQL): Registra sentencias, tiempos y planes; None
+                usa una conexión sqlite3 sin instrumentar
         """
         self.db_path = db_path
         self.conn = None
+        self.trazador = trazador
         
         # Crear directorio si no existe
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
     
-    def connect(self):
-        """Establece conexión con la base de datos"""
+    @_operacion('conexion')
+    def connect(self, check_same_thread=True):
+        """
+        Establece conexión con la base de datos
+        
+        Args:
+            check_same_thread (bool): False permite usar la conexión desde otro
+                hilo (uno a la vez), como hace el modo fragmentado
+        """
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            if self.trazador is None:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
+            else:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread,
+                                            factory=ConexionTrazada)
+                self.conn.instalar(self.trazador)
             self.conn.execute("PRAGMA foreign_keys = ON")  # Habilitar foreign keys
             print(f"Conexión establecida con: {self.db_path}")
             return self.conn
@@ -42,6 +90,7 @@ class DatabaseManager:
             self.conn.close()
             print("Conexión cerrada")
     
+    @_operacion('esquema')
     def create_schema(self, schema_file='src/ejercicio3_rachas/sql/schema.sql'):
         """
         Crea el esquema de base de datos desde el archivo SQL
@@ -71,6 +120,7 @@ class DatabaseManager:
             print(f"Error creando esquema: {e}")
             raise
     
+    @_operacion('carga')
     def load_data_from_excel(self, excel_file='data/raw/Rachas.xlsx'):
         """
         Carga datos desde archivo Excel a las tablas
@@ -80,11 +130,27 @@ class DatabaseManager:
         """
         print(f"Cargando datos desde: {excel_file}")
         
+        try:
+            # Ambas hojas se extraen abriendo el libro una sola vez
+            hojas = leer_libro(excel_file, ESPECIFICACION_RACHAS)
+        except Exception as e:
+            print(f"Error cargando datos: {e}")
+            raise
+        
+        self.load_dataframes(hojas['historia'], hojas['retiros'])
+    
+    @_operacion('carga')
+    def load_dataframes(self, historia_df, retiros_df):
+        """
+        Inserta los DataFrames de historia y retiros en sus tablas
+        
+        Args:
+            historia_df (pd.DataFrame): identificacion, corte_mes y saldo
+            retiros_df (pd.DataFrame): identificacion y fecha_retiro
+        """
         try:
             # Cargar hoja historia
             print("Cargando datos de historia...")
-            historia_df = pd.read_excel(excel_file, sheet_name='historia')
-            historia_df['corte_mes'] = pd.to_datetime(historia_df['corte_mes'])
             
             # Insertar en tabla historia
             historia_df.to_sql('historia', self.conn, if_exists='append', index=False)
@@ -92,8 +158,6 @@ class DatabaseManager:
             
             # Cargar hoja retiros
             print("Cargando datos de retiros...")
-            retiros_df = pd.read_excel(excel_file, sheet_name='retiros')
-            retiros_df['fecha_retiro'] = pd.to_datetime(retiros_df['fecha_retiro'])
             
             # Insertar en tabla retiros
             retiros_df.to_sql('retiros', self.conn, if_exists='append', index=False)
@@ -107,9 +171,16 @@ class DatabaseManager:
             self.conn.rollback()
             raise
     
-    def generate_complete_series(self, fecha_base='2024-12-31'):
+    @_operacion('serie')
+    def generate_complete_series(self, fecha_base='2024-12-31', tabla_fechas='historia'):
         """
         Genera la serie temporal completa con interpolación de datos faltantes
+        
+        Args:
+            fecha_base (str): Último corte incluido
+            tabla_fechas (str): Tabla con la columna corte_mes de donde salen los
+                meses de la serie; un fragmento usa 'calendario', con los meses
+                de todos los fragmentos
         """
         print(f"Generando serie temporal completa hasta: {fecha_base}")
         
@@ -118,7 +189,7 @@ class DatabaseManager:
             query = f"""
             WITH fechas_unicas AS (
                 SELECT DISTINCT corte_mes 
-                FROM historia 
+                FROM {tabla_fechas} 
                 WHERE corte_mes <= '{fecha_base}'
             ),
             clientes_unicos AS (
@@ -176,6 +247,7 @@ class DatabaseManager:
             self.conn.rollback()
             raise
     
+    @_operacion('rachas')
     def execute_rachas_query(self, min_racha=3, fecha_base='2024-12-31'):
         """
         Ejecuta la consulta de rachas desde archivo SQL
@@ -224,6 +296,7 @@ class DatabaseManager:
             print(f"Error ejecutando consulta de rachas: {e}")
             raise
     
+    @_operacion('exportacion')
     def export_results_to_csv(self, output_file='data/output/rachas_sql_resultado.csv'):
         """
         Exporta los resultados a CSV
@@ -235,7 +308,7 @@ class DatabaseManager:
             query = """
             SELECT identificacion, racha, fecha_fin, nivel
             FROM rachas_resultado 
-            ORDER BY racha DESC, fecha_fin DESC
+            ORDER BY racha DESC, fecha_fin DESC, identificacion DESC
             """
             
             df = pd.read_sql_query(query, self.conn)
@@ -248,6 +321,7 @@ class DatabaseManager:
             print(f"Error exportando resultados: {e}")
             raise
     
+    @_operacion('estadisticas')
     def get_statistics(self):
         """Obtiene estadísticas del análisis"""
         try:
@@ -296,11 +370,282 @@ class DatabaseManager:
             print(f"Error obteniendo estadísticas: {e}")
             raise
 
+def fragmento_de(identificacion, fragmentos):
+    """Fragmento al que pertenece un cliente: crc32 de su identificación módulo N"""
+    return zlib.crc32(str(identificacion).encode('utf-8')) % fragmentos
+
+def _mezclar_ordenados(partes):
+    """
+    Mezcla resultados de rachas ya ordenados por COLUMNAS_ORDEN descendente
+    
+    Args:
+        partes (list): DataFrames de cada fragmento, cada uno ordenado
+    
+    Returns:
+        pd.DataFrame: Resultado global en el mismo orden que el modo de un archivo
+    """
+    no_vacias = [parte for parte in partes if not parte.empty]
+    if not no_vacias:
+        return partes[0]
+    
+    columnas = list(no_vacias[0].columns)
+    posiciones = [columnas.index(col) for col in COLUMNAS_ORDEN]
+    filas = heapq.merge(
+        *(parte.itertuples(index=False, name=None) for parte in no_vacias),
+        key=lambda fila: tuple(fila[i] for i in posiciones),
+        reverse=True
+    )
+    return pd.DataFrame(list(filas), columns=columnas)
+
+class ShardedDatabaseManager:
+    """
+    Reparte historia, retiros e historia_completa en N archivos SQLite según
+    el hash de la identificación y consulta todos los fragmentos en paralelo
+    
+    Cada cliente vive completo en un solo fragmento, así que la serie y la
+    mejor racha de cada cliente se calculan sin mirar los demás fragmentos.
+    Lo único global es el calendario de meses, que se copia a cada fragmento.
+    sqlite3 libera el GIL mientras ejecuta, de modo que un pool de hilos
+    alcanza para ocupar varios núcleos.
+    """
+    
+    def __init__(self, db_path='data/output/rachas.db', fragmentos=4, trazador=None):
+        """
+        Inicializa un DatabaseManager por fragmento
+        
+        Args:
+            db_path (str): Ruta base; el fragmento i usa <base>_fragmento<i>.db
+            fragmentos (int): Cantidad de archivos SQLite
+            trazador (TrazadorSQL): Trazador compartido por todos los fragmentos
+        """
+        if fragmentos < 1:
+            raise ValueError(f"La cantidad de fragmentos debe ser positiva: {fragmentos}")
+        
+        base, extension = os.path.splitext(db_path)
+        self.db_path = db_path
+        self.trazador = trazador
+        self.fragmentos = [
+            DatabaseManager(f'{base}_fragmento{i:02d}{extension}', trazador) for i in range(fragmentos)
+        ]
+        self.pool = None
+    
+    def _en_paralelo(self, funcion, *argumentos):
+        """
+        Aplica funcion(fragmento, *argumentos) a todos los fragmentos y devuelve
+        los resultados en orden; con trazador, los hilos heredan la operación en curso
+        """
+        if self.trazador is not None:
+            funcion = self.trazador.propagar(funcion)
+        return list(self.pool.map(funcion, self.fragmentos, *argumentos))
+    
+    @_operacion('conexion')
+    def connect(self):
+        """Conecta todos los fragmentos y crea el pool de hilos"""
+        self.pool = ThreadPoolExecutor(max_workers=len(self.fragmentos))
+        # Cada conexión la usa un único hilo a la vez, pero no siempre el mismo
+        for fragmento in self.fragmentos:
+            fragmento.connect(check_same_thread=False)
+        return [fragmento.conn for fragmento in self.fragmentos]
+    
+    def disconnect(self):
+        """Cierra las conexiones de los fragmentos y el pool"""
+        for fragmento in self.fragmentos:
+            fragmento.disconnect()
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+    
+    @_operacion('esquema')
+    def create_schema(self, schema_file='src/ejercicio3_rachas/sql/schema.sql'):
+        """Crea el esquema y la tabla de calendario en cada fragmento"""
+        def crear(fragmento):
+            fragmento.create_schema(schema_file)
+            fragmento.conn.executescript("""
+                DROP TABLE IF EXISTS calendario;
+                CREATE TABLE calendario (corte_mes DATE PRIMARY KEY);
+            """)
+        
+        self._en_paralelo(crear)
+    
+    @_operacion('carga')
+    def load_data_from_excel(self, excel_file='data/raw/Rachas.xlsx'):
+        """Lee el Excel una sola vez y reparte los clientes entre los fragmentos"""
+        print(f"Cargando datos desde: {excel_file}")
+        
+        try:
+            hojas = leer_libro(excel_file, ESPECIFICACION_RACHAS)
+        except Exception as e:
+            print(f"Error cargando datos: {e}")
+            raise
+        
+        self.load_dataframes(hojas['historia'], hojas['retiros'])
+    
+    @_operacion('carga')
+    def load_dataframes(self, historia_df, retiros_df):
+        """
+        Reparte historia y retiros por hash de la identificación y los inserta
+        
+        Args:
+            historia_df (pd.DataFrame): identificacion, corte_mes y saldo
+            retiros_df (pd.DataFrame): identificacion y fecha_retiro
+        """
+        asignacion_historia = self._asignar_fragmentos(historia_df['identificacion'])
+        asignacion_retiros = self._asignar_fragmentos(retiros_df['identificacion'])
+        
+        def cargar(fragmento, i):
+            fragmento.load_dataframes(
+                historia_df[asignacion_historia == i],
+                retiros_df[asignacion_retiros == i]
+            )
+        
+        self._en_paralelo(cargar, range(len(self.fragmentos)))
+        
+        # Meses de todos los fragmentos: un fragmento no ve los meses en que
+        # solo registraron saldo clientes de otros fragmentos
+        self._sincronizar_calendario()
+    
+    def _asignar_fragmentos(self, identificaciones):
+        """Fragmento de cada fila, hasheando cada identificación distinta una sola vez"""
+        codigos, unicos = pd.factorize(identificaciones)
+        por_cliente = np.array(
+            [fragmento_de(cliente, len(self.fragmentos)) for cliente in unicos], dtype='int64'
+        )
+        return por_cliente[codigos]
+    
+    def _sincronizar_calendario(self):
+        """Copia la unión de los meses de historia a la tabla calendario de cada fragmento"""
+        try:
+            meses = set()
+            for fragmento in self.fragmentos:
+                meses.update(fila[0] for fila in fragmento.conn.execute("SELECT DISTINCT corte_mes FROM historia"))
+            
+            for fragmento in self.fragmentos:
+                fragmento.conn.execute("DELETE FROM calendario")
+                fragmento.conn.executemany("INSERT INTO calendario (corte_mes) VALUES (?)",
+                                           [(mes,) for mes in sorted(meses)])
+                fragmento.conn.commit()
+            
+            print(f"Calendario global: {len(meses)} meses en {len(self.fragmentos)} fragmentos")
+        except Exception as e:
+            print(f"Error sincronizando calendario: {e}")
+            raise
+    
+    @_operacion('serie')
+    def generate_complete_series(self, fecha_base='2024-12-31'):
+        """Genera la serie completa de cada fragmento contra el calendario global"""
+        self._en_paralelo(lambda fragmento: fragmento.generate_complete_series(
+            fecha_base, tabla_fechas='calendario'))
+    
+    @_operacion('rachas')
+    def execute_rachas_query(self, min_racha=3, fecha_base='2024-12-31'):
+        """
+        Ejecuta la consulta de rachas en todos los fragmentos y mezcla los rankings
+        
+        Returns:
+            pd.DataFrame: Mismo resultado y orden que DatabaseManager.execute_rachas_query
+        """
+        partes = self._en_paralelo(lambda fragmento: fragmento.execute_rachas_query(min_racha, fecha_base))
+        resultado_df = _mezclar_ordenados(partes)
+        print(f"Rachas de {len(self.fragmentos)} fragmentos: {len(resultado_df)} clientes con rachas válidas")
+        return resultado_df
+    
+    @_operacion('exportacion')
+    def export_results_to_csv(self, output_file='data/output/rachas_sql_resultado.csv'):
+        """Exporta a CSV los resultados de todos los fragmentos en el orden global"""
+        try:
+            query = f"""
+            SELECT identificacion, racha, fecha_fin, nivel
+            FROM rachas_resultado
+            ORDER BY {', '.join(f'{col} DESC' for col in COLUMNAS_ORDEN)}
+            """
+            
+            partes = self._en_paralelo(lambda fragmento: pd.read_sql_query(query, fragmento.conn))
+            df = _mezclar_ordenados(partes)
+            df.to_csv(output_file, index=False)
+            
+            print(f"Resultados exportados a: {output_file}")
+            return df
+        
+        except Exception as e:
+            print(f"Error exportando resultados: {e}")
+            raise
+    
+    @_operacion('estadisticas')
+    def get_statistics(self):
+        """
+        Estadísticas del análisis combinadas entre fragmentos
+        
+        Los clientes no se repiten entre fragmentos, así que los conteos se
+        suman; el promedio se recalcula desde la suma entera de rachas.
+        """
+        try:
+            def parciales(fragmento):
+                cursor = fragmento.conn.cursor()
+                fila = {}
+                for clave, consulta in [
+                    ('total_registros_historia', "SELECT COUNT(*) FROM historia"),
+                    ('clientes_unicos', "SELECT COUNT(DISTINCT identificacion) FROM historia"),
+                    ('registros_serie_completa', "SELECT COUNT(*) FROM historia_completa"),
+                    ('clientes_con_rachas', "SELECT COUNT(*) FROM rachas_resultado")
+                ]:
+                    fila[clave] = cursor.execute(consulta).fetchone()[0]
+                fila['distribucion_niveles'] = dict(cursor.execute(
+                    "SELECT nivel, COUNT(*) FROM rachas_resultado GROUP BY nivel"
+                ).fetchall())
+                fila['suma_rachas'], fila['racha_minima'], fila['racha_maxima'] = cursor.execute(
+                    "SELECT SUM(racha), MIN(racha), MAX(racha) FROM rachas_resultado"
+                ).fetchone()
+                return fila
+            
+            partes = self._en_paralelo(parciales)
+            
+            stats = {
+                clave: sum(parte[clave] for parte in partes)
+                for clave in ['total_registros_historia', 'clientes_unicos',
+                              'registros_serie_completa', 'clientes_con_rachas']
+            }
+            
+            distribucion = {}
+            for parte in partes:
+                for nivel, cantidad in parte['distribucion_niveles'].items():
+                    distribucion[nivel] = distribucion.get(nivel, 0) + cantidad
+            stats['distribucion_niveles'] = dict(sorted(distribucion.items()))
+            
+            con_rachas = [parte for parte in partes if parte['suma_rachas'] is not None]
+            stats['racha_promedio'] = (
+                sum(parte['suma_rachas'] for parte in con_rachas) / stats['clientes_con_rachas']
+                if con_rachas else None
+            )
+            stats['racha_minima'] = min((parte['racha_minima'] for parte in con_rachas), default=None)
+            stats['racha_maxima'] = max((parte['racha_maxima'] for parte in con_rachas), default=None)
+            
+            return stats
+        
+        except Exception as e:
+            print(f"Error obteniendo estadísticas: {e}")
+            raise
+
+def crear_manager(db_path='data/output/rachas.db', fragmentos=1, trazador=None):
+    """DatabaseManager de un archivo, o ShardedDatabaseManager si fragmentos > 1"""
+    if fragmentos > 1:
+        return ShardedDatabaseManager(db_path, fragmentos, trazador)
+    return DatabaseManager(db_path, trazador)
+
 def main():
     """Función principal de prueba"""
+    parser = argparse.ArgumentParser(description='Configura la base SQLite del análisis de rachas')
+    parser.add_argument('--fragmentos', type=int, default=1,
+                        help='Cantidad de archivos SQLite por hash de identificación (1 = un solo archivo)')
+    parser.add_argument('--trazar', action='store_true',
+                        help='Registra tiempos por sentencia y operación, y las sentencias lentas con su plan')
+    parser.add_argument('--umbral-lento-ms', type=float, default=100,
+                        help='Duración desde la cual una sentencia va al log de lentas')
+    args = parser.parse_args()
+    trazador = TrazadorSQL(args.umbral_lento_ms) if args.trazar else None
+    
     try:
         # Crear instancia del manager
-        db_manager = DatabaseManager()
+        db_manager = crear_manager(fragmentos=args.fragmentos, trazador=trazador)
         
         # Conectar a la base de datos
         db_manager.connect()
@@ -327,6 +672,9 @@ def main():
         # Cerrar conexión
         db_manager.disconnect()
         
+        if trazador:
+            trazador.imprimir_resumen()
+        
     except Exception as e:
         print(f"Error en la configuración: {e}")
         import traceback
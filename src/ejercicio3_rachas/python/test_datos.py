@@ -3,10 +3,16 @@
 Exploración rápida de datos desde la carpeta principal
 """
 
+import sys
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+# La raíz del proyecto se agrega al path para usar el cargador compartido
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from cargador_excel import leer_libro, ESPECIFICACION_RACHAS
+
 def main():
     print("INICIANDO EXPLORACIÓN DE DATOS")
     print("="*50)
@@ -14,8 +20,9 @@ def main():
     try:
         # Leer archivo de rachas
         print("Cargando Rachas.xlsx...")
-        historia_df = pd.read_excel('data/raw/Rachas.xlsx', sheet_name='historia')
-        retiros_df = pd.read_excel('data/raw/Rachas.xlsx', sheet_name='retiros')
+        hojas = leer_libro('data/raw/Rachas.xlsx', ESPECIFICACION_RACHAS)
+        historia_df = hojas['historia']
+        retiros_df = hojas['retiros']
         
         print(f"Historia cargada: {historia_df.shape} filas, {historia_df.shape[1]} columnas")
         print(f"Retiros cargados: {retiros_df.shape} filas, {retiros_df.shape[1]} columnas")
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Trazado de SQL para DatabaseManager
+Instrumenta una conexión sqlite3 para registrar cada sentencia (texto con los
+literales redactados, duración y filas), acumular el tiempo por operación
+lógica y escribir las sentencias lentas con su EXPLAIN QUERY PLAN. Es opcional:
+sin trazador la conexión es un sqlite3.Connection normal
+"""
+
+import re
+import time
+import sqlite3
+import threading
+import functools
+import contextlib
+from datetime import datetime
+import os
+import pandas as pd
+
+ARCHIVO_LENTAS = 'data/output/logs/sql_lentas.log'
+
+# Instrucciones de la máquina virtual de SQLite entre llamadas al progress handler
+PASOS_PROGRESO = 1000
+
+COLUMNAS_REGISTRO = ['operacion', 'base', 'llamada', 'sql', 'parametros', 'duracion_ms',
+                     'filas', 'sentencias', 'pasos_vm']
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_ESPACIOS = re.compile(r'\s+')
+_COMENTARIO = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+
+def redactar_sql(sql):
+    """
+    Texto de una sentencia sin comentarios ni literales, en una sola línea
+    
+    Los literales de texto y numéricos pasan a '?' para que el log no exponga
+    datos de clientes y las sentencias con la misma forma compartan huella.
+    """
+    sql = _COMENTARIO.sub(' ', sql)
+    sql = _LITERAL_TEXTO.sub('?', sql)
+    sql = _LITERAL_NUMERO.sub('?', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+def describir_parametros(parametros, lotes=None):
+    """Cantidad y tipos de los parámetros ligados, sin sus valores"""
+    if not parametros:
+        descripcion = 'sin parámetros'
+    elif isinstance(parametros, dict):
+        descripcion = f"{len(parametros)} con nombre ({', '.join(sorted(parametros))})"
+    else:
+        descripcion = f"{len(parametros)} ({', '.join(type(valor).__name__ for valor in parametros)})"
+    return descripcion if lotes is None else f"{lotes} lotes x {descripcion}"
+
+class RegistroSQL:
+    """Una llamada a execute, executemany, executescript o commit"""
+    
+    __slots__ = ('operacion', 'base', 'llamada', 'sql', 'parametros', 'duracion',
+                 'filas', 'sentencias', 'pasos_vm', 'es_consulta', '_plan_sql',
+                 '_plan_parametros', '_cambios_iniciales')
+    
+    def __init__(self, operacion, base, llamada, sql, parametros, plan_sql, plan_parametros, cambios):
+        self.operacion = operacion
+        self.base = base
+        self.llamada = llamada
+        self.sql = sql
+        self.parametros = parametros
+        self.duracion = 0.0
+        self.filas = 0
+        self.sentencias = 0
+        self.pasos_vm = 0
+        self.es_consulta = False
+        self._plan_sql = plan_sql
+        self._plan_parametros = plan_parametros
+        self._cambios_iniciales = cambios
+    
+    def como_dict(self):
+        return {
+            'operacion': self.operacion,
+            'base': self.base,
+            'llamada': self.llamada,
+            'sql': self.sql,
+            'parametros': self.parametros,
+            'duracion_ms': self.duracion * 1000,
+            'filas': self.filas,
+            'sentencias': self.sentencias,
+            'pasos_vm': self.pasos_vm * PASOS_PROGRESO
+        }
+
+class _EstadoHilo(threading.local):
+    """Operación lógica en curso y su nivel de anidamiento, propios de cada hilo"""
+    
+    operacion = None
+    profundidad = 0
+
+class TrazadorSQL:
+    """
+    Colector de registros compartido por una o varias conexiones trazadas
+    
+    Es seguro entre hilos: el modo fragmentado usa el mismo trazador en todos
+    los fragmentos. La operación en curso es propia de cada hilo, así que dos
+    managers que comparten el trazador desde hilos distintos no se atribuyen
+    sentencias entre sí; un hilo de trabajo hereda la operación con propagar().
+    """
+    
+    def __init__(self, umbral_lento_ms=100, archivo_lentas=ARCHIVO_LENTAS):
+        """
+        Args:
+            umbral_lento_ms (float): Duración desde la cual una sentencia va al log de lentas
+            archivo_lentas (str): Log de sentencias lentas con su plan de ejecución
+        """
+        self.umbral_lento_ms = umbral_lento_ms
+        self.archivo_lentas = archivo_lentas
+        self.registros = []
+        self.tiempos_operacion = {}
+        self.lentas = 0
+        self._lock = threading.Lock()
+        self._estado = _EstadoHilo()
+    
+    @contextlib.contextmanager
+    def operacion(self, nombre):
+        """
+        Atribuye a 'nombre' las sentencias ejecutadas dentro del bloque y suma su tiempo
+        
+        Solo cuenta la operación más externa del hilo: en modo fragmentado los
+        métodos de cada fragmento corren dentro de la operación del manager
+        fragmentado (heredada con propagar) y no suman su tiempo otra vez.
+        """
+        estado = self._estado
+        if estado.profundidad:
+            estado.profundidad += 1
+            try:
+                yield
+            finally:
+                estado.profundidad -= 1
+            return
+        
+        estado.operacion, estado.profundidad = nombre, 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            estado.operacion, estado.profundidad = None, 0
+            with self._lock:
+                self.tiempos_operacion[nombre] = self.tiempos_operacion.get(nombre, 0.0) + duracion
+    
+    def propagar(self, funcion):
+        """
+        Envuelve funcion para que, ejecutada en otro hilo, sus sentencias se
+        atribuyan a la operación en curso en este hilo sin volver a sumar su tiempo
+        """
+        nombre = self._estado.operacion
+        if nombre is None:
+            return funcion
+        
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            estado = self._estado
+            previo = estado.operacion, estado.profundidad
+            estado.operacion, estado.profundidad = nombre, estado.profundidad + 1
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                estado.operacion, estado.profundidad = previo
+        return envoltura
+    
+    def _nuevo_registro(self, conexion, llamada, sql, parametros=(), lotes=None):
+        return RegistroSQL(
+            self._estado.operacion or 'sin_operacion',
+            conexion.ruta,
+            llamada,
+            redactar_sql(sql),
+            describir_parametros(parametros, lotes),
+            # executescript puede traer varias sentencias: no se explica su plan
+            None if llamada in ('executescript', 'commit') else sql,
+            parametros,
+            conexion.total_changes
+        )
+    
+    def _terminar(self, conexion, registro):
+        """Completa las filas afectadas, guarda el registro y escribe el log si fue lento"""
+        if not registro.es_consulta:
+            registro.filas = conexion.total_changes - registro._cambios_iniciales
+        
+        lenta = registro.duracion * 1000 >= self.umbral_lento_ms
+        plan = conexion.explicar(registro) if lenta else None
+        
+        with self._lock:
+            self.registros.append(registro)
+            if lenta:
+                self.lentas += 1
+                self._escribir_lenta(registro, plan)
+    
+    def _escribir_lenta(self, registro, plan):
+        os.makedirs(os.path.dirname(self.archivo_lentas) or '.', exist_ok=True)
+        with open(self.archivo_lentas, 'a', encoding='utf-8') as f:
+            f.write(f"[{datetime.now().isoformat(timespec='seconds')}] {registro.operacion} "
+                    f"{registro.duracion * 1000:.1f} ms, {registro.filas} filas, "
+                    f"{registro.llamada} en {registro.base}\n")
+            f.write(f"  sql: {registro.sql}\n")
+            f.write(f"  parametros: {registro.parametros}\n")
+            if plan:
+                f.write("  plan:\n")
+                f.writelines(f"    {linea}\n" for linea in plan)
+            f.write("\n")
+    
+    def resumen(self):
+        """
+        Tiempos y sentencias por operación lógica
+        
+        Returns:
+            pd.DataFrame: Una fila por operación con su tiempo total, el tiempo
+                dentro de SQLite, sentencias, filas y sentencias lentas
+        """
+        with self._lock:
+            registros = pd.DataFrame([registro.como_dict() for registro in self.registros],
+                                     columns=COLUMNAS_REGISTRO)
+            tiempos = dict(self.tiempos_operacion)
+        
+        registros['lenta'] = registros['duracion_ms'] >= self.umbral_lento_ms
+        por_operacion = registros.groupby('operacion').agg(
+            llamadas=('sql', 'size'),
+            segundos_sql=('duracion_ms', lambda ms: ms.sum() / 1000),
+            filas=('filas', 'sum'),
+            pasos_vm=('pasos_vm', 'sum'),
+            lentas=('lenta', 'sum')
+        )
+        resumen = pd.DataFrame({'segundos': pd.Series(tiempos, dtype='float64')}).join(por_operacion, how='outer')
+        return resumen.fillna(0).rename_axis('operacion').reset_index()
+    
+    def sentencias_costosas(self, n=10):
+        """Las n formas de sentencia con más tiempo acumulado"""
+        with self._lock:
+            registros = pd.DataFrame([registro.como_dict() for registro in self.registros],
+                                     columns=COLUMNAS_REGISTRO)
+        if registros.empty:
+            return registros
+        
+        return registros.groupby(['operacion', 'sql']).agg(
+            llamadas=('duracion_ms', 'size'),
+            duracion_ms=('duracion_ms', 'sum'),
+            filas=('filas', 'sum')
+        ).sort_values('duracion_ms', ascending=False).head(n).reset_index()
+    
+    def imprimir_resumen(self, n=5):
+        """Imprime los tiempos por operación y las sentencias más costosas"""
+        print("\nTRAZADO SQL POR OPERACIÓN:")
+        for _, fila in self.resumen().iterrows():
+            print(f"  {fila['operacion']}: {fila['segundos']:.3f} s total, "
+                  f"{fila['segundos_sql']:.3f} s en SQLite, {int(fila['llamadas'])} llamadas, "
+                  f"{int(fila['filas'])} filas, {int(fila['lentas'])} lentas")
+        
+        print(f"\nSENTENCIAS MÁS COSTOSAS (umbral lento: {self.umbral_lento_ms} ms):")
+        for _, fila in self.sentencias_costosas(n).iterrows():
+            print(f"  {fila['duracion_ms']:9.1f} ms  {fila['llamadas']:5d}x  [{fila['operacion']}] {fila['sql'][:100]}")
+        if self.lentas:
+            print(f"  Sentencias lentas con plan en: {self.archivo_lentas}")
+
+class ConexionTrazada(sqlite3.Connection):
+    """
+    Conexión que registra en un TrazadorSQL cada sentencia ejecutada
+    
+    Se crea con sqlite3.connect(..., factory=ConexionTrazada) y se activa con
+    instalar(). Los cursores que entrega registran la ejecución y la lectura
+    de filas; el trace callback cuenta las sentencias que SQLite ejecuta por
+    cada llamada (también las de un script y los BEGIN implícitos) y el
+    progress handler cuenta instrucciones de la máquina virtual.
+    """
+    
+    def __init__(self, ruta, *args, **kwargs):
+        super().__init__(ruta, *args, **kwargs)
+        self.ruta = str(ruta)
+        self.trazador = None
+        self._abierto = None
+        self._pausada = False
+    
+    def instalar(self, trazador):
+        """Activa el trazado de la conexión hacia el trazador dado"""
+        self.trazador = trazador
+        self.set_trace_callback(self._traza)
+        self.set_progress_handler(self._progreso, PASOS_PROGRESO)
+    
+    def _traza(self, _sentencia):
+        if self._abierto is not None and not self._pausada:
+            self._abierto.sentencias += 1
+    
+    def _progreso(self):
+        if self._abierto is not None and not self._pausada:
+            self._abierto.pasos_vm += 1
+        return 0
+    
+    def _iniciar(self, llamada, sql, parametros=(), lotes=None):
+        """Cierra el registro pendiente y abre uno nuevo para la llamada"""
+        self._cerrar_abierto()
+        self._abierto = self.trazador._nuevo_registro(self, llamada, sql, parametros, lotes)
+        return self._abierto
+    
+    def _cerrar_abierto(self, registro=None):
+        """
+        Termina el registro abierto (o solo 'registro' si es el abierto)
+        
+        Una consulta queda abierta mientras se leen sus filas; se cierra al
+        agotarlas o al empezar otra llamada en la conexión.
+        """
+        if self._abierto is None or (registro is not None and registro is not self._abierto):
+            return
+        terminado, self._abierto = self._abierto, None
+        self.trazador._terminar(self, terminado)
+    
+    def explicar(self, registro):
+        """Líneas del EXPLAIN QUERY PLAN de la sentencia de un registro; [] si no aplica"""
+        if registro._plan_sql is None:
+            return []
+        
+        self._pausada = True
+        try:
+            filas = sqlite3.Cursor(self).execute(
+                'EXPLAIN QUERY PLAN ' + registro._plan_sql, registro._plan_parametros
+            ).fetchall()
+        except sqlite3.Error as e:
+            return [f"(sin plan: {e})"]
+        finally:
+            self._pausada = False
+        
+        profundidad = {0: -1}
+        lineas = []
+        for id_nodo, padre, _, detalle in filas:
+            profundidad[id_nodo] = profundidad.get(padre, -1) + 1
+            lineas.append('  ' * profundidad[id_nodo] + detalle)
+        return lineas
+    
+    def cursor(self, factory=None):
+        if self.trazador is None:
+            return super().cursor() if factory is None else super().cursor(factory)
+        return super().cursor(factory or CursorTrazado)
+    
+    # Los atajos de sqlite3.Connection crean su cursor internamente sin pasar
+    # por cursor(), así que se redirigen al cursor trazado
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+    
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+    
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+    
+    def commit(self):
+        if self.trazador is None:
+            return super().commit()
+        registro = self._iniciar('commit', 'COMMIT')
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            registro.duracion += time.perf_counter() - inicio
+            self._cerrar_abierto(registro)
+    
+    def rollback(self):
+        if self.trazador is not None:
+            self._cerrar_abierto()
+        return super().rollback()
+    
+    def close(self):
+        if self.trazador is not None:
+            self._cerrar_abierto()
+        return super().close()
+
+class CursorTrazado(sqlite3.Cursor):
+    """Cursor que mide la ejecución y la lectura de filas de cada llamada"""
+    
+    _registro = None
+    
+    def _ejecutar(self, metodo, llamada, sql, *argumentos, parametros=(), lotes=None):
+        registro = self.connection._iniciar(llamada, sql, parametros, lotes)
+        self._registro = registro
+        inicio = time.perf_counter()
+        try:
+            metodo(self, sql, *argumentos)
+        except Exception:
+            registro.duracion += time.perf_counter() - inicio
+            self.connection._cerrar_abierto(registro)
+            raise
+        registro.duracion += time.perf_counter() - inicio
+        
+        # Una consulta sigue abierta hasta leer sus filas: SQLite hace la
+        # mayor parte del trabajo de un SELECT durante el fetch
+        registro.es_consulta = self.description is not None
+        if not registro.es_consulta:
+            self.connection._cerrar_abierto(registro)
+        return self
+    
+    def execute(self, sql, parametros=()):
+        return self._ejecutar(sqlite3.Cursor.execute, 'execute', sql, parametros, parametros=parametros)
+    
+    def executemany(self, sql, parametros):
+        if not isinstance(parametros, (list, tuple)):
+            parametros = list(parametros)
+        return self._ejecutar(sqlite3.Cursor.executemany, 'executemany', sql, parametros,
+                              parametros=parametros[0] if parametros else (), lotes=len(parametros))
+    
+    def executescript(self, script):
+        return self._ejecutar(sqlite3.Cursor.executescript, 'executescript', script)
+    
+    def _leer(self, metodo, *argumentos):
+        """Ejecuta un fetch sumando su tiempo y filas al registro de la consulta"""
+        registro = self._registro
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, *argumentos)
+        finally:
+            if registro is not None:
+                registro.duracion += time.perf_counter() - inicio
+    
+    def _agotado(self):
+        if self._registro is not None:
+            self.connection._cerrar_abierto(self._registro)
+            self._registro = None
+    
+    def fetchone(self):
+        fila = self._leer(sqlite3.Cursor.fetchone)
+        if fila is None:
+            self._agotado()
+        elif self._registro is not None:
+            self._registro.filas += 1
+        return fila
+    
+    def fetchmany(self, size=None):
+        tamano = self.arraysize if size is None else size
+        filas = self._leer(sqlite3.Cursor.fetchmany, tamano)
+        if self._registro is not None:
+            self._registro.filas += len(filas)
+        if len(filas) < tamano:
+            self._agotado()
+        return filas
+    
+    def fetchall(self):
+        filas = self._leer(sqlite3.Cursor.fetchall)
+        if self._registro is not None:
+            self._registro.filas += len(filas)
+        self._agotado()
+        return filas
+    
+    def __next__(self):
+        try:
+            fila = self._leer(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._agotado()
+            raise
+        if self._registro is not None:
+            self._registro.filas += 1
+        return fila
+    
+    def close(self):
+        self._agotado()
+        return super().close()
@@ -74,4 +74,4 @@ SELECT
     nivel
 FROM ranking_rachas
 WHERE ranking = 1
-ORDER BY racha DESC, fecha_fin DESC;
\ No newline at end of file
+ORDER BY racha DESC, fecha_fin DESC, identificacion DESC;
\ No newline at end of file
@@ -0,0 +1,12 @@
+"""
+Configuración de pytest
+Agrega la raíz del proyecto al path, como hacen los scripts de src/, para
+importar los módulos de la carpeta principal
+"""
+
+import sys
+from pathlib import Path
+
+RAIZ_PROYECTO = Path(__file__).resolve().parents[1]
+if str(RAIZ_PROYECTO) not in sys.path:
+    sys.path.insert(0, str(RAIZ_PROYECTO))
@@ -0,0 +1,44 @@
+"""
+Pruebas del almacén columnar de CalculadorRachas
+"""
+
+import pandas as pd
+import pytest
+
+from conftest import RAIZ_PROYECTO
+from calculador_rachas import CalculadorRachas
+
+ARCHIVO_RACHAS = str(RAIZ_PROYECTO / 'data' / 'raw' / 'Rachas.xlsx')
+
+@pytest.fixture(scope='module')
+def calculador():
+    calculador = CalculadorRachas()
+    calculador.cargar_datos(ARCHIVO_RACHAS)
+    calculador.generar_serie_temporal_completa()
+    return calculador
+
+def test_transiciones_desde_almacen_en_calculador_nuevo(calculador, tmp_path):
+    esperadas = calculador.calcular_transiciones()
+    calculador.guardar_almacen(str(tmp_path))
+    
+    # Solo el almacén: sin cargar_datos ni serie en memoria
+    reabierto = CalculadorRachas()
+    reabierto.abrir_almacen(str(tmp_path))
+    obtenidas = reabierto.calcular_transiciones()
+    
+    assert reabierto.serie_completa_df is None
+    pd.testing.assert_frame_equal(obtenidas['mensual'], esperadas['mensual'])
+    pd.testing.assert_frame_equal(obtenidas['acumulada'], esperadas['acumulada'])
+    assert obtenidas['acumulada'][CalculadorRachas.ESTADO_RETIRO].sum() > 0
+
+def test_retiros_y_rachas_desde_almacen(calculador, tmp_path):
+    calculador.guardar_almacen(str(tmp_path))
+    
+    reabierto = CalculadorRachas()
+    reabierto.abrir_almacen(str(tmp_path))
+    
+    pd.testing.assert_frame_equal(
+        reabierto.retiros_df,
+        calculador.retiros_df[['identificacion', 'fecha_retiro']].reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(reabierto.calcular_todas_rachas(), calculador.calcular_todas_rachas())
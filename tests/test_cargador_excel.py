@@ -0,0 +1,49 @@
+"""
+Pruebas de aplicar_tipos en cargador_excel
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cargador_excel import aplicar_tipos, ESPECIFICACION_PROVISIONES, ESPECIFICACION_RACHAS
+
+def test_montos_decimales_se_conservan():
+    df = pd.DataFrame({'fecha_analisis': [202301, 202302], 'saldo': [1500.75, 20]})
+    
+    tipado = aplicar_tipos(df, {'fecha_analisis': 'entero', 'saldo': 'decimal'}, 'Prov')
+    
+    assert tipado['saldo'].dtype == 'float64'
+    assert tipado['saldo'].tolist() == [1500.75, 20.0]
+    assert tipado['fecha_analisis'].dtype == 'int64'
+
+def test_montos_declarados_como_decimal():
+    assert ESPECIFICACION_RACHAS['historia']['saldo'] == 'decimal'
+    prov = ESPECIFICACION_PROVISIONES['Prov']
+    assert all(prov[col] == 'decimal' for col in prov if col not in ('fecha_analisis', 'alianza', 'producto'))
+
+def test_entero_con_decimales_se_rechaza():
+    df = pd.DataFrame({'fecha_analisis': [202301, 202302.5]})
+    with pytest.raises(ValueError, match=r"'fecha_analisis' de la hoja 'Prov'.*1 valores con decimales"):
+        aplicar_tipos(df, {'fecha_analisis': 'entero'}, 'Prov')
+
+def test_entero_con_nulos_queda_float():
+    df = pd.DataFrame({'fecha_analisis': [202301.0, np.nan]})
+    
+    tipado = aplicar_tipos(df, {'fecha_analisis': 'entero'}, 'Prov')
+    
+    assert tipado['fecha_analisis'].dtype == 'float64'
+    assert tipado['fecha_analisis'].iloc[0] == 202301
+
+def test_fechas_desde_serial_y_texto_como_str():
+    df = pd.DataFrame({'corte_mes': [45292, 45323], 'identificacion': pd.Series([123, None], dtype=object)})
+    
+    tipado = aplicar_tipos(df, {'corte_mes': 'fecha', 'identificacion': 'texto'}, 'historia')
+    
+    assert tipado['corte_mes'].tolist() == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')]
+    assert tipado['identificacion'].iloc[0] == '123'
+    assert pd.isna(tipado['identificacion'].iloc[1])
+
+def test_columna_faltante():
+    with pytest.raises(ValueError, match='Columnas faltantes'):
+        aplicar_tipos(pd.DataFrame({'a': [1]}), {'b': 'entero'}, 'Prov')
@@ -0,0 +1,19 @@
+"""
+Pruebas de la huella de etapas de ejecutar_pipeline
+"""
+
+from ejecutar_pipeline import calcular_huella
+
+def _etapa_a(valor):
+    return valor
+
+def _etapa_b(valor):
+    return valor + 1
+
+def _definicion(funcion):
+    return {'funcion': funcion, 'depende_de': [], 'entradas': [], 'codigo': [], 'parametros': {'valor': 1}}
+
+def test_huella_depende_de_la_funcion_de_la_etapa():
+    huella_a = calcular_huella('etapa', _definicion(_etapa_a), {})
+    assert huella_a == calcular_huella('etapa', _definicion(_etapa_a), {})
+    assert huella_a != calcular_huella('etapa', _definicion(_etapa_b), {})
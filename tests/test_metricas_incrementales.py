@@ -0,0 +1,66 @@
+"""
+Pruebas de PowerBIDataPreparator.calculate_metrics_incremental
+"""
+
+import pandas as pd
+import pytest
+
+from conftest import RAIZ_PROYECTO
+from preparar_datos_powerbi import PowerBIDataPreparator
+
+ARCHIVO_PROVISIONES = str(RAIZ_PROYECTO / 'data' / 'raw' / 'Provisiones.xlsx')
+
+@pytest.fixture(scope='module')
+def datos():
+    preparador = PowerBIDataPreparator()
+    preparador.load_provisiones_data(ARCHIVO_PROVISIONES)
+    prov = preparador.prov_df
+    cond = preparador.cond_recu_df
+    
+    # El último mes trae además un par (alianza, producto) que no existía
+    ultimo = prov['fecha_analisis'].max()
+    par_nuevo = prov[prov['fecha_analisis'] == ultimo].head(1).assign(alianza='NUEVA', producto='NUEVO')
+    prov = pd.concat([prov, par_nuevo], ignore_index=True)
+    cond_nueva = cond[cond['fecha_analisis'] == cond['fecha_analisis'].max()].head(1)
+    cond = pd.concat([cond, cond_nueva.assign(alianza='NUEVA', producto='NUEVO')], ignore_index=True)
+    return prov, cond, ultimo
+
+def _preparador(prov, cond):
+    preparador = PowerBIDataPreparator()
+    preparador.prov_df = prov
+    preparador.cond_recu_df = cond
+    return preparador
+
+@pytest.mark.parametrize('esquema', ['plano', 'estrella'])
+@pytest.mark.parametrize('modo', ['csv', 'excel'])
+def test_incremental_igual_a_recalculo_completo(datos, tmp_path, modo, esquema):
+    prov, cond, ultimo = datos
+    meses_cond = PowerBIDataPreparator._to_month_key(cond['fecha_analisis'])
+    
+    # Exportación de los meses 1..N-1
+    previo = _preparador(prov[prov['fecha_analisis'] < ultimo], cond[meses_cond < ultimo])
+    previo.calculate_metrics()
+    salida = str(tmp_path / 'provisiones_powerbi.xlsx')
+    previo.export_for_powerbi(salida, modo=modo, esquema=esquema)
+    exportado = str(tmp_path / 'provisiones_powerbi') if modo == 'csv' else salida
+    
+    incremental = _preparador(prov, cond)
+    nuevos = incremental.calculate_metrics_incremental(exportado)
+    
+    completo = _preparador(prov, cond)
+    completo.calculate_metrics()
+    
+    assert set(nuevos['fecha_analisis']) == {ultimo}
+    assert ('NUEVA', 'NUEVO') in set(zip(nuevos['alianza'], nuevos['producto']))
+    
+    obtenido = incremental.dataset_final
+    esperado = completo.dataset_final[obtenido.columns].reset_index(drop=True)
+    assert 'gasto_provision_neto_12m' in obtenido.columns
+    assert 'var_mensual_prov_k_ifrs' in obtenido.columns
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_categorical=False)
+
+def test_exportacion_sin_hojas_conocidas(tmp_path):
+    (tmp_path / 'vacia').mkdir()
+    (tmp_path / 'vacia' / 'Resumen_Alianza.csv').write_text('alianza\nA\n')
+    with pytest.raises(ValueError, match='Datos_Principales'):
+        PowerBIDataPreparator().load_previous_export(str(tmp_path / 'vacia'))
@@ -0,0 +1,47 @@
+"""
+Pruebas del reparto por mes de PowerBIDataPreparator.process_chunked
+"""
+
+import os
+
+import openpyxl
+import pandas as pd
+
+from preparar_datos_powerbi import PowerBIDataPreparator
+
+COLUMNAS_PROV = ['fecha_analisis', 'alianza', 'producto', 'prov_k_ifrs', 'prov_t_ifrs',
+                 'sald_30mas', 'sald_k_ifrs', 'sald_t_ifrs', 'saldo_castigo', 'saldo_castigo_t']
+COLUMNAS_COND = ['fecha_analisis', 'alianza', 'producto', 'condonaciones', 'recuperaciones']
+
+def _libro(ruta, filas_prov):
+    libro = openpyxl.Workbook()
+    prov = libro.active
+    prov.title = 'Prov'
+    prov.append(COLUMNAS_PROV)
+    for fila in filas_prov:
+        prov.append(fila)
+    cond = libro.create_sheet('cond y recu')
+    cond.append(COLUMNAS_COND)
+    cond.append([pd.Timestamp('2023-01-01').to_pydatetime(), 'A', 'VISA', 10, 20])
+    libro.save(ruta)
+    return str(ruta)
+
+def test_mes_nulo_se_descarta_y_la_llave_queda_entera(tmp_path, capsys):
+    filas = [
+        [202301, 'A', 'VISA', 1, 2, 3, 4, 5, 6, 7],
+        [None, 'A', 'VISA', 1, 2, 3, 4, 5, 6, 7],
+        [202302, 'A', 'VISA', 1, 2, 3, 4, 5, 6, 7],
+        [202302, 'B', 'VISA', 1, 2, 3, 4, 5, 6, 7],
+    ]
+    archivo = _libro(tmp_path / 'provisiones.xlsx', filas)
+    directorio = tmp_path / 'meses'
+    directorio.mkdir()
+    
+    meses = PowerBIDataPreparator()._spill_by_month(archivo, str(directorio), filas_por_bloque=2)
+    
+    assert meses == [202301, 202302]
+    archivos_prov = sorted(f for f in os.listdir(directorio) if f.startswith('prov_'))
+    assert archivos_prov == ['prov_202301.csv', 'prov_202302.csv']
+    filas_escritas = sum(len(pd.read_csv(directorio / f)) for f in archivos_prov)
+    assert filas_escritas == 3
+    assert '1 registros de provisiones sin fecha_analisis descartados' in capsys.readouterr().out
@@ -0,0 +1,59 @@
+"""
+Pruebas de PerfiladorCalidad contra valores calculados a mano
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import RAIZ_PROYECTO
+from perfilador_calidad import PerfiladorCalidad
+from preparar_datos_powerbi import PowerBIDataPreparator
+
+ARCHIVO_PROVISIONES = str(RAIZ_PROYECTO / 'data' / 'raw' / 'Provisiones.xlsx')
+
+def _dataset():
+    # Las filas 1 y 3 son idénticas; la clave k se repite solo en ellas
+    return pd.DataFrame({
+        'a': [1.0, 2.0, np.nan, 2.0, 5.0],
+        'b': ['x', 'y', 'y', 'y', None],
+        'k': [1, 2, 3, 2, 5]
+    })
+
+def test_completitud_unicidad_y_rangos():
+    reporte = PerfiladorCalidad().perfilar(
+        _dataset(), 'prueba', claves=['k'], reglas_rango={'a': (0, 2), 'k': (2, None)}
+    )
+    
+    completitud = reporte['completitud']
+    assert completitud['completitud_por_columna'] == {'a': 80.0, 'b': 80.0, 'k': 100.0}
+    assert completitud['completitud_general'] == pytest.approx((1 - 2 / 15) * 100)
+    assert completitud['patrones_nulos'] == [
+        {'columnas_nulas': ['a'], 'registros': 1},
+        {'columnas_nulas': ['b'], 'registros': 1}
+    ]
+    
+    unicidad = reporte['unicidad']
+    assert unicidad['registros_duplicados'] == 1
+    assert unicidad['duplicados_por_clave'] == 1
+    assert unicidad['unicidad'] == pytest.approx(80.0)
+    
+    # a: solo 5 supera 2 (el nulo no se evalúa); k: solo 1 queda bajo 2
+    consistencia = reporte['consistencia']
+    assert consistencia['fuera_de_rango'] == {'a': 1, 'k': 1}
+    assert consistencia['consistencia'] == pytest.approx((1 - 2 / 10) * 100)
+    assert consistencia['rangos']['a'] == {'min': 1.0, 'max': 5.0}
+    assert reporte['columnas']['b']['cardinalidad'] == 2
+
+def test_regla_de_rango_sobre_texto_se_rechaza():
+    with pytest.raises(ValueError, match="no numéricas"):
+        PerfiladorCalidad().perfilar(pd.DataFrame({'a': ['x', 'y']}), reglas_rango={'a': (0, 1)})
+
+def test_muestra_max_desde_la_carga():
+    preparador = PowerBIDataPreparator()
+    preparador.load_provisiones_data(ARCHIVO_PROVISIONES, muestra_max=100)
+    
+    reporte = preparador.reporte_calidad['Prov']
+    assert reporte['aproximado']
+    assert reporte['registros'] == len(preparador.prov_df)
+    assert reporte['registros_perfilados'] == 100
@@ -0,0 +1,45 @@
+"""
+Pruebas de la censura de rachas en CalculadorRachas
+"""
+
+import pandas as pd
+
+from calculador_rachas import CalculadorRachas
+
+def _calculador(historia, retiros):
+    calculador = CalculadorRachas(fecha_base='2024-03-31')
+    calculador.historia_df = pd.DataFrame(historia, columns=['identificacion', 'corte_mes', 'saldo'])
+    calculador.historia_df['corte_mes'] = pd.to_datetime(calculador.historia_df['corte_mes'])
+    calculador.retiros_df = pd.DataFrame(retiros, columns=['identificacion', 'fecha_retiro'])
+    calculador.retiros_df['fecha_retiro'] = pd.to_datetime(calculador.retiros_df['fecha_retiro'])
+    calculador.construir_indice_clientes()
+    calculador.generar_serie_temporal_completa()
+    return calculador
+
+def _ultima_racha(rachas, identificacion):
+    return rachas[rachas['identificacion'] == identificacion].sort_values('fecha_fin').iloc[-1]
+
+def test_retiro_en_ultimo_mes_no_censura():
+    meses = ['2024-01-31', '2024-02-29', '2024-03-31']
+    historia = [(cliente, mes, 100000) for cliente in ('ACTIVO', 'RETIRADO') for mes in meses]
+    calculador = _calculador(historia, [('RETIRADO', '2024-03-31')])
+    
+    rachas = calculador.calcular_todas_rachas()
+    
+    activo = _ultima_racha(rachas, 'ACTIVO')
+    retirado = _ultima_racha(rachas, 'RETIRADO')
+    assert activo['fecha_fin'] == pd.Timestamp('2024-03-31')
+    assert bool(activo['censurada'])
+    assert retirado['fecha_fin'] == pd.Timestamp('2024-03-31')
+    assert not bool(retirado['censurada'])
+
+def test_censura_sin_indice_usa_retiros_df():
+    meses = ['2024-01-31', '2024-02-29', '2024-03-31']
+    historia = [(cliente, mes, 100000) for cliente in ('ACTIVO', 'RETIRADO') for mes in meses]
+    calculador = _calculador(historia, [('RETIRADO', '2024-03-31')])
+    calculador.indice_clientes = None
+    
+    rachas = calculador.calcular_todas_rachas()
+    
+    assert bool(_ultima_racha(rachas, 'ACTIVO')['censurada'])
+    assert not bool(_ultima_racha(rachas, 'RETIRADO')['censurada'])
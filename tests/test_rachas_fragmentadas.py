@@ -0,0 +1,68 @@
+"""
+Pruebas de equivalencia entre DatabaseManager y ShardedDatabaseManager
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import RAIZ_PROYECTO
+from src.ejercicio3_rachas.python.database_manager import DatabaseManager, ShardedDatabaseManager
+
+ARCHIVO_ESQUEMA = str(RAIZ_PROYECTO / 'src' / 'ejercicio3_rachas' / 'sql' / 'schema.sql')
+FECHA_BASE = '2024-12-31'
+
+def _datos_con_empates(clientes=60, meses=18, semilla=7):
+    """
+    Historia sintética con pocos patrones de saldo repetidos entre clientes,
+    para que muchas rachas empaten en racha y fecha_fin
+    """
+    rng = np.random.default_rng(semilla)
+    cortes = pd.date_range('2023-07-31', periods=meses, freq='ME')
+    saldos_nivel = [100000, 500000, 2000000, 4000000, 6000000]
+    patrones = [rng.choice(saldos_nivel, size=meses // 3).repeat(3) for _ in range(4)]
+    
+    filas = []
+    for i in range(clientes):
+        patron = patrones[i % len(patrones)]
+        # Algunos clientes tienen meses faltantes, que la serie completa rellena
+        for corte, saldo in zip(cortes, patron):
+            if i % 7 == 0 and corte.month == 3:
+                continue
+            filas.append((f'C{i:03d}', corte, float(saldo)))
+    historia = pd.DataFrame(filas, columns=['identificacion', 'corte_mes', 'saldo'])
+    retiros = pd.DataFrame({
+        'identificacion': [f'C{i:03d}' for i in range(0, clientes, 5)],
+        'fecha_retiro': pd.Timestamp('2024-09-30')
+    })
+    return historia, retiros
+
+def _ejecutar(manager, historia, retiros, salida):
+    manager.connect()
+    try:
+        manager.create_schema(ARCHIVO_ESQUEMA)
+        manager.load_dataframes(historia, retiros)
+        manager.generate_complete_series(FECHA_BASE)
+        resultado = manager.execute_rachas_query(3, FECHA_BASE)
+        manager.export_results_to_csv(str(salida))
+        return resultado, manager.get_statistics()
+    finally:
+        manager.disconnect()
+
+@pytest.mark.parametrize('fragmentos', [2, 3, 4])
+def test_fragmentado_igual_a_archivo_unico(tmp_path, fragmentos):
+    historia, retiros = _datos_con_empates()
+    
+    esperado, estadisticas = _ejecutar(
+        DatabaseManager(str(tmp_path / 'unico.db')), historia, retiros, tmp_path / 'unico.csv'
+    )
+    obtenido, estadisticas_fragmentos = _ejecutar(
+        ShardedDatabaseManager(str(tmp_path / 'rachas.db'), fragmentos),
+        historia, retiros, tmp_path / 'fragmentado.csv'
+    )
+    
+    # Los datos deben producir empates para que el orden de desempate importe
+    assert esperado.duplicated(['racha', 'fecha_fin']).any()
+    pd.testing.assert_frame_equal(esperado, obtenido)
+    assert estadisticas == estadisticas_fragmentos
+    assert (tmp_path / 'unico.csv').read_text() == (tmp_path / 'fragmentado.csv').read_text()
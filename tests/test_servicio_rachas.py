@@ -0,0 +1,40 @@
+"""
+Pruebas de la validación de Content-Length en ServicioRachas
+"""
+
+import asyncio
+
+import pytest
+
+from conftest import RAIZ_PROYECTO
+from servicio_rachas import MAX_CUERPO, ServicioRachas
+
+ARCHIVO_RACHAS = str(RAIZ_PROYECTO / 'data' / 'output' / 'rachas_resultado.csv')
+
+async def _solicitar(cabecera_longitud, cuerpo=b''):
+    servicio = ServicioRachas(ARCHIVO_RACHAS, intervalo_recarga=60)
+    puerto = await servicio.iniciar(puerto=0)
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', puerto)
+        writer.write(
+            b'POST /rachas/lote HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+            + b'Content-Length: ' + cabecera_longitud.encode() + b'\r\n\r\n' + cuerpo
+        )
+        await writer.drain()
+        respuesta = await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+        return int(respuesta.split(b' ', 2)[1])
+    finally:
+        await servicio.detener()
+
+@pytest.mark.parametrize('cabecera_longitud, estado', [
+    ('abc', 400),
+    ('-5', 413),
+    (str(MAX_CUERPO + 1), 413),
+])
+def test_content_length_invalido(cabecera_longitud, estado):
+    assert asyncio.run(_solicitar(cabecera_longitud)) == estado
+
+def test_content_length_valido():
+    cuerpo = b'{"identificaciones": []}'
+    assert asyncio.run(_solicitar(str(len(cuerpo)), cuerpo)) == 200
@@ -0,0 +1,115 @@
+"""
+Pruebas de TrazadorSQL: redacción, tiempos y atribución por operación
+"""
+
+import sqlite3
+import threading
+
+import pandas as pd
+
+from conftest import RAIZ_PROYECTO
+from src.ejercicio3_rachas.python.trazador_sql import TrazadorSQL, ConexionTrazada, redactar_sql
+from src.ejercicio3_rachas.python.database_manager import DatabaseManager, ShardedDatabaseManager
+
+ARCHIVO_ESQUEMA = str(RAIZ_PROYECTO / 'src' / 'ejercicio3_rachas' / 'sql' / 'schema.sql')
+
+def _datos():
+    cortes = pd.date_range('2024-01-31', periods=6, freq='ME')
+    historia = pd.DataFrame(
+        [(f'C{i}', corte, 500000.0 * (i + 1)) for i in range(8) for corte in cortes],
+        columns=['identificacion', 'corte_mes', 'saldo']
+    )
+    retiros = pd.DataFrame({'identificacion': ['C0'], 'fecha_retiro': [pd.Timestamp('2024-05-31')]})
+    return historia, retiros
+
+def test_redactar_sql_quita_literales_y_comentarios():
+    sql = """
+        SELECT t1.col2, 'x' AS etiqueta  -- cliente 'ABC123'
+        FROM tabla_3 t1 /* saldo 99 */
+        WHERE identificacion = 'O''Brien' AND saldo > 1500.5 AND nivel IN (1, 2)
+    """
+    assert redactar_sql(sql) == (
+        "SELECT t1.col2, ? AS etiqueta FROM tabla_3 t1 "
+        "WHERE identificacion = ? AND saldo > ? AND nivel IN (?, ?)"
+    )
+
+def test_operaciones_atribuyen_sentencias_y_tiempo(tmp_path):
+    trazador = TrazadorSQL(umbral_lento_ms=10 ** 6, archivo_lentas=str(tmp_path / 'lentas.log'))
+    historia, retiros = _datos()
+    manager = DatabaseManager(str(tmp_path / 'rachas.db'), trazador)
+    manager.connect()
+    try:
+        manager.create_schema(ARCHIVO_ESQUEMA)
+        manager.load_dataframes(historia, retiros)
+        manager.generate_complete_series('2024-12-31')
+        manager.execute_rachas_query(3, '2024-12-31')
+    finally:
+        manager.disconnect()
+    
+    resumen = trazador.resumen().set_index('operacion')
+    assert {'conexion', 'esquema', 'carga', 'serie', 'rachas'} <= set(resumen.index)
+    assert 'sin_operacion' not in resumen.index
+    assert (resumen.loc[['esquema', 'carga', 'serie', 'rachas'], 'llamadas'] > 0).all()
+    # El tiempo de la operación incluye el que pasa dentro de SQLite
+    assert (resumen['segundos'] >= resumen['segundos_sql']).all()
+    
+    carga = [registro for registro in trazador.registros if registro.operacion == 'carga']
+    assert sum(registro.filas for registro in carga) >= len(historia) + len(retiros)
+    # Ningún valor de los datos llega al texto registrado
+    assert not any('C0' in registro.sql or '500000' in registro.sql for registro in trazador.registros)
+
+def test_operacion_es_propia_de_cada_hilo(tmp_path):
+    trazador = TrazadorSQL(archivo_lentas=str(tmp_path / 'lentas.log'))
+    dentro, ejecutado, b_termino = (threading.Barrier(2) for _ in range(3))
+    errores = []
+    
+    def trabajar(nombre):
+        try:
+            conexion = sqlite3.connect(str(tmp_path / f'{nombre}.db'), factory=ConexionTrazada)
+            conexion.instalar(trazador)
+            with trazador.operacion(nombre):
+                dentro.wait()
+                conexion.execute('SELECT 1').fetchall()
+                ejecutado.wait()
+                if nombre == 'a':
+                    # b ya cerró su operación: a debe conservar la suya
+                    b_termino.wait()
+                    conexion.execute('SELECT 2').fetchall()
+            if nombre == 'b':
+                b_termino.wait()
+            conexion.close()
+        except Exception as e:
+            errores.append(e)
+    
+    hilos = [threading.Thread(target=trabajar, args=(nombre,)) for nombre in 'ab']
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    
+    assert not errores
+    por_base = {}
+    for registro in trazador.registros:
+        por_base.setdefault(registro.base.rsplit('/', 1)[-1], set()).add(registro.operacion)
+    assert por_base == {'a.db': {'a'}, 'b.db': {'b'}}
+    assert len([registro for registro in trazador.registros if registro.base.endswith('a.db')]) == 2
+    assert set(trazador.tiempos_operacion) == {'a', 'b'}
+
+def test_fragmentos_heredan_la_operacion(tmp_path):
+    trazador = TrazadorSQL(archivo_lentas=str(tmp_path / 'lentas.log'))
+    historia, retiros = _datos()
+    manager = ShardedDatabaseManager(str(tmp_path / 'rachas.db'), 3, trazador)
+    manager.connect()
+    try:
+        manager.create_schema(ARCHIVO_ESQUEMA)
+        manager.load_dataframes(historia, retiros)
+        manager.generate_complete_series('2024-12-31')
+        manager.execute_rachas_query(3, '2024-12-31')
+    finally:
+        manager.disconnect()
+    
+    operaciones = {registro.operacion for registro in trazador.registros}
+    assert 'sin_operacion' not in operaciones
+    assert {'esquema', 'carga', 'serie', 'rachas'} <= operaciones
+    # Cada operación se cronometra una sola vez, en el hilo del manager fragmentado
+    assert set(trazador.tiempos_operacion) == {'conexion', 'esquema', 'carga', 'serie', 'rachas'}